@@ -0,0 +1,96 @@
+__version__ = "$Id$"
+
+
+"""
+An adaptive batch size for the workers of a backend.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: threading
+"""
+
+
+from threading import Lock
+
+
+class BatchController(object):
+    """
+    BatchController adapts the number of items the workers of a backend
+    get from their FIFO at once.
+
+    A worker never asks for more items than are waiting in the FIFO
+    (but at least for the minimum batch size), so it doesn't wait for
+    a timeout under light load. The batch size doubles while full batches
+    leave a backlog in the FIFO and shrinks in proportion if the latency
+    of a batch exceeds the target.
+    The controller is thread-safe and meant to be shared by all workers of
+    a backend.
+    """
+
+    def __init__(self, min_size=1, max_size=1000, latency=0.1, size=None):
+        """
+        ctor.
+
+        @param min_size: The minimum batch size. Optional, default is 1.
+        @type min_size: int
+        @param max_size: The maximum batch size. Optional, default is 1000.
+        @type max_size: int
+        @param latency: The target latency of a batch in seconds
+        (or fractions thereof). Optional, default is 0.1.
+        @type latency: float
+        @param size: The initial batch size.
+        Optional, default is None - min_size.
+        @type size: int
+        @raise ValueError: If a size or the latency is out of range.
+        """
+        if min_size < 1 or max_size < min_size:
+            raise ValueError("invalid batch size range %d - %d" %
+                             (min_size, max_size))
+        if latency <= 0:
+            raise ValueError("latency target must be greater than zero")
+        if size is None:
+            size = min_size
+        self._min_size = min_size
+        self._max_size = max_size
+        self._latency = latency
+        self._size = max(min_size, min(size, max_size))
+        self._lock = Lock()
+
+    @property
+    def size(self):
+        """The current batch size."""
+        return self._size
+
+    def get_size(self, depth):
+        """
+        Get the number of items a worker should get from the FIFO.
+
+        @param depth: The number of items in the FIFO.
+        @type depth: int
+        @return: The number of items.
+        @rtype: int
+        """
+        with self._lock:
+            return max(self._min_size, min(self._size, depth))
+
+    def update(self, n, latency, depth):
+        """
+        Adapt the batch size to a batch that was processed.
+
+        @param n: The number of items in the batch.
+        @type n: int
+        @param latency: The time in seconds it took to process the batch.
+        @type latency: float
+        @param depth: The number of items in the FIFO after the batch.
+        @type depth: int
+        """
+        with self._lock:
+            if latency > self._latency:
+                size = int(n * self._latency / latency)
+                self._size = max(self._min_size, min(self._size, size))
+            elif n >= self._size and depth >= self._size:
+                self._size = min(self._max_size, self._size * 2)
@@ -31,6 +31,21 @@ class Buffer(object):
         """
         pass
 
+    def add_many(self, samples):
+        """
+        Add/push data points to/into the buffer.
+
+        Backends that decouple the buffer from the storage may handle
+        a batch more efficiently than single data points. The default
+        calls add() for every data point.
+
+        @param samples: The times of the observations and
+        the observation data (cf. add()).
+        @type samples: list of (time, data) pairs
+        """
+        for tm, dt in samples:
+            self.add(tm, dt)
+
     def flush(self):
         """Flush the data towards the backend."""
         pass
@@ -116,6 +131,70 @@ class Registry(object):
         """
         return Buffer()
 
+    def register_many(self, specs):
+        """
+        Register several properties and create the buffers for their data.
+
+        Backends may implement this more efficiently than calling register()
+        per property, e.g. by batching round trips to a database.
+        A property that cannot be registered doesn't fail the others.
+        Instead, the exception takes the place of its buffer.
+
+        @param specs: The keyword arguments of register() per property
+        (component_name, component_type, property_name, property_type
+        and optionally property_type_desc, disable, force and meta data).
+        @type specs: list of dict
+        @return: The buffers or exceptions in the order of specs.
+        @rtype: list
+        """
+        buffers = []
+        for spec in specs:
+            try:
+                buffers.append(self.register(**spec))
+            except Exception as e:
+                buffers.append(e)
+        return buffers
+
+    @staticmethod
+    def _parse_spec(spec):
+        """
+        Split a property spec (cf. register_many()) into
+        the arguments of register().
+
+        @param spec: The keyword arguments of register().
+        @type spec: dict
+        @return: component_name, component_type, property_name,
+        property_type, property_type_desc, disable, force and meta.
+        @rtype: tuple
+        @raise TypeError: If a mandatory argument is missing.
+        """
+        meta = dict(spec)
+        try:
+            args = [meta.pop(k) for k in ("component_name",
+                                          "component_type",
+                                          "property_name",
+                                          "property_type")]
+        except KeyError as e:
+            raise TypeError("missing property spec argument %s" % (e,))
+        args.append(meta.pop("property_type_desc", None))
+        args.append(meta.pop("disable", False))
+        args.append(meta.pop("force", False))
+        args.append(meta)
+        return tuple(args)
+
+    def get_stats(self):
+        """
+        Return a snapshot of the registry statistics.
+
+        Backends with a FIFO report its statistics
+        (see ctamonitoring.property_recorder.backend.ring_buffer.RingBuffer.get_stats())
+        using the key "fifo". Forks report the statistics of their childs
+        using the key "backends".
+        @return: The statistics. The dummy has none.
+        @rtype: dict
+        """
+        return {}
+
     def set_logger(self, log):
         """
         Set the logger that is used to write log messages to.
@@ -11,15 +11,19 @@ The fork registry and buffer.
 @change: $LastChangedDate$
 @change: $LastChangedBy$
 @requires: ctamonitoring.property_recorder.backend
+@requires: ctamonitoring.property_recorder.backend.batch_controller
 @requires: ctamonitoring.property_recorder.backend.dummy.registry
 @requires: ctamonitoring.property_recorder.backend.exceptions
 @requires: ctamonitoring.property_recorder.backend.ring_buffer
 @requires: threading
+@requires: time
 @requires: Acspy.Common.Log or logging
 """
 
 
 from ctamonitoring.property_recorder.backend import get_registry_class
+from ctamonitoring.property_recorder.backend.batch_controller \
+    import BatchController
 import ctamonitoring.property_recorder.backend.dummy.registry
 from ctamonitoring.property_recorder.backend.exceptions \
     import InterruptedException
@@ -29,6 +33,7 @@ from ctamonitoring.property_recorder.backend.simple_fork \
 from threading import Event
 from threading import Lock
 from threading import Thread
+import time
 
 try:
     from Acspy.Common.Log import getLogger
@@ -71,6 +76,7 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         self._buffers = buffers
         self._component_name = component_name
         self._property_name = property_name
+        self._producer = (component_name, property_name)
         self._cannot_add = Event()
         self._cannot_add.clear()
         self._canceled = False  # keep this the last line in ctor
@@ -90,7 +96,25 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             self._cannot_add.clear()
             raise RuntimeError("cannot add %s/%s at %d" %
                                (self._component_name, self._property_name))
-        self._fifo.add((self, tm, dt))
+        self._fifo.add((self, tm, dt), self._producer)
+
+    def add_many(self, samples):
+        """
+        @raise RuntimeError: If buffer is closed.
+        @raise RuntimeError: In case a worker cannot add to one and more
+        (strict) or to any (lazy) backend/child buffer before.
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.add_many()
+        """
+        if self._canceled:
+            raise RuntimeError("unregistered property %s/%s - buffer is closed." %
+                               (self._component_name, self._property_name))
+
+        if self._cannot_add.is_set():
+            self._cannot_add.clear()
+            raise RuntimeError("cannot add %s/%s" %
+                               (self._component_name, self._property_name))
+        self._fifo.add_many([(self, tm, dt) for tm, dt in samples],
+                            self._producer)
 
     def _add(self, tm, dt):
         """
@@ -109,6 +133,23 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         if err and (self._strict or err >= len(self._buffers)):
             self._cannot_add.set()
 
+    def _add_many(self, samples):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.add_many()
+        """
+        err = 0
+        for id, lock, buffer in self._buffers:
+            try:
+                with lock:
+                    buffer.add_many(samples)
+            except:
+                self._log.exception("cannot add %s/%s at %s" %
+                                    (self._component_name,
+                                     self._property_name, id))
+                err += 1
+        if err and (self._strict or err >= len(self._buffers)):
+            self._cannot_add.set()
+
     def flush(self):
         """
         @raise ctamonitoring.property_recorder.backend.exceptions.InterruptedException:
@@ -118,7 +159,8 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.flush()
         """
         if not self._canceled:
-            self._fifo.flush(current=True)
+            # don't wait for the data of other properties
+            self._fifo.flush(producer=self._producer)
 
             err = 0
             for id, lock, buffer in self._buffers:
@@ -187,13 +229,13 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
 
 
 class _Worker(Thread):
-    def __init__(self, fifo, log):
+    def __init__(self, fifo, batch, log):
         super(_Worker, self).__init__()
         log.debug("creating fork worker")
         self._fifo = fifo
+        self._batch = batch
         self._log = log
         self._timeout = None
-        self._n = 1
         self._canceled = Event()
         self._canceled.clear()
         self._blah = 0
@@ -202,7 +244,8 @@ class _Worker(Thread):
         try:
             while not self._canceled.is_set():
                 try:
-                    items = self._fifo.get(n=self._n, timeout=self._timeout)
+                    n = self._batch.get_size(len(self._fifo))
+                    items = self._fifo.get(n=n, timeout=self._timeout)
                 except InterruptedException:
                     self._log.info("request to cancel fork worker")
                     continue
@@ -210,8 +253,23 @@ class _Worker(Thread):
                     self._log.exception("oups, unexpected exception... " +
                                         "ignore and continue")
                     continue
-                for buffer, tm, dt in items:
-                    buffer._add(tm, dt)
+                # pass on consecutive data points of a property at once
+                started = time.time()
+                begin = 0
+                while begin < len(items):
+                    buffer = items[begin][0]
+                    end = begin + 1
+                    while end < len(items) and items[end][0] is buffer:
+                        end += 1
+                    if end - begin == 1:
+                        buffer._add(items[begin][1], items[begin][2])
+                    else:
+                        buffer._add_many([(tm, dt) for _, tm, dt
+                                          in items[begin:end]])
+                    begin = end
+                if items:
+                    self._batch.update(len(items), time.time() - started,
+                                       len(self._fifo))
                 self._blah += len(items)
         except:
             self._log.exception("exiting fork worker")
@@ -235,6 +293,9 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                  strict=False,
                  fifo_size=1000,
                  n_workers=1,
+                 batch_size_min=1,
+                 batch_size_max=1000,
+                 batch_latency=0.1,
                  worker_is_daemon=False,
                  log=None,
                  *args, **kwargs):
@@ -261,6 +322,17 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         @param n_workers: Number of consumer threads/workers.
         Optional, default is 1.
         @type n_workers: int
+        @param batch_size_min: The minimum number of data points a worker
+        adds to the childs at once. Optional, default is 1.
+        @type batch_size_min: int
+        @param batch_size_max: The maximum number of data points a worker
+        adds to the childs at once. The batch size adapts in between
+        (cf. ctamonitoring.property_recorder.backend.batch_controller).
+        Optional, default is 1000.
+        @type batch_size_max: int
+        @param batch_latency: The target latency of a batch in seconds.
+        Optional, default is 0.1.
+        @type batch_latency: float
         @param worker_is_daemon: Workers traditionally run as daemon threads
         but this seems not to work within an ACS component. So this is your
         choice ;). We will try to stop all workers in the destructor in case
@@ -291,10 +363,13 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
             self._worker_is_daemon = worker_is_daemon
             if n_workers <= 0:
                 n_workers = 1
-            self._fifo = RingBuffer(fifo_size)
+            self._fifo = RingBuffer(fifo_size,
+                                    multi_consumer=(n_workers > 1))
+            self._batch = BatchController(batch_size_min, batch_size_max,
+                                           batch_latency, 1)
             self._workers = []  # keep this the last member variable in ctor
             for _ in range(n_workers):
-                worker = _Worker(self._fifo, self._log)
+                worker = _Worker(self._fifo, self._batch, self._log)
                 worker.daemon = worker_is_daemon
                 worker.start()
                 self._workers.append(worker)
@@ -333,6 +408,58 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         return Buffer(self._log, self._fifo, self._strict, buffers,
                       component_name, property_name)
 
+    def register_many(self, specs):
+        """
+        Register several properties at all backends - each backend
+        registers them at once (cf. register()).
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register_many()
+        """
+        for spec in specs:
+            self._log.info("registering %s/%s" %
+                           (spec.get("component_name"),
+                            spec.get("property_name")))
+        buffers = [[] for _ in specs]
+        results = [None] * len(specs)
+        for id, r in self._registries:
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                break
+            try:
+                registered = r.register_many([specs[i] for i in pending])
+            except Exception as e:
+                registered = [e] * len(pending)
+            for i, buffer in zip(pending, registered):
+                if not isinstance(buffer, Exception):
+                    buffers[i].append((id, Lock(), buffer))
+                    continue
+                component_name = specs[i].get("component_name")
+                property_name = specs[i].get("property_name")
+                self._log.error("cannot register %s/%s at %s: %s" %
+                                (component_name, property_name, id, buffer))
+                for _, _, buffer in buffers[i]:
+                    try:
+                        # here we are still single threaded and ignore the lock
+                        buffer.close()
+                    except:
+                        self._log.exception("cannot close buffer")
+                results[i] = RuntimeError("cannot register %s/%s at %s" %
+                                          (component_name, property_name, id))
+        for i, spec in enumerate(specs):
+            if results[i] is None:
+                results[i] = Buffer(self._log, self._fifo, self._strict,
+                                    buffers[i], spec["component_name"],
+                                    spec["property_name"])
+        return results
+
+    def get_stats(self):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.get_stats()
+        """
+        return {"fifo": self._fifo.get_stats(),
+                "batch_size": self._batch.size,
+                "backends": dict((id, r.get_stats())
+                                 for id, r in self._registries)}
+
     def __del__(self):
         """
         dtor.
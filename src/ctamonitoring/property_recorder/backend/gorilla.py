@@ -0,0 +1,303 @@
+__version__ = "$Id$"
+
+
+"""
+Compression of time series following Facebook's Gorilla
+(Pelkonen et al., "Gorilla: A Fast, Scalable, In-Memory Time Series
+Database", VLDB 2015).
+
+Times are integers (e.g. microseconds) that are encoded as
+delta-of-deltas into a bit stream - a fixed time grid costs one bit
+per data point.
+Floating point numbers are XOR'ed with their predecessor and only
+the meaningful bits of the result are written - an unchanged value costs
+one bit per data point.
+Integers are delta encoded, zigzag mapped and written as varints - small
+changes cost one byte per data point.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: struct
+"""
+
+
+import struct
+
+
+_DOUBLE = struct.Struct("!d")
+_UINT64 = struct.Struct("!Q")
+
+# delta-of-delta buckets: control bits, number of their bits and
+# number of value bits (the last bucket can keep any 64 bit integer).
+# the buckets are a bit wider than the original ones to cover the jitter
+# of times in microseconds.
+_BUCKETS = ((0x2, 2, 7),
+            (0x6, 3, 9),
+            (0xe, 4, 12),
+            (0x1e, 5, 32),
+            (0x1f, 5, 64))
+
+
+class _BitWriter(object):
+    def __init__(self):
+        self._bytes = bytearray()
+        self._acc = 0
+        self._n = 0
+
+    def write(self, value, nbits):
+        self._acc = (self._acc << nbits) | value
+        self._n += nbits
+        while self._n >= 8:
+            self._n -= 8
+            self._bytes.append((self._acc >> self._n) & 0xff)
+        self._acc &= (1 << self._n) - 1
+
+    def getvalue(self):
+        data = bytearray(self._bytes)
+        if self._n:
+            data.append((self._acc << (8 - self._n)) & 0xff)
+        return bytes(data)
+
+
+class _BitReader(object):
+    def __init__(self, data):
+        self._data = bytearray(data)
+        self._pos = 0
+
+    def read(self, nbits):
+        value = 0
+        try:
+            while nbits:
+                used = self._pos & 7
+                take = min(8 - used, nbits)
+                byte = self._data[self._pos >> 3]
+                value = ((value << take) |
+                         ((byte >> (8 - used - take)) & ((1 << take) - 1)))
+                self._pos += take
+                nbits -= take
+        except IndexError:
+            raise ValueError("truncated bit stream")
+        return value
+
+
+def _to_signed(value, nbits):
+    if value >= 1 << (nbits - 1):
+        return value - (1 << nbits)
+    return value
+
+
+def _zigzag(n):
+    if n >= 0:
+        return n << 1
+    return ((-n) << 1) - 1
+
+
+def _unzigzag(n):
+    if n & 1:
+        return -((n + 1) >> 1)
+    return n >> 1
+
+
+def encode_times(times):
+    """
+    Encode integer times (delta-of-delta).
+
+    @param times: The times in ascending order.
+    @type times: list of int
+    @return: The compressed times.
+    @rtype: string
+    @raise ValueError: If the times don't fit into 64 bits.
+    """
+    writer = _BitWriter()
+    prev = 0
+    prev_delta = 0
+    for i, t in enumerate(times):
+        if not i:
+            writer.write(t & 0xffffffffffffffff, 64)
+        else:
+            delta = t - prev
+            dod = delta - prev_delta
+            if not dod:
+                writer.write(0, 1)
+            else:
+                for bits, nbits, nvalue in _BUCKETS:
+                    limit = 1 << (nvalue - 1)
+                    if -limit <= dod < limit:
+                        writer.write(bits, nbits)
+                        writer.write(dod & ((1 << nvalue) - 1), nvalue)
+                        break
+                else:
+                    raise ValueError("time delta out of range: %d" % (dod,))
+            prev_delta = delta
+        prev = t
+    return writer.getvalue()
+
+
+def decode_times(data, n):
+    """
+    Decode integer times.
+
+    @param data: The compressed times (cf. encode_times()).
+    @type data: string
+    @param n: The number of times.
+    @type n: int
+    @return: The times.
+    @rtype: list of int
+    @raise ValueError: If the data is corrupt.
+    """
+    reader = _BitReader(data)
+    times = []
+    t = 0
+    delta = 0
+    for i in range(n):
+        if not i:
+            t = _to_signed(reader.read(64), 64)
+        else:
+            if reader.read(1):
+                bits = 1
+                nbits = 1
+                for b, nb, nvalue in _BUCKETS:
+                    while nbits < nb:
+                        bits = (bits << 1) | reader.read(1)
+                        nbits += 1
+                    if bits == b:
+                        delta += _to_signed(reader.read(nvalue), nvalue)
+                        break
+            t += delta
+        times.append(t)
+    return times
+
+
+def encode_floats(values):
+    """
+    Encode floating point numbers (XOR).
+
+    @param values: The values.
+    @type values: list of float
+    @return: The compressed values.
+    @rtype: string
+    @raise TypeError: If a value isn't a number.
+    """
+    writer = _BitWriter()
+    prev = 0
+    prev_leading = -1
+    prev_trailing = 0
+    for i, val in enumerate(values):
+        bits, = _UINT64.unpack(_DOUBLE.pack(val))
+        if not i:
+            writer.write(bits, 64)
+        else:
+            xor = bits ^ prev
+            if not xor:
+                writer.write(0, 1)
+            else:
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+                if (prev_leading >= 0 and leading >= prev_leading and
+                        trailing >= prev_trailing):
+                    # the meaningful bits fit into the previous block
+                    writer.write(0x2, 2)
+                    writer.write(xor >> prev_trailing,
+                                 64 - prev_leading - prev_trailing)
+                else:
+                    meaningful = 64 - leading - trailing
+                    writer.write(0x3, 2)
+                    writer.write(leading, 5)
+                    writer.write(meaningful & 0x3f, 6)  # 64 -> 0
+                    writer.write(xor >> trailing, meaningful)
+                    prev_leading = leading
+                    prev_trailing = trailing
+        prev = bits
+    return writer.getvalue()
+
+
+def decode_floats(data, n):
+    """
+    Decode floating point numbers.
+
+    @param data: The compressed values (cf. encode_floats()).
+    @type data: string
+    @param n: The number of values.
+    @type n: int
+    @return: The values.
+    @rtype: list of float
+    @raise ValueError: If the data is corrupt.
+    """
+    reader = _BitReader(data)
+    values = []
+    bits = 0
+    leading = 0
+    trailing = 0
+    for i in range(n):
+        if not i:
+            bits = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(_DOUBLE.unpack(_UINT64.pack(bits))[0])
+    return values
+
+
+def encode_ints(values):
+    """
+    Encode integers (delta, zigzag, varint).
+
+    @param values: The values.
+    @type values: list of int
+    @return: The compressed values.
+    @rtype: string
+    @raise TypeError: If a value isn't an integer.
+    """
+    data = bytearray()
+    prev = 0
+    for val in values:
+        if not isinstance(val, (int, long)):
+            raise TypeError("not an integer: %r" % (val,))
+        n = _zigzag(val - prev)
+        while n > 0x7f:
+            data.append((n & 0x7f) | 0x80)
+            n >>= 7
+        data.append(n)
+        prev = val
+    return bytes(data)
+
+
+def decode_ints(data, n):
+    """
+    Decode integers.
+
+    @param data: The compressed values (cf. encode_ints()).
+    @type data: string
+    @param n: The number of values.
+    @type n: int
+    @return: The values.
+    @rtype: list of int
+    @raise ValueError: If the data is corrupt.
+    """
+    data = bytearray(data)
+    values = []
+    val = 0
+    pos = 0
+    try:
+        for _ in range(n):
+            shift = 0
+            z = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                z |= (byte & 0x7f) << shift
+                if not byte & 0x80:
+                    break
+                shift += 7
+            val += _unzigzag(z)
+            values.append(val)
+    except IndexError:
+        raise ValueError("truncated varints")
+    return values
@@ -0,0 +1,290 @@
+__version__ = "$Id$"
+
+
+"""
+The layouts of the chunks the mongodb backend stores monitoring data in.
+
+A chunk keeps the data points of one property within one time bin.
+Every chunk has the fields "begin", "end" (the time of the first and
+the last data point), "bin" (the beginning of the time bin) and
+"pid" (the property ID). The layout of the data points depends on
+the format version in the field "fmt":
+
+FORMAT_DOCUMENTS - a list of sub-documents {"t": datetime, "val": value}
+in the field "values". Chunks of this format may lack the field "fmt".
+
+FORMAT_COLUMNAR - parallel lists: "t" keeps the times as integer offsets
+in microseconds from "bin" and "v" the values.
+
+FORMAT_COMPRESSED - like FORMAT_COLUMNAR but "t" and "v" are compressed
+binary blocks (cf. ctamonitoring.property_recorder.backend.gorilla).
+"n" keeps the number of data points and "codec" the value encoding:
+CODEC_XOR for floating point numbers or CODEC_ZIGZAG for integers.
+Chunks of this format are built like columnar ones and compressed by seal()
+right before they are inserted.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: bson
+@requires: ctamonitoring.property_recorder.backend.gorilla
+@requires: ctamonitoring.property_recorder.backend.property_type
+@requires: ctamonitoring.property_recorder.backend.util
+@requires: datetime
+@requires: struct
+"""
+
+
+import bson
+from ctamonitoring.property_recorder.backend import gorilla
+from ctamonitoring.property_recorder.backend.property_type import PropertyType
+from ctamonitoring.property_recorder.backend.util import get_approx_size
+from ctamonitoring.property_recorder.backend.util \
+    import get_total_microseconds
+from datetime import timedelta
+import struct
+
+
+FORMAT_DOCUMENTS = 1
+FORMAT_COLUMNAR = 2
+FORMAT_COMPRESSED = 3
+
+CODEC_XOR = "xor"
+CODEC_ZIGZAG = "zigzag"
+
+_codecs = {PropertyType.FLOAT: CODEC_XOR,
+           PropertyType.DOUBLE: CODEC_XOR,
+           PropertyType.LONG: CODEC_ZIGZAG,
+           PropertyType.LONG_LONG: CODEC_ZIGZAG,
+           PropertyType.BIT_FIELD: CODEC_ZIGZAG,
+           PropertyType.ENUMERATION: CODEC_ZIGZAG}
+
+_encoders = {CODEC_XOR: gorilla.encode_floats,
+             CODEC_ZIGZAG: gorilla.encode_ints}
+
+_value_decoders = {CODEC_XOR: gorilla.decode_floats,
+                   CODEC_ZIGZAG: gorilla.decode_ints}
+
+
+def get_codec(property_type):
+    """
+    Get the value codec for a property type.
+
+    @param property_type: The property type.
+    @type property_type: ctamonitoring.property_recorder.backend.property_type.PropertyType
+    @return: CODEC_XOR, CODEC_ZIGZAG or None if the values of this type
+    aren't compressed.
+    @rtype: string
+    """
+    return _codecs.get(property_type)
+
+
+def get_format(chunk):
+    """
+    Get the format version of a chunk.
+
+    @param chunk: The chunk.
+    @type chunk: dict
+    @return: The format version.
+    @rtype: int
+    """
+    return chunk.get("fmt", FORMAT_DOCUMENTS)
+
+
+def get_offset(t, bin_begin):
+    """
+    Get the offset of a time from the beginning of its time bin.
+
+    @param t: The time.
+    @type t: datetime.datetime
+    @param bin_begin: The beginning of the time bin.
+    @type bin_begin: datetime.datetime
+    @return: The offset in microseconds.
+    @rtype: int
+    """
+    return get_total_microseconds(t - bin_begin)
+
+
+def new_chunk(t, bin_begin, property_id, fmt=FORMAT_DOCUMENTS, codec=None):
+    """
+    Create an empty chunk.
+
+    @param t: The time of the first data point.
+    @type t: datetime.datetime
+    @param bin_begin: The beginning of the time bin.
+    @type bin_begin: datetime.datetime
+    @param property_id: The property ID.
+    @type property_id: bson.ObjectId
+    @param fmt: The format version. Optional, default is FORMAT_DOCUMENTS.
+    @type fmt: int
+    @param codec: The value codec of FORMAT_COMPRESSED (cf. get_codec()).
+    Optional, default is None.
+    @type codec: string
+    @return: The chunk.
+    @rtype: dict
+    @raise ValueError: If the format version or the codec is unknown.
+    """
+    if fmt == FORMAT_DOCUMENTS:
+        # keep the traditional layout as is - without a format version
+        return {"begin": t, "end": None,
+                "values": [],
+                "bin": bin_begin, "pid": property_id}
+    if fmt == FORMAT_COLUMNAR:
+        return {"begin": t, "end": None,
+                "t": [], "v": [],
+                "bin": bin_begin, "pid": property_id,
+                "fmt": fmt}
+    if fmt == FORMAT_COMPRESSED:
+        if codec not in _encoders:
+            raise ValueError("unknown codec %r" % (codec,))
+        return {"begin": t, "end": None,
+                "t": [], "v": [],
+                "bin": bin_begin, "pid": property_id,
+                "fmt": fmt, "codec": codec}
+    raise ValueError("unknown chunk format %r" % (fmt,))
+
+
+def append(chunk, t, val):
+    """
+    Append a data point to a chunk.
+
+    @param chunk: The chunk (cf. new_chunk()).
+    @type chunk: dict
+    @param t: The time.
+    @type t: datetime.datetime
+    @param val: The value.
+    """
+    if get_format(chunk) == FORMAT_DOCUMENTS:
+        chunk["values"].append({"t": t, "val": val})
+    else:
+        append_offset(chunk, get_offset(t, chunk["bin"]), val)
+
+
+def append_offset(chunk, offset, val):
+    """
+    Append a data point to a chunk of FORMAT_COLUMNAR or FORMAT_COMPRESSED
+    by its offset - without any date + time arithmetic.
+
+    @param chunk: The chunk (cf. new_chunk()).
+    @type chunk: dict
+    @param offset: The offset in microseconds (cf. get_offset()).
+    @type offset: int
+    @param val: The value.
+    """
+    chunk["t"].append(offset)
+    chunk["v"].append(val)
+
+
+def seal(chunk):
+    """
+    Compress a chunk of FORMAT_COMPRESSED.
+
+    A chunk that cannot be compressed (e.g. due to a value of
+    an unexpected type) is turned into FORMAT_COLUMNAR.
+    @param chunk: The chunk (cf. new_chunk()).
+    @type chunk: dict
+    @return: The chunk that is ready to be inserted. Chunks of other
+    formats are returned as is.
+    @rtype: dict
+    """
+    if get_format(chunk) != FORMAT_COMPRESSED or "n" in chunk:
+        return chunk
+    sealed = dict(chunk)
+    try:
+        sealed["v"] = bson.Binary(_encoders[chunk["codec"]](chunk["v"]))
+        sealed["t"] = bson.Binary(gorilla.encode_times(chunk["t"]))
+    except (TypeError, ValueError, struct.error):
+        del sealed["codec"]
+        sealed["fmt"] = FORMAT_COLUMNAR
+        return sealed
+    sealed["n"] = len(chunk["v"])
+    return sealed
+
+
+def get_approx_chunk_size(chunk):
+    """
+    Get the approximate size of a chunk when it is serialized.
+
+    The estimate uses the first value only, since all values of
+    a property are (usually) of the same size.
+
+    @param chunk: The chunk.
+    @type chunk: dict
+    @return: The approximate size in bytes.
+    @rtype: int
+    """
+    size = 100  # begin, end, bin, pid plus field names
+    if get_format(chunk) == FORMAT_DOCUMENTS:
+        values = chunk.get("values")  # none in other documents (rollups)
+        if values:
+            size += len(values) * (3 + get_approx_size(values[0]))
+    else:
+        values = chunk["v"]
+        if values:
+            size += len(values) * (3 + 8 + 3 + get_approx_size(values[0]))
+    return size
+
+
+def get_columns(chunk):
+    """
+    Get the time offsets and values of a columnar or compressed chunk.
+
+    @param chunk: The chunk of FORMAT_COLUMNAR or FORMAT_COMPRESSED.
+    @type chunk: dict
+    @return: The time offsets in microseconds from "bin" and the values.
+    @rtype: (list of int, list) pair
+    @raise ValueError: If the format version or the codec is unknown.
+    """
+    fmt = get_format(chunk)
+    if fmt == FORMAT_COLUMNAR or (fmt == FORMAT_COMPRESSED and
+                                  "n" not in chunk):  # not sealed yet
+        return chunk["t"], chunk["v"]
+    if fmt != FORMAT_COMPRESSED:
+        raise ValueError("chunk format %r isn't columnar" % (fmt,))
+    try:
+        decoder = _value_decoders[chunk["codec"]]
+    except KeyError:
+        raise ValueError("unknown codec %r" % (chunk["codec"],))
+    n = chunk["n"]
+    return gorilla.decode_times(chunk["t"], n), decoder(chunk["v"], n)
+
+
+def _decode_documents(chunk):
+    return [(v["t"], v["val"]) for v in chunk["values"]]
+
+
+def _decode_columnar(chunk):
+    bin_begin = chunk["bin"]
+    return [(bin_begin + timedelta(microseconds=offset), val)
+            for offset, val in zip(chunk["t"], chunk["v"])]
+
+
+def _decode_compressed(chunk):
+    offsets, values = get_columns(chunk)
+    return _decode_columnar({"bin": chunk["bin"], "t": offsets, "v": values})
+
+
+_decoders = {FORMAT_DOCUMENTS: _decode_documents,
+             FORMAT_COLUMNAR: _decode_columnar,
+             FORMAT_COMPRESSED: _decode_compressed}
+
+
+def decode(chunk):
+    """
+    Get the data points of a chunk.
+
+    @param chunk: The chunk of any format version.
+    @type chunk: dict
+    @return: The data points - a list of (time, value) pairs.
+    @rtype: list
+    @raise ValueError: If the format version is unknown.
+    """
+    fmt = get_format(chunk)
+    try:
+        decoder = _decoders[fmt]
+    except KeyError:
+        raise ValueError("unknown chunk format %r" % (fmt,))
+    return decoder(chunk)
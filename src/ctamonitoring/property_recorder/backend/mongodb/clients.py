@@ -0,0 +1,185 @@
+# coding=utf-8
+__version__ = "$Id$"
+
+
+"""
+The mongodb clients that are shared within a process.
+
+A MongoClient keeps a connection pool plus monitoring threads per server.
+Registries and readers that connect to the same URI with the same options
+share one client instead of opening a pool each. The clients are
+reference counted and closed when the last user releases them.
+
+SharedCache is the reference counted cache behind it. The mongodb
+registry uses it to share worker pools as well.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: pymongo
+@requires: threading
+@requires: mongo_proxy
+"""
+
+
+from pymongo import MongoClient
+from threading import Lock
+
+try:
+    from mongo_proxy import MongoProxy
+    MONGO_PROXY_WAIT_TIME = 20
+    MONGO_PROXY_DISCONNECT_ON_TIMEOUT = True
+except ImportError:
+    MongoProxy = None
+
+
+class SharedCache(object):
+    """
+    A thread-safe cache of objects that are shared by key and
+    reference counted.
+    """
+
+    def __init__(self, factory, closer):
+        """
+        ctor.
+
+        @param factory: Creates the object of a key. It is called with
+        the arguments given to acquire() - under the cache lock, so
+        the same object is never created twice.
+        @type factory: callable
+        @param closer: Closes an object once it is released by
+        its last user.
+        @type closer: callable
+        """
+        self._factory = factory
+        self._closer = closer
+        self._lock = Lock()
+        self._entries = {}  # key -> [object, reference count]
+        self._keys = {}  # id(object) -> key
+
+    def acquire(self, key, *args, **kwargs):
+        """
+        Get the object of a key and create it if there is none yet.
+
+        @param key: The key.
+        @type key: hashable
+        @return: The shared object.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [self._factory(*args, **kwargs), 0]
+                self._entries[key] = entry
+                self._keys[id(entry[0])] = key
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, obj):
+        """
+        Release an object that was acquired before. The last release
+        closes the object.
+
+        @param obj: The object.
+        @return: The object was closed or not.
+        @rtype: boolean
+        @raise KeyError: If the object isn't in the cache.
+        """
+        with self._lock:
+            key = self._keys[id(obj)]
+            entry = self._entries[key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return False
+            del self._entries[key]
+            del self._keys[id(obj)]
+        self._closer(obj)
+        return True
+
+    def get_refcount(self, obj):
+        """
+        @return: The number of users of an object (0 if it isn't cached).
+        @rtype: int
+        """
+        with self._lock:
+            key = self._keys.get(id(obj))
+            if key is None:
+                return 0
+            return self._entries[key][1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def _create_client(uri, log, options):
+    cl = MongoClient(uri, **dict(options))
+    assert cl.write_concern.acknowledged
+    # Starting with version 3.0 the MongoClient constructor no longer
+    # blocks while connecting to the server or servers, and it no longer
+    # raises ConnectionFailure if they are unavailable,
+    # nor ConfigurationError if the user’s credentials are wrong.
+    # Instead, the constructor returns immediately and launches
+    # the connection process on background threads.
+    # Check if the server is available...
+    # The ismaster command is cheap and does not require auth.
+    cl.admin.command('ismaster')
+    if MongoProxy is not None:
+        return MongoProxy(cl,
+                          logger=log,
+                          wait_time=MONGO_PROXY_WAIT_TIME,
+                          disconnect_on_timeout=MONGO_PROXY_DISCONNECT_ON_TIMEOUT)
+    return cl
+
+
+def _close_client(client):
+    client.close()
+
+
+_clients = SharedCache(_create_client, _close_client)
+
+
+def get_client_key(uri, options=None):
+    """
+    @return: The key a client is shared by.
+    @rtype: tuple
+    """
+    return (uri, tuple(sorted((options or {}).items())))
+
+
+def get_client(uri, log=None, options=None):
+    """
+    Get the shared client of a URI and client options.
+
+    The server is checked to be available (ismaster) when the client
+    is created. Release the client by release_client().
+
+    @param uri: mongodb URI.
+    @type uri: string
+    @param log: The logger of the client's proxy (if any).
+    Optional, default is None.
+    @type log: logging.Logger
+    @param options: The keyword arguments of MongoClient.
+    The values must be hashable. Optional, default is None.
+    @type options: dict
+    @return: The client (a MongoProxy if mongo_proxy is available).
+    @rtype: pymongo.MongoClient
+    @raise pymongo.errors.ServerSelectionTimeoutError: If the server
+    isn't available.
+    """
+    key = get_client_key(uri, options)
+    return _clients.acquire(key, uri, log, key[1])
+
+
+def release_client(client):
+    """
+    Release a client. The last release closes it.
+
+    @param client: The client that get_client() returned.
+    @type client: pymongo.MongoClient
+    @return: The client was closed or not.
+    @rtype: boolean
+    """
+    return _clients.release(client)
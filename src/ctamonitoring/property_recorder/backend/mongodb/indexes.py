@@ -0,0 +1,108 @@
+__version__ = "$Id$"
+
+
+"""
+The indexes the mongodb backend needs.
+
+The chunks are looked up by property and time bin, the log entries by
+property and beginning and the property descriptions by their identity
+(component name and property name, cf. Registry.register()).
+The rollups are looked up like the chunks, the measurements of
+a time-series collection by property and time.
+Without these indexes, registration and reading turn into collection scans
+as the data grows.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: pymongo
+"""
+
+
+import pymongo
+from pymongo.errors import OperationFailure
+
+
+# the indexes per collection (cf. the collection names of the registry)
+INDEXES = {"chunks": [[("pid", pymongo.ASCENDING),
+                       ("bin", pymongo.ASCENDING)]],
+           "logs": [[("pid", pymongo.ASCENDING),
+                     ("begin", pymongo.DESCENDING)]],
+           "properties": [[("component_name", pymongo.ASCENDING),
+                           ("property_name", pymongo.ASCENDING)]],
+           "rollups": [[("pid", pymongo.ASCENDING),
+                        ("bin", pymongo.ASCENDING)]],
+           # the measurements of a time-series collection
+           "timeseries": [[("meta.pid", pymongo.ASCENDING),
+                           ("t", pymongo.ASCENDING)]]}
+
+
+def _get_indexes(role):
+    # a role may be qualified, e.g. "rollups.60"
+    return INDEXES.get(role.split(".", 1)[0], [])
+
+
+def _normalize(keys):
+    # the server may return the directions as floats
+    return [(field, int(direction))
+            if isinstance(direction, (int, long, float)) else
+            (field, direction) for field, direction in keys]
+
+
+def ensure_indexes(collections, background=False):
+    """
+    Create the indexes that are missing.
+
+    Creating an index that exists already is a no-op.
+
+    @param collections: The collections by their role
+    ("chunks", "logs", "properties", "rollups.<interval>" or "timeseries").
+    @type collections: dict
+    @param background: Build the indexes in the background so that
+    the collections aren't blocked meanwhile (this is the only behavior
+    as of mongodb 4.2). Optional, default is False.
+    @type background: boolean
+    @return: The names of the indexes per role.
+    @rtype: dict
+    """
+    names = {}
+    for role, col in collections.items():
+        names[role] = [col.create_index(keys, background=background)
+                       for keys in _get_indexes(role)]
+    return names
+
+
+def verify_indexes(collections):
+    """
+    Find the indexes that are missing or were never used.
+
+    The usage is taken from $indexStats. It is counted since the index
+    was created or the server was restarted.
+
+    @param collections: The collections by their role
+    ("chunks", "logs", "properties", "rollups.<interval>" or "timeseries").
+    @type collections: dict
+    @return: A report per role - a dict with the key lists of the
+    missing indexes ("missing") and the names of the unused indexes
+    ("unused"). The latter is None if the server doesn't provide
+    index statistics.
+    @rtype: dict
+    """
+    report = {}
+    for role, col in collections.items():
+        existing = [_normalize(info["key"])
+                    for info in col.index_information().values()]
+        missing = [keys for keys in _get_indexes(role)
+                   if _normalize(keys) not in existing]
+        try:
+            unused = sorted(stats["name"]
+                            for stats in col.aggregate([{"$indexStats": {}}])
+                            if stats["name"] != "_id_" and
+                            not stats["accesses"]["ops"])
+        except OperationFailure:
+            unused = None
+        report[role] = {"missing": missing, "unused": unused}
+    return report
@@ -20,6 +20,7 @@ It defines classes_and_methods
 @requires: threading
 @requires: time
 @requires: copy
+@requires: ctamonitoring.property_recorder.backend.mongodb.timeseries
 @requires: datetime
 @requires: optparse
 @requires: Queue
@@ -35,6 +36,7 @@ import threading
 import time
 
 from copy import copy
+from ctamonitoring.property_recorder.backend.mongodb import timeseries
 from datetime import datetime, timedelta
 from optparse import Option, OptionParser, OptionValueError
 from pymongo import MongoClient
@@ -72,13 +74,15 @@ class DatetimeOption(Option):
 
 
 class Property(object):
-    def __init__(self, pid, period, min, max, nxt_bin=None, lst_end=None):
+    def __init__(self, pid, period, min, max, nxt_bin=None, lst_end=None,
+                 meta=None):
         self.pid = pid
         self.period = period
         self.min = min
         self.max = max
         self.nxt_bin = nxt_bin
         self.lst_end = lst_end
+        self.meta = meta
 
 
 class Statistics(object):
@@ -203,7 +207,11 @@ class DBInserter(threading.Thread):
         self._stats.n_data_points = 0
 
     def _send_chunks(self):
-        self._chunks_col.insert(self._chunks)
+        docs = self._chunks
+        if docs and isinstance(docs[0], list):
+            # the measurements of a time-series collection
+            docs = [measurement for chunk in docs for measurement in chunk]
+        self._chunks_col.insert(docs)
         for i in range(len(self._chunks)):
             self._queue_in.task_done()
         self._stats.n_bins += self._n_bins
@@ -301,7 +309,23 @@ def acquire_systems(sys_col, sys_locks, systems, props_col, n_props):
             n_total += n
 
 
-def acquire_properties(sys_locks, props_col, begin, chunks_col, chunk_size):
+def get_last_chunk(chunks_col, pid, chunk_size, is_timeseries=False):
+    if not is_timeseries:
+        chunks = chunks_col.find({"pid": pid}) \
+                           .sort("bin", pymongo.DESCENDING) \
+                           .limit(1)
+        return chunks.next() if chunks.count() else None
+    measurements = chunks_col.find({"meta.pid": pid}) \
+                             .sort("t", pymongo.DESCENDING) \
+                             .limit(1)
+    for measurement in measurements:
+        return {"bin": get_floor(measurement["t"], chunk_size),
+                "end": measurement["t"]}
+    return None
+
+
+def acquire_properties(sys_locks, props_col, begin, chunks_col, chunk_size,
+                       is_timeseries=False):
     properties = []
     first_bin = None
     for system in sys_locks:
@@ -321,11 +345,9 @@ def acquire_properties(sys_locks, props_col, begin, chunks_col, chunk_size):
             graph_max = prop["meta"]["graph_max"]
             lst_end = (begin -
                        timedelta(seconds=uniform(0, period)))
-            chunks = chunks_col.find({"pid": pid}) \
-                               .sort("bin", pymongo.DESCENDING) \
-                               .limit(1)
-            if chunks.count():
-                chunk = chunks.next()
+            chunk = get_last_chunk(chunks_col, pid, chunk_size,
+                                   is_timeseries)
+            if chunk is not None:
                 nxt_bin = chunk["bin"] + chunk_size
                 if nxt_bin >= begin:
                     p = Property(pid,
@@ -352,6 +374,9 @@ def acquire_properties(sys_locks, props_col, begin, chunks_col, chunk_size):
                              begin,
                              lst_end)
                 first_bin = begin
+            p.meta = timeseries.get_meta(pid,
+                                         prop.get("component_name"),
+                                         prop.get("property_name"))
             properties.append(p)
     return properties, first_bin
 
@@ -446,13 +471,19 @@ def main(argv=None):
                           metavar="SECONDS")
         parser.add_option("--realtime", dest="realtime", action="store_true",
                           help="run data generation in realtime")
+        parser.add_option("--timeseries", dest="timeseries",
+                          action="store_true",
+                          help="write a measurement per data point to "
+                          "the time-series collection 'measurements' "
+                          "instead of chunks (mongodb 5.0 or later)")
 
         # set defaults
         parser.set_defaults(host=HOST, port=27017,
                             n_props=15000,
                             begin="2013-10-01", days=1,
                             chunk_size=60,
-                            realtime=False)
+                            realtime=False,
+                            timeseries=False)
 
         # process options
         (opts, args) = parser.parse_args(argv)
@@ -471,11 +502,17 @@ def main(argv=None):
         print("chunksize = %s" % (str(chunk_size),))
         if opts.realtime:
             print("realtime generation")
+        if opts.timeseries:
+            print("time-series collection")
 
         # connect to db server, db and collections
         client = MongoClient(opts.host, opts.port)
         db = client.ctamonitoringtest
-        chunks_collection = db.chunks
+        if opts.timeseries:
+            chunks_collection = timeseries.create_collection(db,
+                                                             "measurements")
+        else:
+            chunks_collection = db.chunks
         properties_collection = db.properties
         statistics_collection = db.statistics
         systems_collection = db.systems
@@ -490,7 +527,8 @@ def main(argv=None):
                                                        properties_collection,
                                                        opts.begin,
                                                        chunks_collection,
-                                                       chunk_size)
+                                                       chunk_size,
+                                                       opts.timeseries)
             if properties:
                 print("-" * 40)
                 print("nprops = %d" % (len(properties),))
@@ -530,13 +568,19 @@ def main(argv=None):
                         if not values:
                             continue
                         prop.lst_end = values[-1]["t"]
-                        chunk = {
-                            "begin": values[0]["t"],
-                            "end": prop.lst_end,
-                            "values": values,
-                            "bin": bin,
-                            "pid": prop.pid
-                        }
+                        if opts.timeseries:
+                            chunk = [timeseries.new_measurement(v["t"],
+                                                                v["val"],
+                                                                prop.meta)
+                                     for v in values]
+                        else:
+                            chunk = {
+                                "begin": values[0]["t"],
+                                "end": prop.lst_end,
+                                "values": values,
+                                "bin": bin,
+                                "pid": prop.pid
+                            }
                         while True:
                             try:
                                 queue.put((bin, chunk, len(values)),
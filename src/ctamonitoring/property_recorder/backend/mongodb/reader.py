@@ -0,0 +1,406 @@
+__version__ = "$Id$"
+
+
+"""
+Read monitoring data back from the mongodb backend.
+
+The reader looks up the chunks of a property within a time range,
+pruning by the time bins of the chunks, and decodes them into NumPy arrays:
+the times as numpy.datetime64 (microseconds, UTC) and the values.
+The values of sequence properties are 2-D arrays - one row per data point.
+The rollups of a property (if any) are read alike. So are the measurements
+if the registry stores them in a time-series collection instead of chunks.
+
+Each chunk layout (cf. ctamonitoring.property_recorder.backend.mongodb.chunk_format)
+has a decoder that can be replaced or extended by register_decoder().
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.mongodb.chunk_format
+@requires: ctamonitoring.property_recorder.backend.mongodb.clients
+@requires: ctamonitoring.property_recorder.backend.mongodb.rollup
+@requires: ctamonitoring.property_recorder.backend.mongodb.timeseries
+@requires: ctamonitoring.property_recorder.backend.util
+@requires: datetime
+@requires: numpy
+@requires: pymongo
+@requires: Acspy.Common.Log or logging
+"""
+
+
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb import clients
+from ctamonitoring.property_recorder.backend.mongodb import rollup
+from ctamonitoring.property_recorder.backend.mongodb \
+    import timeseries as mongodb_timeseries
+from ctamonitoring.property_recorder.backend.util import get_floor
+from ctamonitoring.property_recorder.backend.util import to_datetime
+from ctamonitoring.property_recorder.backend.mongodb \
+    import __name__ as defaultname
+from datetime import datetime
+from datetime import timedelta
+import numpy
+import pymongo
+
+try:
+    from Acspy.Common.Log import getLogger
+except ImportError:
+    # use the standard logging module if this doesn't run in an ACS system
+    from logging import getLogger
+
+
+_TIME_TYPE = "datetime64[us]"
+
+# the fields of a chunk that the decoders need (of any layout)
+_PROJECTION = {"_id": False,
+               "bin": True, "begin": True, "end": True,
+               "fmt": True, "codec": True, "n": True,
+               "values": True, "t": True, "v": True}
+
+_MEASUREMENT_PROJECTION = {"_id": False,
+                           mongodb_timeseries.TIME_FIELD: True, "val": True}
+
+_ROLLUP_PROJECTION = {"_id": False,
+                      "bin": True, "begin": True, "end": True,
+                      "count": True,
+                      "min": True, "max": True, "mean": True}
+
+
+def _decode_documents(chunk):
+    values = chunk["values"]
+    times = numpy.array([v["t"] for v in values], dtype=_TIME_TYPE)
+    return times, [v["val"] for v in values]
+
+
+def _decode_columns(chunk):
+    offsets, values = chunk_format.get_columns(chunk)
+    times = (numpy.datetime64(chunk["bin"], "us") +
+             numpy.asarray(offsets, dtype=numpy.int64))
+    return times, values
+
+
+_decoders = {chunk_format.FORMAT_DOCUMENTS: _decode_documents,
+             chunk_format.FORMAT_COLUMNAR: _decode_columns,
+             chunk_format.FORMAT_COMPRESSED: _decode_columns}
+
+
+def register_decoder(fmt, decoder):
+    """
+    Register the decoder of a chunk layout.
+
+    @param fmt: The format version of the layout.
+    @type fmt: int
+    @param decoder: The decoder - a callable that takes a chunk and
+    returns the times (a numpy.datetime64 array in microseconds) and
+    the values (a sequence of the same length).
+    @type decoder: callable
+    """
+    _decoders[fmt] = decoder
+
+
+def decode(chunk):
+    """
+    Decode a chunk into arrays.
+
+    @param chunk: The chunk.
+    @type chunk: dict
+    @return: The times and values.
+    @rtype: (numpy.ndarray, sequence) pair
+    @raise ValueError: If there is no decoder for the chunk format.
+    """
+    fmt = chunk_format.get_format(chunk)
+    try:
+        decoder = _decoders[fmt]
+    except KeyError:
+        raise ValueError("no decoder for chunk format %r" % (fmt,))
+    return decoder(chunk)
+
+
+def _to_array(values, is_sequence):
+    array = numpy.array(values)
+    if is_sequence and array.ndim != 2 and len(values):
+        # sequences of different lengths - keep one object per data point
+        array = numpy.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+    return array
+
+
+def decode_chunks(chunks, start=None, end=None, is_sequence=False):
+    """
+    Decode chunks into arrays.
+
+    @param chunks: The chunks in chronological order.
+    @type chunks: iterable of dict
+    @param start: Skip data points before this time. Optional,
+    default is None.
+    @type start: datetime.datetime
+    @param end: Skip data points after this time. Optional,
+    default is None.
+    @type end: datetime.datetime
+    @param is_sequence: The values are sequences - return a 2-D array
+    of values if all sequences have the same length (or a 1-D array
+    of objects otherwise). Optional, default is False.
+    @type is_sequence: boolean
+    @return: The times (numpy.datetime64 in microseconds) and values.
+    @rtype: (numpy.ndarray, numpy.ndarray) pair
+    @raise ValueError: If there is no decoder for a chunk format.
+    """
+    times = []
+    values = []
+    for chunk in chunks:
+        t, v = decode(chunk)
+        times.append(t)
+        values.extend(v)
+    if not times:
+        return numpy.array([], dtype=_TIME_TYPE), numpy.array([])
+    times = numpy.concatenate(times)
+    values = _to_array(values, is_sequence)
+    if len(times) > 1 and (times[1:] < times[:-1]).any():
+        # chunks of several property IDs may overlap
+        order = numpy.argsort(times, kind="mergesort")
+        times = times[order]
+        values = values[order]
+    mask = numpy.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= numpy.datetime64(start, "us")
+    if end is not None:
+        mask &= times <= numpy.datetime64(end, "us")
+    if not mask.all():
+        times = times[mask]
+        values = values[mask]
+    return times, values
+
+
+def decode_measurements(measurements, is_sequence=False):
+    """
+    Decode the measurements of a time-series collection into arrays.
+
+    @param measurements: The measurements in chronological order
+    (cf. ctamonitoring.property_recorder.backend.mongodb.timeseries).
+    @type measurements: iterable of dict
+    @param is_sequence: The values are sequences (cf. decode_chunks()).
+    Optional, default is False.
+    @type is_sequence: boolean
+    @return: The times (numpy.datetime64 in microseconds) and values.
+    @rtype: (numpy.ndarray, numpy.ndarray) pair
+    """
+    times = []
+    values = []
+    for measurement in measurements:
+        times.append(measurement[mongodb_timeseries.TIME_FIELD])
+        values.append(measurement["val"])
+    return (numpy.array(times, dtype=_TIME_TYPE),
+            _to_array(values, is_sequence))
+
+
+def merge_rollups(rollups):
+    """
+    Combine rollups into arrays - one element per time bin.
+
+    @param rollups: The rollups in chronological order of their time bins
+    (cf. ctamonitoring.property_recorder.backend.mongodb.rollup).
+    @type rollups: iterable of dict
+    @return: The beginnings of the time bins (numpy.datetime64 in
+    microseconds) and the arrays "count", "min", "max" and "mean".
+    @rtype: (numpy.ndarray, dict) pair
+    """
+    merged = []
+    same_bin = []
+    for doc in rollups:
+        if same_bin and same_bin[0]["bin"] != doc["bin"]:
+            merged.append(rollup.merge(same_bin))
+            same_bin = []
+        same_bin.append(doc)
+    if same_bin:
+        merged.append(rollup.merge(same_bin))
+    bins = numpy.array([doc["bin"] for doc in merged], dtype=_TIME_TYPE)
+    return bins, {"count": numpy.array([doc["count"] for doc in merged],
+                                       dtype=numpy.int64),
+                  "min": numpy.array([doc["min"] for doc in merged]),
+                  "max": numpy.array([doc["max"] for doc in merged]),
+                  "mean": numpy.array([doc["mean"] for doc in merged],
+                                      dtype=numpy.float64)}
+
+
+def _get_range(start, end):
+    if not isinstance(start, datetime):
+        start = to_datetime(start)
+    if not isinstance(end, datetime):
+        end = to_datetime(end)
+    return start, end
+
+
+class Reader(object):
+    """
+    This reader gets the monitoring data of a property within a time range
+    from mongodb.
+    """
+
+    def __init__(self,
+                 database,
+                 properties="properties",
+                 chunks="chunks",
+                 uri="mongodb://localhost",
+                 client_options=None,
+                 batch_size=100,
+                 timeseries=False,
+                 log=None):
+        """
+        ctor.
+
+        @param database: Database name.
+        @type database: string
+        @param properties: Collection name of the property descriptions.
+        Optional, default is "properties".
+        @type properties: string
+        @param chunks: Collection name of the chunks.
+        Optional, default is "chunks".
+        @type chunks: string
+        @param uri: The mongodb URI. Optional, default is
+        "mongodb://localhost".
+        @type uri: string
+        @param client_options: The keyword arguments of MongoClient.
+        The reader shares the client with the registries and readers
+        of this process that use the same URI and client options
+        (cf. ctamonitoring.property_recorder.backend.mongodb.clients).
+        Optional, default is None.
+        @type client_options: dict
+        @param batch_size: The number of chunks that are fetched
+        from the server per round trip. Optional, default is 100.
+        @type batch_size: int
+        @param timeseries: <chunks> is a time-series collection of
+        measurements (cf. the mongodb Registry). Optional,
+        default is False.
+        @type timeseries: boolean
+        @param log: An external logger to write log messages to.
+        Optional, default is None.
+        @type log: logging.Logger
+        """
+        self._log = log
+        if not self._log:
+            self._log = getLogger(defaultname)
+        self._batch_size = batch_size
+        self._timeseries = timeseries
+        self._client = clients.get_client(uri, self._log, client_options)
+        self._database = self._client[database]
+        self._properties = self._database[properties]
+        self._chunks = self._database[chunks]
+
+    def _get_property_descs(self, component_name, property_name):
+        # a property may have been registered with different meta data
+        property_descs = list(self._properties.find(
+            {"component_name": component_name,
+             "property_name": property_name},
+            projection=["property_type", "chunk_size"]))
+        if not property_descs:
+            raise KeyError("unknown property %s/%s" %
+                           (component_name, property_name))
+        return property_descs
+
+    def read(self, component_name, property_name, start, end):
+        """
+        Get the data of a property within a time range.
+
+        @param component_name: Component name.
+        @type component_name: string
+        @param property_name: Property name.
+        @type property_name: string
+        @param start: The beginning of the time range.
+        @type start: datetime.datetime or a time that
+        ctamonitoring.property_recorder.backend.util.to_datetime() accepts
+        @param end: The end of the time range (inclusive).
+        @type end: datetime.datetime or a time that
+        ctamonitoring.property_recorder.backend.util.to_datetime() accepts
+        @return: The times (numpy.datetime64 in microseconds, UTC) and
+        values. The values of sequence properties are a 2-D array.
+        @rtype: (numpy.ndarray, numpy.ndarray) pair
+        @raise KeyError: If the property is unknown.
+        @raise ValueError: If there is no decoder for a chunk format.
+        """
+        start, end = _get_range(start, end)
+        property_descs = self._get_property_descs(component_name,
+                                                  property_name)
+        is_sequence = any(str(property_desc["property_type"])
+                          .endswith("_SEQ")
+                          for property_desc in property_descs)
+        if self._timeseries:
+            return self._read_measurements(property_descs, start, end,
+                                           is_sequence)
+        # a chunk keeps the data of one time bin - prune by "bin"
+        # (cf. the index on pid and bin) before looking at begin and end
+        bins = [{"pid": property_desc["_id"],
+                 "bin": {"$gt": start -
+                         timedelta(seconds=property_desc["chunk_size"]),
+                         "$lte": end}}
+                for property_desc in property_descs]
+        cursor = self._chunks.find({"$or": bins,
+                                    "begin": {"$lte": end},
+                                    "end": {"$gte": start}},
+                                   projection=_PROJECTION,
+                                   sort=[("bin", pymongo.ASCENDING),
+                                         ("begin", pymongo.ASCENDING)],
+                                   batch_size=self._batch_size)
+        return decode_chunks(cursor, start, end, is_sequence)
+
+    def _read_measurements(self, property_descs, start, end, is_sequence):
+        # the server prunes the buckets by meta field and time by itself
+        t = mongodb_timeseries.TIME_FIELD
+        cursor = self._chunks.find(
+            {mongodb_timeseries.META_FIELD + ".pid":
+             {"$in": [property_desc["_id"]
+                      for property_desc in property_descs]},
+             t: {"$gte": start, "$lte": end}},
+            projection=_MEASUREMENT_PROJECTION,
+            sort=[(t, pymongo.ASCENDING)],
+            batch_size=self._batch_size)
+        return decode_measurements(cursor, is_sequence)
+
+    def read_rollups(self, component_name, property_name, start, end,
+                     interval):
+        """
+        Get the rollups of a property within a time range.
+
+        @param component_name: Component name.
+        @type component_name: string
+        @param property_name: Property name.
+        @type property_name: string
+        @param start: The beginning of the time range - the rollup of
+        the time bin that contains it is the first one.
+        @type start: datetime.datetime or a time that
+        ctamonitoring.property_recorder.backend.util.to_datetime() accepts
+        @param end: The end of the time range (inclusive).
+        @type end: datetime.datetime or a time that
+        ctamonitoring.property_recorder.backend.util.to_datetime() accepts
+        @param interval: The rollup interval (cf. the mongodb Registry).
+        @type interval: datetime.timedelta or int
+        @return: The beginnings of the time bins (numpy.datetime64 in
+        microseconds, UTC) and the arrays "count", "min", "max" and "mean".
+        @rtype: (numpy.ndarray, dict) pair
+        @raise KeyError: If the property is unknown.
+        """
+        start, end = _get_range(start, end)
+        interval = rollup.get_interval(interval)
+        property_descs = self._get_property_descs(component_name,
+                                                  property_name)
+        col = self._chunks["rollup_%d" % (interval,)]
+        cursor = col.find({"pid": {"$in": [property_desc["_id"]
+                                           for property_desc
+                                           in property_descs]},
+                           "bin": {"$gte": get_floor(
+                               start, timedelta(seconds=interval), True),
+                               "$lte": end}},
+                          projection=_ROLLUP_PROJECTION,
+                          sort=[("bin", pymongo.ASCENDING)],
+                          batch_size=self._batch_size)
+        return merge_rollups(cursor)
+
+    def close(self):
+        """Release the connection to mongodb."""
+        if self._client is not None:
+            clients.release_client(self._client)
+            self._client = None
@@ -12,40 +12,62 @@ The mongodb registry and buffer
 @change: $LastChangedDate$
 @change: $LastChangedBy$
 @requires: bson
-@requires: copy
+@requires: ctamonitoring.property_recorder.backend.batch_controller
 @requires: ctamonitoring.property_recorder.backend.dummy.registry
 @requires: ctamonitoring.property_recorder.backend.exceptions
+@requires: ctamonitoring.property_recorder.backend.mongodb.chunk_format
+@requires: ctamonitoring.property_recorder.backend.mongodb.clients
+@requires: ctamonitoring.property_recorder.backend.mongodb.indexes
+@requires: ctamonitoring.property_recorder.backend.mongodb.rollup
+@requires: ctamonitoring.property_recorder.backend.mongodb.timeseries
 @requires: ctamonitoring.property_recorder.backend.ring_buffer
+@requires: ctamonitoring.property_recorder.backend.spill_file
 @requires: ctamonitoring.property_recorder.backend.util
 @requires: datetime
+@requires: heapq
+@requires: itertools
 @requires: pymongo
 @requires: threading
 @requires: time
+@requires: weakref
 @requires: Acspy.Common.Log or logging
-@requires: mongo_proxy
 """
 
 
 import bson
-import copy
+from ctamonitoring.property_recorder.backend.batch_controller \
+    import BatchController
 import ctamonitoring.property_recorder.backend.dummy.registry
 from ctamonitoring.property_recorder.backend.exceptions \
     import InterruptedException
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb import clients
+from ctamonitoring.property_recorder.backend.mongodb \
+    import indexes as mongodb_indexes
+from ctamonitoring.property_recorder.backend.mongodb import rollup
+from ctamonitoring.property_recorder.backend.mongodb \
+    import timeseries as mongodb_timeseries
 from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
-from ctamonitoring.property_recorder.backend.util import to_datetime
-from ctamonitoring.property_recorder.backend.util import get_floor
+from ctamonitoring.property_recorder.backend.spill_file import SpillFile
+from ctamonitoring.property_recorder.backend.util import from_microseconds
+from ctamonitoring.property_recorder.backend.util import to_microseconds
 from ctamonitoring.property_recorder.backend.util import get_total_seconds
 from ctamonitoring.property_recorder.backend.mongodb \
     import __name__ as defaultname
 from datetime import datetime
 from datetime import timedelta
+from heapq import heappop
+from heapq import heappush
+from itertools import count
 import pymongo
-from pymongo import MongoClient
 from pymongo.errors import AutoReconnect
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
 from threading import Event
+from threading import Lock
 from threading import Thread
-from threading import ThreadError
 import time
+from weakref import WeakSet
 
 try:
     from Acspy.Common.Log import getLogger
@@ -53,98 +75,16 @@ except ImportError:
     # use the standard logging module if this doesn't run in an ACS system
     from logging import getLogger
 
-try:
-    from mongo_proxy import MongoProxy
-    MONGO_PROXY_WAIT_TIME = 20
-    MONGO_PROXY_DISCONNECT_ON_TIMEOUT = True
-except ImportError:
-    MongoProxy = None
-
-
-class MongoSimpleLock(object):
-    """
-    A simple, distributed lock on the basis of MongoDB.
-
-    MongoSimpleLock creates a document that identifies the resource
-    to protect and its 'user' in a 'lock collection' while it is
-    locked. This document is deleted when it is released.
-    However, a 'user' may 'miss' to release it (like during a crash).
-    This is why MongoSimpleLock will 'self release' after a given duration
-    (cf. create_index).
-    """
 
-    def __init__(self, col, id, uid, expire_after=timedelta(seconds=180)):
-        """
-        ctor.
 
-        @param col: The 'lock collection'.
-        @type: pymongo.database.Collection
-        @param id: Identifies the resource to protect by the lock.
-        This ID must be unique.
-        @type: pymongo.ObjectId
-        @param uid: Identifies the 'user' who acquires the lock.
-        Only this 'user' can release the lock before 'self release'.
-        This ID must be unique.
-        @type: pymongo.ObjectId
-        @param expire_after: The lock will expire (self release) after
-        this duration.
-        Optional, default is 3 minutes.
-        @type expire_after: datetime.timedelta
-        """
-        self._col = col
-        self._doc = {"_id": id,
-                     "uid": uid}
-        self._expire_after = expire_after
-
-    def acquire(self, blocking=True):
-        """
-        Acquire the lock, blocking or non-blocking.
-
-        @param blocking: When invoked with the blocking argument set to True
-        (the default), block until the lock is unlocked, then set it to locked.
-        @type blocking: boolean
-        @return: True if the lock was locked.
-        @rtype: boolean
-        """
-        retval = False
-        doc = copy.deepcopy(self._doc)
-        i = 0
-        while not retval:
-            try:
-                doc["expire_at"] = datetime.utcnow() + self._expire_after
-                self._col.insert_one(doc)
-                retval = True
-            except pymongo.errors.DuplicateKeyError:
-                if not blocking:
-                    break
-                time.sleep(min(5, pow(2, i)))
-                i += 1
-        return retval
-
-    def release(self):
-        """
-        Release the lock.
-
-        @raise threading.ThreadError: When invoked on an unlocked lock.
-        """
-        result = self._col.delete_one(self._doc)
-        if result.acknowledged and not result.deleted_count:
-            raise ThreadError()
-
-    @staticmethod
-    def create_index(col):
-        """
-        Create an index on the 'lock collection' that supports TTL.
-
-        MongoSimpleLocks are intended to expire (self release) after a
-        given duration. This is achieved by an index for 'expire_at'
-        and an 'expireAfterSeconds' time equal 0.
-        If this index is not created MongoSimpleLock will not support
-        'self release'.
-        @param col: The 'lock collection'.
-        @type col: pymongo.database.Collection
-        """
-        col.create_index("expire_at", expireAfterSeconds=0)
+_DUPLICATE_KEY = 11000
+# errors that might go away by themselves (cf. the retryable errors of
+# the mongodb drivers)
+_RETRYABLE_CODES = frozenset((6, 7, 89, 91, 189, 262, 9001, 10107,
+                              11600, 11602, 13435, 13436))
+_MAX_RETRIES = 5
+_RETRY_BACKOFF_MIN = 0.1  # seconds
+_RETRY_BACKOFF_MAX = 30.0  # seconds
 
 
 class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
@@ -158,7 +98,9 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
     def __init__(self, log, fifo, chunk_size,
                  property_id, log_id, log_col,
                  component_name, property_name,
-                 disable, skip_unchanged):
+                 disable, skip_unchanged,
+                 fmt=chunk_format.FORMAT_DOCUMENTS, codec=None,
+                 current_log_col=None, rollups=None):
         """
         ctor.
 
@@ -191,6 +133,21 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         @param skip_unchanged: Skip recording of multiple values within one chunk, if
         the values are the same. Optional, default is False
         @type skip_unchanged: boolean
+        @param fmt: The chunk format version
+        (cf. ctamonitoring.property_recorder.backend.mongodb.chunk_format).
+        Optional, default is FORMAT_DOCUMENTS.
+        @type fmt: int
+        @param codec: The value codec if fmt is FORMAT_COMPRESSED.
+        Optional, default is None.
+        @type codec: string
+        @param current_log_col: This is the collection of the current log
+        documents to close the current data taking period in as well.
+        Optional, default is None.
+        @type current_log_col: pymongo.database.Collection
+        @param rollups: The intervals in seconds to aggregate numbers in
+        (cf. ctamonitoring.property_recorder.backend.mongodb.rollup).
+        Optional, default is None - no rollups.
+        @type rollups: list of int
         """
         log.debug("creating buffer %s/%s" % (component_name, property_name))
         super(Buffer, self).__init__()
@@ -198,14 +155,24 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         self._skip_unchanged = skip_unchanged
         self._fifo = fifo
         self._chunk_size = chunk_size
+        self._chunk_us = get_total_seconds(chunk_size, True) * 1000000
         self._property_id = property_id
         self._log_id = log_id
         self._log_col = log_col
+        self._current_log_col = current_log_col
         self._component_name = component_name
         self._property_name = property_name
         self._disable = disable
+        self._fmt = fmt
+        self._codec = codec
         self._bin_begin = None
+        self._bin_us = None
+        self._end_us = None
         self._doc = None
+        self._written = None  # the recorder's time of the last data point
+        self._rollups = dict.fromkeys(rollups or [])
+        self._rollup_bins = dict.fromkeys(rollups or [])
+        self._lock = Lock()
         self._canceled = False  # keep this the last line in ctor
         self._value = None
 
@@ -222,32 +189,103 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             raise RuntimeError("unregistered property %s/%s - buffer is closed." %
                                (self._component_name, self._property_name))
         if not self._disable:
-            t = to_datetime(tm)
-            bin_begin = get_floor(t, self._chunk_size, True)
-            if self._bin_begin is not None and bin_begin != self._bin_begin:
-                if self._doc and self._doc["end"] is not None:
-                    self._fifo.add(self._doc)
-                    self._value = None # flush the current value, so that next chunk includes a value again, if add(...) is called in the meanwhile
-                self._bin_begin = None
-                self._doc = None
-            if self._bin_begin is None:
-                self._bin_begin = bin_begin
-                self._doc = {"begin": t, "end": None,
-                             "values": [],
-                             "bin": bin_begin, "pid": self._property_id}
-            is_changed = (self._value is None) or (self._value != dt)
-            if not self._skip_unchanged or is_changed:
-                self._value = dt
-                self._doc["values"].append({"t": t, "val": dt})
-            else:
-                #self._log.debug("skipping %s/%s, new value is unchanged, value: %s" %
-                #        (self._component_name, self._property_name, str(dt)))
-                pass
-            self._doc["end"] = t
+            # bin by integer arithmetic and build date + times
+            # only where BSON needs them
+            t_us = to_microseconds(tm)
+            # the sealer may publish the chunk meanwhile (cf. seal())
+            with self._lock:
+                self._add(t_us, dt)
+                self._written = time.time()
         else:
             self._log.warn("property monitoring for %s/%s is disabled" %
                            (self._component_name, self._property_name))
 
+    def _add(self, t_us, dt):
+        bin_us = t_us - t_us % self._chunk_us
+        if self._doc is not None and bin_us != self._bin_us:
+            self._publish_chunk()
+        if self._doc is None:
+            self._bin_us = bin_us
+            self._bin_begin = from_microseconds(bin_us)
+            self._doc = chunk_format.new_chunk(from_microseconds(t_us),
+                                               self._bin_begin,
+                                               self._property_id,
+                                               self._fmt, self._codec)
+        is_changed = (self._value is None) or (self._value != dt)
+        if not self._skip_unchanged or is_changed:
+            self._value = dt
+            if self._fmt == chunk_format.FORMAT_DOCUMENTS:
+                chunk_format.append(self._doc, from_microseconds(t_us), dt)
+            else:
+                chunk_format.append_offset(self._doc, t_us - bin_us, dt)
+        else:
+            #self._log.debug("skipping %s/%s, new value is unchanged, value: %s" %
+            #        (self._component_name, self._property_name, str(dt)))
+            pass
+        self._end_us = t_us  # "end" is set when the chunk is published
+        if self._rollups and rollup.is_number(dt):
+            self._add_to_rollups(t_us, dt)
+
+    def _pop_chunk(self):
+        doc = self._doc
+        if doc is not None:
+            doc["end"] = from_microseconds(self._end_us)
+        self._bin_begin = None
+        self._bin_us = None
+        self._doc = None
+        return doc
+
+    def _publish_chunk(self):
+        doc = self._pop_chunk()
+        if doc is not None:
+            self._fifo.add(doc, self._log_id)
+            self._value = None # flush the current value, so that next chunk includes a value again, if add(...) is called in the meanwhile
+
+    def _add_to_rollups(self, t_us, val):
+        t = from_microseconds(t_us)
+        for interval, doc in self._rollups.items():
+            bin_us = t_us - t_us % (interval * 1000000)
+            if doc is not None and self._rollup_bins[interval] != bin_us:
+                self._fifo.add(doc, self._log_id)
+                doc = None
+            if doc is None:
+                doc = rollup.new_rollup(interval, from_microseconds(bin_us),
+                                        self._property_id)
+                self._rollups[interval] = doc
+                self._rollup_bins[interval] = bin_us
+            rollup.append(doc, t, val)
+
+    def seal(self, end):
+        """
+        Publish the chunk and rollups whose time bins are over.
+
+        This is called by the sealer of the registry so that
+        the data of properties that are updated rarely (or not anymore)
+        doesn't stay in the buffer until the next data point arrives.
+
+        A time bin is over when no data point was added for (at least)
+        the length of the bin - by the clock of the recorder. The time of
+        the data points isn't used since it may be historic or come from
+        a device whose clock is off, which would seal the same bin again
+        and again.
+
+        @param end: Seal the time bins whose last data point was added
+        one bin length before or at this time.
+        @type end: float - seconds since the epoch (cf. time.time())
+        """
+        if self._disable or self._canceled:
+            return
+        with self._lock:
+            if self._written is None:
+                return
+            if (self._doc is not None and
+                    self._written + self._chunk_us / 1000000.0 <= end):
+                self._publish_chunk()
+            for interval, doc in self._rollups.items():
+                if doc is not None and self._written + interval <= end:
+                    self._fifo.add(doc, self._log_id)
+                    self._rollups[interval] = None
+
     def flush(self):
         """
         @raise ctamonitoring.property_recorder.backend.exceptions.InterruptedException:
@@ -255,11 +293,17 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.flush()
         """
         if not self._disable and not self._canceled:
-            if self._doc and self._doc["end"] is not None:
-                self._fifo.add(self._doc)
-            self._bin_begin = None
-            self._doc = None
-            self._fifo.flush(current=True)
+            # don't wait for the chunks of other properties,
+            # use the priority lane of the FIFO
+            with self._lock:
+                doc = self._pop_chunk()
+                if doc is not None:
+                    self._fifo.add(doc, self._log_id, priority=True)
+                for interval, doc in self._rollups.items():
+                    if doc is not None:
+                        self._fifo.add(doc, self._log_id, priority=True)
+                        self._rollups[interval] = None
+            self._fifo.flush(producer=self._log_id)
 
     def close(self):
         """
@@ -276,8 +320,15 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             try:
                 self.flush()
             finally:
+                end = datetime.now()
                 self._log_col.update_one({"_id": self._log_id},
-                                         {"$set": {"end": datetime.now()}})
+                                         {"$set": {"end": end}})
+                if self._current_log_col is not None:
+                    # the current log document may belong to a later
+                    # data taking period (cf. Registry.register(force=True))
+                    self._current_log_col.update_one(
+                        {"_id": self._property_id, "lid": self._log_id},
+                        {"$set": {"end": end}})
                 self._canceled = True
 
     def __del__(self):
@@ -299,12 +350,76 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             pass
 
 
+class TimeseriesBuffer(Buffer):
+    """
+    This buffer stores monitoring/time series data as measurements in
+    a mongodb time-series collection - one per data point
+    (cf. ctamonitoring.property_recorder.backend.mongodb.timeseries).
+
+    The measurements take the same FIFO plus consumer thread(s) as chunks
+    - the measurements of a time bin (chunk_size) are one FIFO item that
+    is published when the bin is over, sealed or flushed, so that
+    the FIFO size counts time bins per property as it does for chunks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        ctor.
+
+        @see ctamonitoring.property_recorder.backend.mongodb.registry.Buffer.__init__()
+        """
+        super(TimeseriesBuffer, self).__init__(*args, **kwargs)
+        self._meta = mongodb_timeseries.get_meta(self._property_id,
+                                                 self._component_name,
+                                                 self._property_name)
+
+    def _add(self, t_us, dt):
+        bin_us = t_us - t_us % self._chunk_us
+        if self._doc is not None and bin_us != self._bin_us:
+            self._publish_chunk()
+        if self._doc is None:
+            self._bin_us = bin_us
+            self._bin_begin = from_microseconds(bin_us)
+            self._doc = []
+        # skip unchanged values within the time span of a chunk
+        # - like the chunks do
+        if (not self._skip_unchanged or
+                self._value is None or self._value != dt):
+            self._value = dt
+            self._doc.append(mongodb_timeseries.new_measurement(
+                from_microseconds(t_us), dt, self._meta))
+        if self._rollups and rollup.is_number(dt):
+            self._add_to_rollups(t_us, dt)
+
+    def _pop_chunk(self):
+        # the measurements of the time bin
+        measurements = self._doc
+        self._bin_begin = None
+        self._bin_us = None
+        self._doc = None
+        return measurements or None
+
+
+def _get_docs(items):
+    # the documents to insert of FIFO items: sealed chunks, rollups and
+    # the measurements of time bins (cf. TimeseriesBuffer)
+    docs = []
+    for item in items:
+        if isinstance(item, list):
+            docs.extend(item)
+        else:
+            docs.append(chunk_format.seal(item))
+    return docs
+
+
 class _Worker(Thread):
-    def __init__(self, uri, chunks, chunk_size, fifo, log):
+    def __init__(self, uri, chunks, chunk_size, fifo, batch, log,
+                 rollups=None):
         log.debug("creating mongodb worker")
         super(_Worker, self).__init__()
         self._uri = uri
         self._chunks = chunks
+        self._rollups = rollups or {}  # the collections per interval
         if chunk_size is None:
             self._timeout = None
         else:
@@ -313,16 +428,27 @@ class _Worker(Thread):
             if self._timeout < 0.1:
                 self._timeout = 0.1
         self._fifo = fifo
+        self._batch = batch
         self._log = log
-        self._n = 10
+        self._retries = []  # heap of chunks that wait for a retry
+        self._retry_seq = count()
+        self.n_retries = 0
+        self.n_rejected = 0
         self._canceled = Event()
         self._canceled.clear()
 
     def run(self):
         try:
             while not self._canceled.is_set():
+                timeout = self._timeout
+                if self._retries:
+                    # wake up in time for the next retry
+                    wait = max(0, self._retries[0][0] - time.time())
+                    if timeout is None or wait < timeout:
+                        timeout = wait
                 try:
-                    chunks = self._fifo.get(n=self._n, timeout=self._timeout)
+                    n = self._batch.get_size(len(self._fifo))
+                    chunks = self._fifo.get(n=n, timeout=timeout)
                 except InterruptedException:
                     self._log.info("request to cancel mongodb worker")
                     continue
@@ -330,35 +456,236 @@ class _Worker(Thread):
                     self._log.exception("oups, unexpected exception... " +
                                         "ignore and continue")
                     continue
-                begin = 0
-                while begin < len(chunks) and not self._canceled.is_set():
-                    try:
-                        result = self._chunks.insert_many(chunks[begin:],
-                                                          ordered=True)
-                    except AutoReconnect:
-                        self._log.exception(("still %d chunks to insert " +
-                                             "into mongodb (%s)... " +
-                                             "keep trying") %
-                                            (len(chunks) - begin, self._uri))
-                    except:
-                        self._log.exception(("still %d chunks to insert " +
-                                             "into mongodb (%s)... " +
-                                             "keep trying") %
-                                            (len(chunks) - begin, self._uri))
-                        self._log.warn("skipping document: " +
-                                       str(chunks[begin]))
-                        begin += 1
-                    else:
-                        begin += len(result.inserted_ids)
+                chunks = _get_docs(chunks)
+                attempts = [0] * len(chunks)
+                now = time.time()
+                while self._retries and self._retries[0][0] <= now:
+                    _, _, n, chunk = heappop(self._retries)
+                    chunks.append(chunk)
+                    attempts.append(n)
+                if chunks:
+                    begin = time.time()
+                    self._insert(chunks, attempts)
+                    self._batch.update(len(chunks), time.time() - begin,
+                                       len(self._fifo))
         except:
             self._log.exception("exiting mongodb worker")
         else:
             self._log.info("exiting mongodb worker")
+        if self._retries:
+            self._log.warn("dropping %d chunks that wait for a retry" %
+                           (len(self._retries),))
+
+    def _insert(self, chunks, attempts):
+        if not self._rollups:
+            self._insert_into(self._chunks, chunks, attempts)
+            return
+        # rollups share the FIFO with the chunks - sort them out
+        docs = {}
+        for chunk, n in zip(chunks, attempts):
+            if rollup.is_rollup(chunk):
+                col = self._rollups.get(chunk["interval"])
+                if col is None:
+                    self._reject(chunk, "unknown rollup interval")
+                    continue
+            else:
+                col = self._chunks
+            col_docs = docs.setdefault(col.name, (col, [], []))
+            col_docs[1].append(chunk)
+            col_docs[2].append(n)
+        for col, col_chunks, col_attempts in docs.values():
+            self._insert_into(col, col_chunks, col_attempts)
+
+    def _insert_into(self, col, chunks, attempts):
+        backoff = _RETRY_BACKOFF_MIN
+        # an insert that seemed to fail may have inserted some chunks
+        submitted = False
+        while not self._canceled.is_set():
+            try:
+                col.insert_many(chunks, ordered=False)
+            except BulkWriteError as e:
+                self._handle_write_errors(chunks, attempts, e.details,
+                                          submitted)
+            except AutoReconnect:
+                submitted = True
+                # the database isn't available - no need to move on,
+                # keep the batch (and let the FIFO buffer new chunks)
+                self.n_retries += 1
+                self._log.exception(("still %d chunks to insert " +
+                                     "into mongodb (%s)... " +
+                                     "keep trying in %g s") %
+                                    (len(chunks), self._uri, backoff))
+                self._canceled.wait(backoff)
+                backoff = min(backoff * 2, _RETRY_BACKOFF_MAX)
+                continue
+            except:
+                self._log.exception(("cannot insert %d chunks " +
+                                     "into mongodb (%s)... " +
+                                     "insert one by one") %
+                                    (len(chunks), self._uri))
+                self._insert_one_by_one(col, chunks, attempts)
+            return
+
+    def _handle_write_errors(self, chunks, attempts, details,
+                             submitted=False):
+        # unordered inserts go on after an error - so, only the documents
+        # that are listed as errors didn't make it
+        for error in details.get("writeErrors", []):
+            i = error["index"]
+            code = error.get("code")
+            if code == _DUPLICATE_KEY and (submitted or attempts[i]):
+                # inserted by an earlier attempt that seemed to fail
+                continue
+            if code in _RETRYABLE_CODES:
+                self._retry(chunks[i], attempts[i] + 1, error.get("errmsg"))
+            else:
+                self._reject(chunks[i], error.get("errmsg"))
+        if details.get("writeConcernErrors"):
+            self._log.warn("write concern errors while inserting " +
+                           "into mongodb (%s): %s" %
+                           (self._uri, details["writeConcernErrors"]))
+
+    def _insert_one_by_one(self, col, chunks, attempts):
+        for chunk, n in zip(chunks, attempts):
+            try:
+                col.insert_one(chunk)
+            except DuplicateKeyError:
+                # the failed batch insert may have inserted it
+                pass
+            except AutoReconnect as e:
+                self._retry(chunk, n + 1, e)
+            except Exception as e:
+                self._reject(chunk, e)
+
+    def _retry(self, chunk, n, reason):
+        if n > _MAX_RETRIES:
+            self._reject(chunk, reason)
+            return
+        self.n_retries += 1
+        backoff = min(_RETRY_BACKOFF_MIN * 2 ** (n - 1), _RETRY_BACKOFF_MAX)
+        self._log.warn("cannot insert document into mongodb (%s): %s... " %
+                       (self._uri, reason) +
+                       "retry %d in %g s" % (n, backoff))
+        heappush(self._retries,
+                 (time.time() + backoff, next(self._retry_seq), n, chunk))
+
+    def _reject(self, chunk, reason):
+        self.n_rejected += 1
+        self._log.warn("cannot insert document into mongodb (%s): %s" %
+                       (self._uri, reason))
+        self._log.warn("skipping document: " + str(chunk))
+
+    def cancel(self):
+        self._canceled.set()
+
+
+class _Sealer(Thread):
+    """
+    A timer thread that seals the chunks and rollups of all buffers of
+    a registry once their time bins are over (cf. Buffer.seal()).
+    """
+
+    def __init__(self, interval, grace, log):
+        log.debug("creating mongodb sealer")
+        super(_Sealer, self).__init__()
+        self._interval = interval
+        self._grace = grace
+        self._log = log
+        self._buffers = WeakSet()  # closed buffers may be released anytime
+        self._lock = Lock()
+        self._canceled = Event()
+        self._canceled.clear()
+
+    def add(self, buffer):
+        with self._lock:
+            self._buffers.add(buffer)
+
+    def seal(self):
+        with self._lock:
+            buffers = list(self._buffers)
+        # the recorder's clock (cf. Buffer.seal())
+        end = time.time() - get_total_seconds(self._grace)
+        for buffer in buffers:
+            try:
+                buffer.seal(end)
+            except InterruptedException:
+                self._log.info("request to cancel mongodb sealer")
+                return
+            except:
+                self._log.exception("oups, unexpected exception... " +
+                                    "ignore and continue")
+
+    def run(self):
+        while not self._canceled.wait(self._interval):
+            self.seal()
+        self._log.info("exiting mongodb sealer")
 
     def cancel(self):
         self._canceled.set()
 
 
+class _WorkerPool(object):
+    """
+    The FIFO plus consumer thread(s) that insert the chunks of one or more
+    registries into the same collections.
+    """
+
+    def __init__(self, uri, client_options, database, chunks,
+                 rollup_intervals, chunk_size,
+                 fifo_size, fifo_bytes, spill_dir, spill_max_bytes,
+                 n_workers, batch_size_min, batch_size_max, batch_latency,
+                 worker_is_daemon, log):
+        self._log = log
+        # the pool may outlive the registry that created it,
+        # client_options are the (hashable) items of the pool key
+        self._client = clients.get_client(uri, log, dict(client_options))
+        chunks = self._client[database][chunks]
+        rollups = dict((interval, chunks["rollup_%d" % (interval,)])
+                       for interval in rollup_intervals)
+        self.worker_is_daemon = worker_is_daemon
+        self.spill = None
+        if spill_dir is not None:
+            self.spill = SpillFile(spill_dir, spill_max_bytes,
+                                   prefix=defaultname + "_")
+        self.fifo = RingBuffer(fifo_size,
+                               multi_consumer=(n_workers > 1),
+                               spill=self.spill,
+                               maxbytes=fifo_bytes,
+                               sizer=chunk_format.get_approx_chunk_size)
+        self.batch = BatchController(batch_size_min, batch_size_max,
+                                     batch_latency, 10)
+        self.workers = []
+        for _ in range(n_workers):
+            worker = _Worker(uri, chunks, chunk_size, self.fifo, self.batch,
+                             log, rollups)
+            worker.daemon = worker_is_daemon
+            worker.start()
+            self.workers.append(worker)
+
+    def close(self):
+        # Workers traditionally run as daemon threads but this seems
+        # not to work within an ACS component. Cancel all workers
+        # in case they aren't daemons...
+        # Workers may block calling RingBuffer.get() --> terminate the
+        # ring buffer in addition!
+        # Note: data that is in the ring buffer will be lost but
+        # the frontend is supposed to flush it before it releases
+        # the registry.
+        if not self.worker_is_daemon:
+            for worker in self.workers:
+                worker.cancel()
+            self.fifo.terminate()
+            for worker in self.workers:
+                worker.join()
+            if self.spill is not None:
+                self.spill.close()
+            # daemon workers may still use the client
+            clients.release_client(self._client)
+
+
+_pools = clients.SharedCache(_WorkerPool, _WorkerPool.close)
+
+
 class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
     """
     This is the mongodb registry to register a property
@@ -370,10 +697,25 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                  properties="properties",
                  chunks="chunks",
                  uri="mongodb://localhost",
+                 client_options=None,
                  skip_unchanged=False,
+                 columnar=False,
+                 compress=False,
                  chunk_size=timedelta(seconds=60),
+                 rollups=None,
+                 timeseries=None,
                  fifo_size=1000,
+                 fifo_bytes=0,
+                 spill_dir=None,
+                 spill_max_bytes=1024**3,
                  n_workers=1,
+                 share_workers=False,
+                 batch_size_min=1,
+                 batch_size_max=100,
+                 batch_latency=0.5,
+                 indexes="ensure",
+                 seal_interval=1.0,
+                 seal_grace=timedelta(seconds=5),
                  worker_is_daemon=False,
                  log=None,
                  *args, **kwargs):
@@ -384,6 +726,8 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         @type database: string
         @param logs: Collection name.
         This collection keeps information when a property was "monitored".
+        The sub-collection <logs>.current keeps the current data taking
+        period per property. It is updated atomically to open a new one.
         Optional, default is "log".
         @type logs: string
         @param properties: Collection name.
@@ -397,23 +741,106 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         @type chunks: string
         @param uri: mongodb URI. Optional, default is "mongodb://localhost".
         @type uri: string
+        @param client_options: The keyword arguments of MongoClient, e.g.
+        maxPoolSize. Registries (and readers) with the same URI and client
+        options share one client within a process
+        (cf. ctamonitoring.property_recorder.backend.mongodb.clients).
+        Optional, default is None.
+        @type client_options: dict
         @param skip_unchanged: Skip recording of multiple values within one chunk, if
         the values are the same. Optional, default is False
         @type skip_unchanged: boolean
+        @param columnar: Store the times and values of a chunk in parallel
+        arrays (times as integer offsets from the time bin) instead of
+        a sub-document per data point. This saves memory and storage.
+        Chunks get a format version "fmt" so readers can tell
+        the layouts apart. Optional, default is False.
+        @type columnar: boolean
+        @param compress: Store the times and values of a chunk as
+        compressed binary blocks (delta-of-delta times plus XOR encoded
+        floating point numbers or zigzag varint encoded integers).
+        Properties of other types are stored in columnar chunks.
+        Optional, default is False.
+        @type compress: boolean
         @param chunk_size: Specifies the time duration within monitoring data
         is safed into a chunk (fraction of seconds will be ignored).
         Optional, default is 1 minute.
         The chunk size can be given as a timedelta or a 'number of seconds'.
         @type chunk_size: datetime.timedelta or int or float
+        @param rollups: Coarser intervals to aggregate numbers in
+        (min, max, mean and count,
+        cf. ctamonitoring.property_recorder.backend.mongodb.rollup).
+        The rollups of an interval go into the collection
+        <chunks>.rollup_<interval in seconds>, e.g. chunks.rollup_3600.
+        Optional, default is None - no rollups.
+        @type rollups: list of datetime.timedelta or int
+        @param timeseries: Store a measurement per data point in
+        the time-series collection <chunks> instead of chunks
+        (cf. ctamonitoring.property_recorder.backend.mongodb.timeseries).
+        This needs mongodb 5.0 or later. The value is the bucketing
+        granularity: "seconds", "minutes", "hours" (or True for "seconds").
+        columnar and compress don't apply to measurements. The measurements
+        of a property within chunk_size are one item of the FIFO.
+        Optional, default is None - store chunks.
+        @type timeseries: string
         @param fifo_size: Sets the upperbound limit on the number of chunks
         that can be placed in the FIFO before overwriting older chunks.
         The FIFO decouples the producers of monitoring data (frontend,
         backend buffers) and the consumer thread(s) that insert(s) the data
         into mongodb. Optional, default is 1000.
         @type fifo_size: int
+        @param fifo_bytes: Sets the upperbound limit on the approximate
+        number of bytes of the chunks in the FIFO before overwriting older chunks.
+        The FIFO is full if either fifo_size or fifo_bytes is reached.
+        Less than or equal to zero means no limit. Optional, default is 0.
+        @type fifo_bytes: int
+        @param spill_dir: Directory to spill chunks to once the FIFO is full
+        - instead of overwriting older chunks. Consumers drain the spill file
+        in order when the database is available again. Optional, default is
+        None (no spill file).
+        @type spill_dir: string
+        @param spill_max_bytes: Sets the upperbound limit on the number of
+        bytes the spill file may use before its oldest chunks are dropped.
+        Less than or equal to zero means no limit. Optional, default is 1 GiB.
+        @type spill_max_bytes: int
         @param n_workers: Number of consumer threads, so called workers.
         Optional, default is 1.
         @type n_workers: int
+        @param share_workers: Share the FIFO and workers with the other
+        registries of this process that write to the same chunks (and
+        rollups) collections with the same FIFO and worker settings.
+        This bounds the number of threads and connections if a process
+        creates several registries, e.g. as the children of a fork
+        registry. Optional, default is False.
+        @type share_workers: bool
+        @param batch_size_min: The minimum number of chunks a worker
+        inserts at once. Optional, default is 1.
+        @type batch_size_min: int
+        @param batch_size_max: The maximum number of chunks a worker
+        inserts at once. The batch size adapts in between
+        (cf. ctamonitoring.property_recorder.backend.batch_controller).
+        Optional, default is 100.
+        @type batch_size_max: int
+        @param batch_latency: The target latency of a batch in seconds.
+        Optional, default is 0.5.
+        @type batch_latency: float
+        @param indexes: Index management at startup
+        (cf. ctamonitoring.property_recorder.backend.mongodb.indexes):
+        "ensure" creates the missing indexes, "background" builds them
+        in the background, "verify" only logs the missing and unused ones
+        and None leaves the indexes alone. Optional, default is "ensure".
+        @type indexes: string
+        @param seal_interval: The period in seconds a timer thread
+        checks all buffers for chunks and rollups whose time bins are over
+        to publish them without waiting for the next data point.
+        None disables sealing. Optional, default is 1 second.
+        @type seal_interval: float
+        @param seal_grace: The time a chunk is kept for late data points
+        after its time bin is over, i.e. after no data point was added
+        for the length of the bin. Optional, default is 5 seconds.
+        The grace period can be given as a timedelta or
+        a 'number of seconds'.
+        @type seal_grace: datetime.timedelta or int or float
         @param worker_is_daemon: Workers traditionally run as daemon threads
         but this seems not to work within an ACS component. So this is your
         choice ;). We will try to stop all workers in the destructor in case
@@ -434,49 +861,97 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         self._chunks_name = chunks
         self._uri = uri
         self._skip_unchanged = skip_unchanged
+        if columnar:
+            self._chunk_format = chunk_format.FORMAT_COLUMNAR
+        else:
+            self._chunk_format = chunk_format.FORMAT_DOCUMENTS
+        self._compress = compress
         if isinstance(chunk_size, timedelta):
             self._chunk_size = chunk_size
         else:
             self._chunk_size = timedelta(seconds=chunk_size)
+        self._rollup_intervals = sorted(set(rollup.get_interval(interval)
+                                            for interval in rollups or []))
 
-        cl = MongoClient(uri)
-        assert cl.write_concern.acknowledged
-        # Starting with version 3.0 the MongoClient constructor no longer
-        # blocks while connecting to the server or servers, and it no longer
-        # raises ConnectionFailure if they are unavailable,
-        # nor ConfigurationError if the user’s credentials are wrong.
-        # Instead, the constructor returns immediately and launches
-        # the connection process on background threads.
-        # Check if the server is available...
-        # The ismaster command is cheap and does not require auth.
-        cl.admin.command('ismaster')
-        if MongoProxy is not None:
-            self._client = \
-                MongoProxy(cl,
-                           logger=self._log,
-                           wait_time=MONGO_PROXY_WAIT_TIME,
-                           disconnect_on_timeout=MONGO_PROXY_DISCONNECT_ON_TIMEOUT)
-        else:
-            self._client = cl
+        self._client = clients.get_client(uri, self._log, client_options)
 
         self._database = self._client[database]
         self._logs = self._database[logs]
-        self._logs_locks = self._logs["locks"]
-        MongoSimpleLock.create_index(self._logs_locks)
+        self._current_logs = self._logs["current"]
         self._properties = self._database[properties]
-        self._chunks = self._database[chunks]
+        if timeseries:
+            if timeseries is True:
+                timeseries = "seconds"
+            self._chunks = mongodb_timeseries.create_collection(
+                self._database, chunks, timeseries)
+        else:
+            self._chunks = self._database[chunks]
+        self._timeseries = bool(timeseries)
+        self._rollups = dict((interval,
+                              self._chunks["rollup_%d" % (interval,)])
+                             for interval in self._rollup_intervals)
+        if indexes in ("ensure", "background"):
+            mongodb_indexes.ensure_indexes(self._get_collections(),
+                                           indexes == "background")
+        elif indexes == "verify":
+            self.verify_indexes()
+        elif indexes is not None:
+            raise ValueError("unknown index management %r" % (indexes,))
 
         self._worker_is_daemon = worker_is_daemon
         if n_workers <= 0:
             n_workers = 1
-        self._fifo = RingBuffer(fifo_size)
-        self._workers = []  # keep this the last class member variable in ctor
-        for _ in range(n_workers):
-            worker = _Worker(uri, self._chunks,
-                             self._chunk_size, self._fifo, self._log)
-            worker.daemon = worker_is_daemon
-            worker.start()
-            self._workers.append(worker)
+        pool_args = (uri, clients.get_client_key(uri, client_options)[1],
+                     database, chunks, tuple(self._rollup_intervals),
+                     self._chunk_size,
+                     fifo_size, fifo_bytes, spill_dir, spill_max_bytes,
+                     n_workers, batch_size_min, batch_size_max, batch_latency,
+                     worker_is_daemon)
+        if share_workers:
+            self._pool = _pools.acquire(pool_args, *(pool_args + (self._log,)))
+        else:
+            self._pool = _WorkerPool(*(pool_args + (self._log,)))
+        self._share_workers = share_workers
+        self._spill = self._pool.spill
+        self._fifo = self._pool.fifo
+        self._batch = self._pool.batch
+        self._sealer = None
+        if seal_interval is not None:
+            if not isinstance(seal_grace, timedelta):
+                seal_grace = timedelta(seconds=seal_grace)
+            self._sealer = _Sealer(seal_interval, seal_grace, self._log)
+            self._sealer.daemon = worker_is_daemon
+            self._sealer.start()
+        self._workers = self._pool.workers  # keep this the last class member variable in ctor
+
+    def _get_collections(self):
+        collections = {("timeseries" if self._timeseries else "chunks"):
+                       self._chunks,
+                       "logs": self._logs,
+                       "properties": self._properties}
+        for interval, col in self._rollups.items():
+            collections["rollups.%d" % (interval,)] = col
+        return collections
+
+    def verify_indexes(self):
+        """
+        Find the indexes that are missing or were never used and
+        log a warning per collection.
+
+        @return: The report per collection role.
+        @see ctamonitoring.property_recorder.backend.mongodb.indexes.verify_indexes()
+        """
+        collections = self._get_collections()
+        report = mongodb_indexes.verify_indexes(collections)
+        for role, result in report.items():
+            name = collections[role].full_name
+            if result["missing"]:
+                self._log.warn("missing indexes on %s: %s" %
+                               (name, result["missing"]))
+            if result["unused"]:
+                self._log.warn("unused indexes on %s: %s" %
+                               (name, result["unused"]))
+        return report
 
     def _check_name(self, name, description):
         if not isinstance(name, str):
@@ -484,8 +959,43 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         if not name:
             raise ValueError("check " + description)
 
+    def _check_log_entry(self, log_entry, begin,
+                         component_name, property_name, force):
+        if log_entry["begin"] >= begin:
+            raise RuntimeError("oups, beginning of the latest log " +
+                               "entry for %s/%s " % (component_name,
+                                                     property_name) +
+                               "is in future!?!")
+        if log_entry["end"] is None and not force:
+            raise UserWarning("undefined end of the latest log " +
+                              "entry for %s/%s" % (component_name,
+                                                   property_name))
+
+    def _get_current_log_filter(self, property_id, begin, force):
+        # the current log document of a property may only be replaced by
+        # a later log period and - unless forced - if it was closed
+        current_log_filter = {"_id": property_id, "begin": {"$lt": begin}}
+        if not force:
+            current_log_filter["end"] = {"$ne": None}
+        return current_log_filter
+
+    def _get_current_log_update(self, log_id, begin):
+        return {"$set": {"lid": log_id, "begin": begin, "end": None}}
+
+    def _revert_current_log(self, property_id, log_id, log_entry):
+        # give a current log document that was created in spite of
+        # an inconsistent log entry of an older version back to this entry
+        self._current_logs.update_one({"_id": property_id, "lid": log_id},
+                                      {"$set": {"lid": log_entry["_id"],
+                                                "begin": log_entry["begin"],
+                                                "end": log_entry["end"]}})
+
     def _get_log_id(self, component_name, property_name,
                     property_id, disable, force):
+        # a new log period is opened by one atomic update of the current
+        # log document of the property. if the update doesn't match,
+        # the upsert fails on the duplicate property ID and the current
+        # log document tells why.
         begin = datetime.now()
         id = bson.ObjectId()
         log_desc = {"_id": id,
@@ -493,27 +1003,244 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                     "begin": begin,
                     "end": None,
                     "disabled": disable}
-        lock = MongoSimpleLock(self._logs_locks, property_id, id)
-        lock.acquire()
-        try:
+        while True:
+            try:
+                previous = self._current_logs.find_one_and_update(
+                    self._get_current_log_filter(property_id, begin, force),
+                    self._get_current_log_update(id, begin),
+                    upsert=True)
+                break
+            except DuplicateKeyError:
+                current_log = self._current_logs.find_one({"_id": property_id})
+                if current_log is not None:
+                    self._check_log_entry(current_log, begin,
+                                          component_name, property_name,
+                                          force)
+                # the current log document changed in between - try again
+        if previous is None:
+            # the first log period since there are current log documents,
+            # respect the log entries of older versions
             cursor = self._logs.find({"pid": property_id},
                                      sort=[("begin", pymongo.DESCENDING)],
                                      limit=1)
             for log_entry in cursor:
-                if log_entry["begin"] >= begin:
-                    raise RuntimeError("oups, beginning of the latest log " +
-                                       "entry for %s/%s " % (component_name,
-                                                             property_name) +
-                                       "is in future!?!")
-                if log_entry["end"] is None and not force:
-                    raise UserWarning("undefined end of the latest log " +
-                                      "entry for %s/%s" % (component_name,
-                                                           property_name))
-            self._logs.insert_one(log_desc)
-        finally:
-            lock.release()
+                try:
+                    self._check_log_entry(log_entry, begin,
+                                          component_name, property_name,
+                                          force)
+                except:
+                    self._revert_current_log(property_id, id, log_entry)
+                    raise
+        self._logs.insert_one(log_desc)
         return id
 
+    def _get_log_ids(self, entries):
+        # the batched version of _get_log_id():
+        # update the current log documents by one bulk write and insert
+        # the new log entries at once. properties whose current log document
+        # changed in between (or that are registered twice) take
+        # the single path.
+        # entries is a list of (component_name, property_name,
+        # property_id, disable, force) - returns log IDs or exceptions.
+        results = [None] * len(entries)
+        begin = datetime.now()
+        ids = [bson.ObjectId() for _ in entries]
+        pending = []
+        deferred = []
+        property_ids = set()
+        for i, entry in enumerate(entries):
+            if entry[2] in property_ids:
+                deferred.append(i)
+            else:
+                property_ids.add(entry[2])
+                pending.append(i)
+        requests = [pymongo.UpdateOne(
+            self._get_current_log_filter(entries[i][2], begin, entries[i][4]),
+            self._get_current_log_update(ids[i], begin),
+            upsert=True) for i in pending]
+        conflicts = []
+        try:
+            result = self._current_logs.bulk_write(requests, ordered=False)
+            upserted = result.upserted_ids.keys()
+        except BulkWriteError as e:
+            upserted = [u["index"] for u in e.details.get("upserted", [])]
+            for error in e.details.get("writeErrors", []):
+                i = pending[error["index"]]
+                if error.get("code") == _DUPLICATE_KEY:
+                    conflicts.append(i)
+                else:
+                    results[i] = RuntimeError("cannot open a log period " +
+                                              "for %s/%s: %s" %
+                                              (entries[i][0], entries[i][1],
+                                               error.get("errmsg")))
+        if conflicts:
+            cursor = self._current_logs.find(
+                {"_id": {"$in": [entries[i][2] for i in conflicts]}})
+            current_logs = dict((c["_id"], c) for c in cursor)
+            for i in conflicts:
+                component_name, property_name, property_id, _, force = \
+                    entries[i]
+                try:
+                    if property_id in current_logs:
+                        self._check_log_entry(current_logs[property_id],
+                                              begin, component_name,
+                                              property_name, force)
+                    deferred.append(i)
+                except (RuntimeError, UserWarning) as e:
+                    results[i] = e
+        created = [pending[j] for j in upserted]
+        if created:
+            # cf. _get_log_id() - respect the log entries of older versions
+            pipeline = [{"$match": {"pid": {"$in": [entries[i][2]
+                                                     for i in created]}}},
+                        {"$sort": bson.SON([("pid", pymongo.ASCENDING),
+                                            ("begin", pymongo.DESCENDING)])},
+                        {"$group": {"_id": "$pid",
+                                    "lid": {"$first": "$_id"},
+                                    "begin": {"$first": "$begin"},
+                                    "end": {"$first": "$end"}}}]
+            latest = {}
+            for log_entry in self._logs.aggregate(pipeline):
+                latest[log_entry["_id"]] = log_entry
+            for i in created:
+                component_name, property_name, property_id, _, force = \
+                    entries[i]
+                if property_id not in latest:
+                    continue
+                log_entry = latest[property_id]
+                try:
+                    self._check_log_entry(log_entry, begin, component_name,
+                                          property_name, force)
+                except (RuntimeError, UserWarning) as e:
+                    self._revert_current_log(property_id, ids[i],
+                                             {"_id": log_entry["lid"],
+                                              "begin": log_entry["begin"],
+                                              "end": log_entry["end"]})
+                    results[i] = e
+        claimed = [i for i in pending
+                   if results[i] is None and i not in deferred]
+        if claimed:
+            log_descs = [{"_id": ids[i],
+                          "pid": entries[i][2],
+                          "begin": begin,
+                          "end": None,
+                          "disabled": entries[i][3]} for i in claimed]
+            try:
+                self._logs.insert_many(log_descs)
+                for i in claimed:
+                    results[i] = ids[i]
+            except Exception as e:
+                for i in claimed:
+                    results[i] = e
+        for i in sorted(deferred):
+            try:
+                results[i] = self._get_log_id(*entries[i])
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def _get_property_desc(self, component_name, component_type,
+                           property_name, property_type, property_type_desc,
+                           meta):
+        return {"component_name": component_name,
+                "component_type": component_type,
+                "property_name": property_name,
+                "property_type": str(property_type),
+                "property_type_desc": property_type_desc,
+                "meta": meta,
+                "chunk_size": get_total_seconds(self._chunk_size, True)}
+
+    def _get_property_id(self, property_desc):
+        tmp = self._properties.find_one_and_replace(filter=property_desc,
+                                                    replacement=property_desc,
+                                                    upsert=True,
+                                                    return_document=pymongo.ReturnDocument.AFTER)
+        return tmp["_id"]
+
+    def _get_property_ids(self, property_descs):
+        # the batched version of _get_property_id():
+        # upsert all property descriptions by one bulk write and
+        # look up the IDs of the ones that did exist already by one query.
+        # returns property IDs or exceptions.
+        results = [None] * len(property_descs)
+        requests = [pymongo.ReplaceOne(property_desc, property_desc,
+                                       upsert=True)
+                    for property_desc in property_descs]
+        try:
+            result = self._properties.bulk_write(requests, ordered=False)
+            upserted = result.upserted_ids.items()
+        except BulkWriteError as e:
+            upserted = [(u["index"], u["_id"])
+                        for u in e.details.get("upserted", [])]
+            for error in e.details.get("writeErrors", []):
+                results[error["index"]] = \
+                    RuntimeError("cannot register %s/%s: %s" %
+                                 (property_descs[error["index"]]
+                                  ["component_name"],
+                                  property_descs[error["index"]]
+                                  ["property_name"],
+                                  error.get("errmsg")))
+        for i, id in upserted:
+            results[i] = id
+        missing = [i for i, id in enumerate(results) if id is None]
+        if missing:
+            # the stored descriptions equal the filters but compare
+            # them as bson (e.g. tuples turn into lists)
+            found = {}
+            cursor = self._properties.find({"$or": [property_descs[i]
+                                                    for i in missing]})
+            for doc in cursor:
+                key = (doc["component_name"], doc["property_name"])
+                found.setdefault(key, []).append(doc)
+            for i in missing:
+                property_desc = property_descs[i]
+                expected = bson.BSON.encode(property_desc).decode()
+                key = (property_desc["component_name"],
+                       property_desc["property_name"])
+                for doc in found.get(key, ()):
+                    id = doc.pop("_id")
+                    doc_matches = (doc == expected)
+                    doc["_id"] = id
+                    if doc_matches:
+                        results[i] = id
+                        break
+                else:
+                    try:
+                        results[i] = self._get_property_id(property_desc)
+                    except Exception as e:
+                        results[i] = e
+        return results
+
+    def _create_buffer(self, component_name, property_name, property_type,
+                       disable, property_id, log_id):
+        fmt = self._chunk_format
+        codec = None
+        if self._compress:
+            codec = chunk_format.get_codec(property_type)
+            if codec is not None:
+                fmt = chunk_format.FORMAT_COMPRESSED
+            else:
+                fmt = chunk_format.FORMAT_COLUMNAR
+        rollups = None
+        if property_type in rollup.PROPERTY_TYPES:
+            rollups = self._rollup_intervals
+        if self._timeseries:
+            buffer = TimeseriesBuffer(self._log, self._fifo, self._chunk_size,
+                                      property_id, log_id, self._logs,
+                                      component_name, property_name,
+                                      disable, self._skip_unchanged,
+                                      current_log_col=self._current_logs,
+                                      rollups=rollups)
+        else:
+            buffer = Buffer(self._log, self._fifo, self._chunk_size,
+                            property_id, log_id, self._logs,
+                            component_name, property_name,
+                            disable, self._skip_unchanged,
+                            fmt, codec, self._current_logs, rollups)
+        if self._sealer is not None and not disable:
+            self._sealer.add(buffer)
+        return buffer
+
     def register(self,
                  component_name, component_type,
                  property_name, property_type, property_type_desc=None,
@@ -533,47 +1260,107 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         # characteristics to identify a property so we will check these
         self._check_name(component_name, "component_name")
         self._check_name(property_name, "property_name")
-        property_desc = {"component_name": component_name,
-                         "component_type": component_type,
-                         "property_name": property_name,
-                         "property_type": str(property_type),
-                         "property_type_desc": property_type_desc,
-                         "meta": meta,
-                         "chunk_size": get_total_seconds(self._chunk_size,
-                                                         True)}
-        tmp = self._properties.find_one_and_replace(filter=property_desc,
-                                                    replacement=property_desc,
-                                                    upsert=True,
-                                                    return_document=pymongo.ReturnDocument.AFTER)
-        property_id = tmp["_id"]
+        property_desc = self._get_property_desc(component_name,
+                                                component_type,
+                                                property_name, property_type,
+                                                property_type_desc, meta)
+        property_id = self._get_property_id(property_desc)
         log_id = self._get_log_id(component_name, property_name,
                                   property_id, disable, force)
-        return Buffer(self._log, self._fifo, self._chunk_size,
-                      property_id, log_id, self._logs,
-                      component_name, property_name,
-                      disable, self._skip_unchanged)
+        return self._create_buffer(component_name, property_name,
+                                   property_type, disable,
+                                   property_id, log_id)
+
+    def register_many(self, specs):
+        """
+        Register several properties by a few round trips to the database:
+        one bulk write for the property descriptions, one query for the
+        latest log entries and one insert for the new log entries.
+
+        The exceptions in place of buffers are the ones of register().
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register_many()
+        """
+        results = [None] * len(specs)
+        pending = []
+        property_descs = []
+        for i, spec in enumerate(specs):
+            try:
+                component_name, component_type, \
+                    property_name, property_type, property_type_desc, \
+                    disable, force, meta = self._parse_spec(spec)
+                self._check_name(component_name, "component_name")
+                self._check_name(property_name, "property_name")
+            except (TypeError, ValueError) as e:
+                results[i] = e
+                continue
+            self._log.info("registering %s/%s" %
+                           (component_name, property_name))
+            property_descs.append(
+                self._get_property_desc(component_name, component_type,
+                                        property_name, property_type,
+                                        property_type_desc, meta))
+            pending.append((i, component_name, property_name,
+                            property_type, disable, force))
+        if not pending:
+            return results
+        try:
+            property_ids = self._get_property_ids(property_descs)
+        except Exception as e:
+            property_ids = [e] * len(pending)
+        entries = []
+        registered = []
+        for args, property_id in zip(pending, property_ids):
+            if isinstance(property_id, Exception):
+                results[args[0]] = property_id
+                continue
+            entries.append((args[1], args[2], property_id, args[4], args[5]))
+            registered.append(args)
+        log_ids = self._get_log_ids(entries) if entries else []
+        for args, entry, log_id in zip(registered, entries, log_ids):
+            i, component_name, property_name, property_type, disable, _ = \
+                args
+            if isinstance(log_id, Exception):
+                results[i] = log_id
+            else:
+                results[i] = self._create_buffer(component_name,
+                                                 property_name,
+                                                 property_type, disable,
+                                                 entry[2], log_id)
+        return results
+
+    def get_stats(self):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.get_stats()
+        """
+        return {"fifo": self._fifo.get_stats(),
+                "batch_size": self._batch.size,
+                "retries": sum(w.n_retries for w in self._workers),
+                "rejected": sum(w.n_rejected for w in self._workers)}
 
     def __del__(self):
         """dtor."""
         # The dtor is called even if the ctor didn't run through.
-        # So, make sure the ctor did work by using self._worker_is_daemon
-        # and self._workers plus catching a potential AttributeError
-        # (well, catch all).
+        # So, make sure the ctor did work by using self._worker_is_daemon,
+        # self._pool and self._client plus catching a potential
+        # AttributeError (well, catch all).
         #
-        # Workers traditionally run as daemon threads but this seems
-        # not to work within an ACS component. Cancel all workers
-        # in case they aren't daemons...
-        # Workers may block calling RingBuffer.get() --> terminate the
-        # ring buffer in addition!
-        # Note: data that is in the ring buffer will be lost but
-        # the frontend is supposed to flush it before it releases
-        # the registry.
+        # The workers are stopped by the pool once its last registry
+        # is gone (cf. _WorkerPool.close()).
+        try:
+            if self._sealer is not None:
+                self._sealer.cancel()
+                if not self._worker_is_daemon:
+                    self._sealer.join()
+        except:
+            pass
+        try:
+            if self._share_workers:
+                _pools.release(self._pool)
+            else:
+                self._pool.close()
+        except:
+            pass
         try:
-            if not self._worker_is_daemon:
-                for worker in self._workers:
-                    worker.cancel()
-                self._fifo.terminate()
-                for worker in self._workers:
-                    worker.join()
+            clients.release_client(self._client)
         except:
             pass
@@ -0,0 +1,147 @@
+__version__ = "$Id$"
+
+
+"""
+The rollups the mongodb backend stores alongside the chunks.
+
+A rollup aggregates the data points of one property within one time bin
+of a coarser interval than the chunks (e.g. one minute or one hour).
+Every rollup has the fields "pid" (the property ID), "interval" (the
+interval in seconds), "bin" (the beginning of the time bin), "begin" and
+"end" (the time of the first and the last data point) plus the aggregates
+"count", "min", "max" and "mean".
+
+A buffer emits a rollup when its time bin is over or when the buffer is
+flushed. So there may be more than one rollup per time bin and property
+that are combined by merge().
+
+Only numbers are aggregated - other values (including booleans)
+are skipped.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.property_type
+@requires: ctamonitoring.property_recorder.backend.util
+"""
+
+
+from ctamonitoring.property_recorder.backend.property_type import PropertyType
+from ctamonitoring.property_recorder.backend.util import get_total_seconds
+
+
+# the property types whose values can be aggregated
+PROPERTY_TYPES = frozenset((PropertyType.FLOAT,
+                            PropertyType.DOUBLE,
+                            PropertyType.LONG,
+                            PropertyType.LONG_LONG))
+
+
+def get_interval(interval):
+    """
+    Get a rollup interval in seconds.
+
+    @param interval: The interval.
+    @type interval: datetime.timedelta or int
+    @return: The interval in whole seconds.
+    @rtype: int
+    @raise ValueError: If the interval is less than a second.
+    """
+    if not isinstance(interval, (int, long)):
+        interval = int(get_total_seconds(interval, True))
+    if interval < 1:
+        raise ValueError("rollup interval must be at least one second")
+    return interval
+
+
+def is_rollup(doc):
+    """
+    Tell a rollup from a chunk.
+
+    @param doc: A rollup or a chunk.
+    @type doc: dict
+    @rtype: boolean
+    """
+    return "interval" in doc
+
+
+def is_number(val):
+    """
+    Tell if a value can be aggregated.
+
+    @rtype: boolean
+    """
+    return isinstance(val, (int, long, float)) and not isinstance(val, bool)
+
+
+def new_rollup(interval, bin_begin, property_id):
+    """
+    Create an empty rollup.
+
+    @param interval: The interval in seconds (cf. get_interval()).
+    @type interval: int
+    @param bin_begin: The beginning of the time bin.
+    @type bin_begin: datetime.datetime
+    @param property_id: The property ID.
+    @type property_id: bson.ObjectId
+    @return: The rollup.
+    @rtype: dict
+    """
+    return {"pid": property_id, "interval": interval, "bin": bin_begin,
+            "begin": None, "end": None,
+            "count": 0, "min": None, "max": None, "mean": 0.0}
+
+
+def append(rollup, t, val):
+    """
+    Add a data point to a rollup.
+
+    @param rollup: The rollup (cf. new_rollup()).
+    @type rollup: dict
+    @param t: The time.
+    @type t: datetime.datetime
+    @param val: The value - a number (cf. is_number()).
+    """
+    if rollup["begin"] is None:
+        rollup["begin"] = t
+        rollup["min"] = val
+        rollup["max"] = val
+    else:
+        if val < rollup["min"]:
+            rollup["min"] = val
+        if val > rollup["max"]:
+            rollup["max"] = val
+    rollup["end"] = t
+    rollup["count"] += 1
+    # a running mean doesn't overflow and needs no extra field
+    rollup["mean"] += (val - rollup["mean"]) / float(rollup["count"])
+
+
+def merge(rollups):
+    """
+    Combine the rollups of the same time bin.
+
+    @param rollups: The rollups.
+    @type rollups: list of dict
+    @return: The combined rollup.
+    @rtype: dict
+    """
+    merged = dict(rollups[0])
+    for rollup in rollups[1:]:
+        if not rollup["count"]:
+            continue
+        if not merged["count"]:
+            merged = dict(rollup)
+            continue
+        count = merged["count"] + rollup["count"]
+        merged["mean"] = (merged["mean"] * merged["count"] +
+                          rollup["mean"] * rollup["count"]) / float(count)
+        merged["count"] = count
+        merged["min"] = min(merged["min"], rollup["min"])
+        merged["max"] = max(merged["max"], rollup["max"])
+        merged["begin"] = min(merged["begin"], rollup["begin"])
+        merged["end"] = max(merged["end"], rollup["end"])
+    return merged
@@ -0,0 +1,93 @@
+__version__ = "$Id$"
+
+
+"""
+The layout of the measurements the mongodb backend stores in a native
+time-series collection (mongodb 5.0 or later) instead of chunks.
+
+The server buckets and compresses the measurements by itself - one
+measurement per data point with the fields "t" (the time field),
+"val" (the value) and "meta" (the meta field: the property ID "pid",
+"component_name" and "property_name").
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: pymongo
+"""
+
+
+from pymongo.errors import CollectionInvalid
+
+
+TIME_FIELD = "t"
+META_FIELD = "meta"
+
+GRANULARITIES = ("seconds", "minutes", "hours")
+
+
+def create_collection(database, name, granularity="seconds"):
+    """
+    Create a time-series collection unless it exists.
+
+    @param database: The database.
+    @type database: pymongo.database.Database
+    @param name: The collection name.
+    @type name: string
+    @param granularity: The bucketing granularity that matches the
+    sampling interval best. Optional, default is "seconds".
+    @type granularity: string
+    @return: The collection.
+    @rtype: pymongo.collection.Collection
+    @raise ValueError: If the granularity is unknown or the collection
+    exists but isn't a time-series collection.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError("unknown granularity %r" % (granularity,))
+    try:
+        return database.create_collection(
+            name,
+            timeseries={"timeField": TIME_FIELD,
+                        "metaField": META_FIELD,
+                        "granularity": granularity})
+    except CollectionInvalid:
+        # the collection exists already
+        result = database.command("listCollections", filter={"name": name})
+        infos = result["cursor"]["firstBatch"]
+        if not infos or infos[0].get("type") != "timeseries":
+            raise ValueError("%s isn't a time-series collection" % (name,))
+        return database[name]
+
+
+def get_meta(property_id, component_name, property_name):
+    """
+    Get the meta field of the measurements of a property.
+
+    @param property_id: The property ID.
+    @type property_id: bson.ObjectId
+    @param component_name: Component name.
+    @type component_name: string
+    @param property_name: Property name.
+    @type property_name: string
+    @rtype: dict
+    """
+    return {"pid": property_id,
+            "component_name": component_name,
+            "property_name": property_name}
+
+
+def new_measurement(t, val, meta):
+    """
+    Create a measurement.
+
+    @param t: The time.
+    @type t: datetime.datetime
+    @param val: The value.
+    @param meta: The meta field (cf. get_meta()).
+    @type meta: dict
+    @rtype: dict
+    """
+    return {TIME_FIELD: t, META_FIELD: meta, "val": val}
@@ -0,0 +1,15 @@
+# coding=utf-8
+
+"""
+Micro benchmarks for the backend building blocks such as the ring buffer.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+
+__all__ = []
+__version__ = "$Id$"
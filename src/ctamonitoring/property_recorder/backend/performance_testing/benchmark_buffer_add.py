@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+'''
+benchmark_buffer_add -- measure the per data point cost of Buffer.add()
+
+Measures the time conversion and binning a data point needs on its own,
+by date + time arithmetic (to_datetime() plus get_floor()) and by
+integer arithmetic (to_microseconds() plus an integer floor).
+Measures Buffer.add() of the mongodb backend (per chunk format) and of
+the redis backend. The buffers write to a FIFO without consumers, so
+neither a database nor a network round trip is involved.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.mongodb.chunk_format
+@requires: ctamonitoring.property_recorder.backend.mongodb.registry
+@requires: ctamonitoring.property_recorder.backend.redis.registry
+@requires: ctamonitoring.property_recorder.backend.ring_buffer
+@requires: ctamonitoring.property_recorder.backend.util
+@requires: datetime
+@requires: logging
+@requires: optparse
+@requires: os
+@requires: sys
+@requires: time
+'''
+
+import logging
+import os
+import sys
+import time
+
+from ctamonitoring.property_recorder.backend import util
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+from datetime import timedelta
+from optparse import OptionParser
+
+
+__all__ = []
+__version__ = "$Id$"
+
+
+def get_times(n_items, period):
+    # the time stamps a callback gets - ACS epochs within an ACS system
+    begin = time.time()
+    times = [begin + i * period for i in range(n_items)]
+    offset = getattr(util, "_ACS_POSIX_OFFSET", None)
+    if offset is not None:
+        times = [long(t * 10000000) + offset for t in times]
+    return times
+
+
+def measure_datetime(times, chunk_size):
+    begin = time.time()
+    for tm in times:
+        util.get_floor(util.to_datetime(tm), chunk_size, True)
+    return time.time() - begin
+
+
+def measure_integer(times, chunk_size):
+    chunk_us = util.get_total_seconds(chunk_size, True) * 1000000
+    begin = time.time()
+    for tm in times:
+        t_us = util.to_microseconds(tm)
+        t_us - t_us % chunk_us
+    return time.time() - begin
+
+
+def measure_add(buf, times):
+    begin = time.time()
+    try:
+        for i, tm in enumerate(times):
+            buf.add(tm, float(i))
+    finally:
+        # there is neither a worker nor a database to close
+        buf._canceled = True
+    return time.time() - begin
+
+
+def create_mongodb_buffer(log, n_items, chunk_size, fmt):
+    from ctamonitoring.property_recorder.backend.mongodb.registry \
+        import Buffer
+    fifo = RingBuffer(n_items, sizer=chunk_format.get_approx_chunk_size)
+    codec = None
+    if fmt == chunk_format.FORMAT_COMPRESSED:
+        codec = chunk_format.CODEC_XOR
+    return Buffer(log, fifo, chunk_size, "pid", "lid", None,
+                  "comp", "prop", False, False, fmt, codec)
+
+
+def create_redis_buffer(log, n_items, chunk_size):
+    from ctamonitoring.property_recorder.backend.redis.registry \
+        import Buffer
+    fifo = RingBuffer(n_items)
+    return Buffer(log, fifo, chunk_size, "comp", "prop", False)
+
+
+def main(argv=None):
+    program_name = os.path.basename(sys.argv[0])
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        parser = OptionParser(version="%%prog %s" % (__version__,))
+        parser.add_option("-n", "--nitems", dest="n_items", type="int",
+                          help="number of data points per measurement "
+                          "[default: %default]")
+        parser.add_option("-p", "--period", dest="period", type="float",
+                          help="time between data points in seconds "
+                          "[default: %default]")
+        parser.add_option("-r", "--repeat", dest="repeat", type="int",
+                          help="number of measurements, the fastest counts "
+                          "[default: %default]")
+        parser.add_option("--chunksize", dest="chunk_size", type="int",
+                          help="chunk size in seconds [default: %default]",
+                          metavar="SECONDS")
+        parser.set_defaults(n_items=100000, period=0.01, repeat=5,
+                            chunk_size=60)
+        (opts, args) = parser.parse_args(argv)
+        chunk_size = timedelta(seconds=opts.chunk_size)
+        times = get_times(opts.n_items, opts.period)
+        log = logging.getLogger(program_name)
+
+        print("-" * 40)
+        print("nitems = %d" % (opts.n_items,))
+        print("period = %g s" % (opts.period,))
+        print("chunksize = %s" % (str(chunk_size),))
+        print("-" * 40)
+        print("%-24s %14s" % ("", "add [us]"))
+        repeat = range(max(opts.repeat, 1))
+        durations = [
+            ("datetime + get_floor",
+             min(measure_datetime(times, chunk_size) for _ in repeat)),
+            ("microseconds + floor",
+             min(measure_integer(times, chunk_size) for _ in repeat))]
+        for name, fmt in (("mongodb documents",
+                           chunk_format.FORMAT_DOCUMENTS),
+                          ("mongodb columnar",
+                           chunk_format.FORMAT_COLUMNAR),
+                          ("mongodb compressed",
+                           chunk_format.FORMAT_COMPRESSED)):
+            durations.append(
+                (name, min(measure_add(create_mongodb_buffer(log,
+                                                             opts.n_items,
+                                                             chunk_size,
+                                                             fmt),
+                                       times) for _ in repeat)))
+        try:
+            durations.append(
+                ("redis", min(measure_add(create_redis_buffer(log,
+                                                              opts.n_items,
+                                                              chunk_size),
+                                          times) for _ in repeat)))
+        except ImportError:
+            # the redis backend needs msgpack and redis
+            pass
+        for name, duration in durations:
+            print("%-24s %14.2f" % (name, duration * 1e6 / opts.n_items))
+    except Exception as e:
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help\n")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
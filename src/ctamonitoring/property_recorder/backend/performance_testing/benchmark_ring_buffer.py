@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# encoding: utf-8
+'''
+benchmark_ring_buffer -- measure the ring buffer under load
+
+Measures the cost of RingBuffer.get() and of overwriting RingBuffer.add()
+calls while many flushes (like Buffer.flush() calls of a backend) are
+waiting for the buffer to drain.
+Measures the throughput of several consumers (like the workers of a backend)
+that write to a slow sink.
+Measures how long closing a buffer (flushing the items of one producer)
+takes while the FIFO holds a backlog of other producers' items.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.ring_buffer
+@requires: optparse
+@requires: os
+@requires: sys
+@requires: threading
+@requires: time
+'''
+
+import os
+import sys
+import time
+
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+from optparse import OptionParser
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+
+__all__ = []
+__version__ = "$Id$"
+
+
+class Flusher(Thread):
+    def __init__(self, fifo):
+        super(Flusher, self).__init__()
+        self.daemon = True
+        self._fifo = fifo
+
+    def run(self):
+        self._fifo.flush(current=True)
+
+
+def start_flushers(fifo, n_flushers):
+    flushers = [Flusher(fifo) for _ in range(n_flushers)]
+    for flusher in flushers:
+        flusher.start()
+    # give the flushers a chance to block...
+    time.sleep(0.1 + 0.001 * n_flushers)
+    return flushers
+
+
+def join_flushers(flushers):
+    for flusher in flushers:
+        flusher.join()
+
+
+def measure_get(n_items, n_flushers):
+    fifo = RingBuffer()
+    for i in range(n_items):
+        fifo.add(i)
+    flushers = start_flushers(fifo, n_flushers)
+    begin = time.time()
+    for _ in range(n_items):
+        fifo.get(n=1)
+    duration = time.time() - begin
+    join_flushers(flushers)
+    return duration
+
+
+def measure_overwrite(n_items, n_flushers):
+    fifo = RingBuffer(n_items)
+    for i in range(n_items):
+        fifo.add(i)
+    flushers = start_flushers(fifo, n_flushers)
+    begin = time.time()
+    for i in range(n_items):
+        fifo.add(i)
+    duration = time.time() - begin
+    join_flushers(flushers)
+    return duration
+
+
+class Consumer(Thread):
+    def __init__(self, fifo, n, latency, counter):
+        super(Consumer, self).__init__()
+        self.daemon = True
+        self._fifo = fifo
+        self._n = n
+        self._latency = latency
+        self._counter = counter
+        self._canceled = Event()
+
+    def run(self):
+        while not self._canceled.is_set():
+            items = self._fifo.get(n=self._n, timeout=0.1)
+            if items:
+                # the slow sink, like a round trip to the database
+                time.sleep(self._latency)
+                self._counter.inc(len(items))
+
+    def cancel(self):
+        self._canceled.set()
+
+
+class Counter(object):
+    def __init__(self, expected):
+        self._lock = Lock()
+        self._count = 0
+        self._expected = expected
+        self.done = Event()
+
+    def inc(self, n):
+        with self._lock:
+            self._count += n
+            if self._count >= self._expected:
+                self.done.set()
+
+
+def measure_consumers(n_items, n_consumers, n, latency, multi_consumer):
+    fifo = RingBuffer(multi_consumer=multi_consumer)
+    counter = Counter(n_items)
+    consumers = [Consumer(fifo, n, latency, counter)
+                 for _ in range(n_consumers)]
+    for consumer in consumers:
+        consumer.start()
+    begin = time.time()
+    for i in range(n_items):
+        fifo.add(i)
+    counter.done.wait()
+    duration = time.time() - begin
+    for consumer in consumers:
+        consumer.cancel()
+    for consumer in consumers:
+        consumer.join()
+    return duration
+
+
+def measure_close(n_items, n, latency, per_producer):
+    fifo = RingBuffer()
+    counter = Counter(n_items + 1)
+    consumer = Consumer(fifo, n, latency, counter)
+    # the backlog of other producers...
+    fifo.add_many(range(n_items), "backlog")
+    consumer.start()
+    begin = time.time()
+    if per_producer:
+        fifo.add("last", "closing", priority=True)
+        fifo.flush(producer="closing")
+    else:
+        fifo.add("last", "closing")
+        fifo.flush(current=True)
+    duration = time.time() - begin
+    consumer.cancel()
+    consumer.join()
+    return duration
+
+
+def main(argv=None):
+    program_name = os.path.basename(sys.argv[0])
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        parser = OptionParser(version="%%prog %s" % (__version__,))
+        parser.add_option("-n", "--nitems", dest="n_items", type="int",
+                          help="number of items to get/overwrite "
+                          "[default: %default]")
+        parser.add_option("-f", "--flushers", dest="flushers",
+                          action="append", type="int",
+                          help="number of waiting flushers, "
+                          "can be given multiple times "
+                          "[default: 0, 10, 100, 1000]",
+                          metavar="N")
+        parser.add_option("-w", "--workers", dest="workers",
+                          action="append", type="int",
+                          help="number of consumers, "
+                          "can be given multiple times "
+                          "[default: 1, 2, 4, 8]",
+                          metavar="N")
+        parser.add_option("-b", "--batch", dest="batch", type="int",
+                          help="number of items a consumer gets at once "
+                          "[default: %default]")
+        parser.add_option("-c", "--backlog", dest="backlog", type="int",
+                          help="number of items in the FIFO while "
+                          "closing a buffer [default: %default]")
+        parser.add_option("-l", "--latency", dest="latency", type="float",
+                          help="time the sink needs per batch in seconds "
+                          "[default: %default]")
+        parser.set_defaults(n_items=20000, backlog=1000, batch=10,
+                            latency=0.002)
+        (opts, args) = parser.parse_args(argv)
+        if not opts.flushers:
+            opts.flushers = [0, 10, 100, 1000]
+        if not opts.workers:
+            opts.workers = [1, 2, 4, 8]
+
+        print("-" * 40)
+        print("nitems = %d" % (opts.n_items,))
+        print("-" * 40)
+        print("%10s %14s %14s" % ("flushers", "get [us]", "overwrite [us]"))
+        for n_flushers in opts.flushers:
+            get = measure_get(opts.n_items, n_flushers)
+            overwrite = measure_overwrite(opts.n_items, n_flushers)
+            print("%10d %14.2f %14.2f" % (n_flushers,
+                                          get * 1e6 / opts.n_items,
+                                          overwrite * 1e6 / opts.n_items))
+        print("-" * 40)
+        print("batch = %d" % (opts.batch,))
+        print("latency = %g s" % (opts.latency,))
+        print("-" * 40)
+        print("%10s %14s %14s" % ("workers", "single [1/s]", "multi [1/s]"))
+        for n_workers in opts.workers:
+            single = measure_consumers(opts.n_items, n_workers,
+                                       opts.batch, opts.latency, False)
+            multi = measure_consumers(opts.n_items, n_workers,
+                                      opts.batch, opts.latency, True)
+            print("%10d %14.0f %14.0f" % (n_workers,
+                                          opts.n_items / single,
+                                          opts.n_items / multi))
+        print("-" * 40)
+        print("backlog = %d" % (opts.backlog,))
+        print("-" * 40)
+        print("%10s %14s %14s" % ("", "current [ms]", "producer [ms]"))
+        current = measure_close(opts.backlog, opts.batch, opts.latency, False)
+        producer = measure_close(opts.backlog, opts.batch, opts.latency, True)
+        print("%10s %14.1f %14.1f" % ("close", current * 1e3, producer * 1e3))
+    except Exception as e:
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help\n")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
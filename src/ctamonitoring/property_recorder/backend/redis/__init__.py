@@ -3,6 +3,7 @@ __version__ = "$Id$"
 
 '''
 The redis backend stores monitoring data to a redis database.
+It needs redis-py 3.x.
 
 @author: tschmidt
 @organization: DESY Zeuthen
@@ -0,0 +1,314 @@
+__version__ = "$Id$"
+
+
+"""
+Pipelines for a redis cluster.
+
+A cluster shards the keys by hash slot over its nodes, and a pipeline
+can only keep the commands of one node. ClusterRouter maps the hash
+slots to the nodes (CLUSTER SLOTS) and ClusterPipeline groups
+the commands of a batch per node: one pipeline and round trip per node
+and the results in the order of the commands. Commands that a node
+redirects (MOVED or ASK) are sent again to the node that serves their
+hash slot - only them, so a batch isn't added twice.
+
+Hash tags ({component}:property:begin) keep the keys of a component
+within one hash slot, so a component's commands go to one node.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: collections
+@requires: redis
+@requires: threading
+"""
+
+
+from collections import OrderedDict
+import redis
+from threading import Lock
+
+
+N_SLOTS = 16384
+
+
+def _crc16(data):
+    # CRC16-CCITT (XModem) as redis cluster uses it
+    crc = 0
+    for c in bytearray(data):
+        crc ^= c << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+    return crc
+
+
+def get_hash_tag(key):
+    """
+    @param key: A key.
+    @type key: string
+    @return: The part of the key that is hashed - the hash tag
+    (the part between the first { and the next }) if there is a non-empty
+    one or the key itself.
+    @rtype: string
+    """
+    begin = key.find("{")
+    if begin >= 0:
+        end = key.find("}", begin + 1)
+        if end > begin + 1:
+            return key[begin + 1:end]
+    return key
+
+
+def get_slot(key):
+    """
+    @param key: A key.
+    @type key: string
+    @return: The hash slot of the key.
+    @rtype: int
+    """
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return _crc16(get_hash_tag(key)) % N_SLOTS
+
+
+class ClusterRouter(object):
+    """
+    This router knows the node (master) of every hash slot of a cluster.
+    """
+
+    def __init__(self, client):
+        """
+        ctor.
+
+        @param client: The client of a node of the cluster. The clients of
+        the other nodes connect alike (password, timeouts, ...).
+        @type client: redis.StrictRedis
+        """
+        self._client = client
+        self._lock = Lock()
+        self._slots = None
+        self._clients = {}  # (host, port) -> redis.StrictRedis
+
+    def refresh(self):
+        """
+        Update the hash slots of the nodes, e.g. after a MOVED error.
+
+        @raise redis.ResponseError: If the server isn't a cluster node.
+        """
+        slots = [None] * N_SLOTS
+        for row in self._client.execute_command("CLUSTER SLOTS"):
+            begin, end, master = row[0], row[1], row[2]
+            node = (master[0], int(master[1]))
+            for slot in range(int(begin), int(end) + 1):
+                slots[slot] = node
+        with self._lock:
+            self._slots = slots
+
+    def get_node(self, key):
+        """
+        @param key: A key.
+        @type key: string
+        @return: The host and port of the node of a key.
+        @rtype: (string, int) pair
+        @raise RuntimeError: If no node serves the hash slot of the key.
+        """
+        if self._slots is None:
+            self.refresh()
+        node = self._slots[get_slot(key)]
+        if node is None:
+            raise RuntimeError("the hash slot of %s isn't served" % (key,))
+        return node
+
+    def get_client(self, node):
+        """
+        @param node: The host and port of a node.
+        @type node: (string, int) pair
+        @return: The client of the node.
+        @rtype: redis.StrictRedis
+        """
+        with self._lock:
+            client = self._clients.get(node)
+            if client is None:
+                kwargs = dict(self._client.connection_pool.connection_kwargs)
+                kwargs["host"], kwargs["port"] = node
+                # there is no database but 0 in a cluster
+                kwargs["db"] = 0
+                client = redis.StrictRedis(**kwargs)
+                self._clients[node] = client
+            return client
+
+    def get_client_of(self, key):
+        """
+        @param key: A key.
+        @type key: string
+        @return: The client of the node of a key.
+        @rtype: redis.StrictRedis
+        """
+        return self.get_client(self.get_node(key))
+
+    def pipeline(self, transaction=False):
+        """
+        @param transaction: Keep it False - there are no transactions
+        across nodes. Optional, default is False.
+        @type transaction: bool
+        @return: A new pipeline that groups commands per node.
+        @rtype: ClusterPipeline
+        @raise ValueError: If transaction is True.
+        """
+        if transaction:
+            raise ValueError("a cluster pipeline isn't a transaction")
+        return ClusterPipeline(self)
+
+    def close(self):
+        """Disconnect from all nodes."""
+        with self._lock:
+            clients = self._clients.values()
+            self._clients = {}
+        for client in clients:
+            client.connection_pool.disconnect()
+
+
+def _get_redirection(result):
+    # the node of a MOVED or ASK error and whether it is ASK, or None
+    if isinstance(result, redis.ResponseError):
+        parts = str(result).split()
+        if len(parts) == 3 and parts[0] in ("MOVED", "ASK"):
+            host, port = parts[2].rsplit(":", 1)
+            return (host, int(port)), parts[0] == "ASK"
+    return None
+
+
+class ClusterPipeline(object):
+    """
+    A pipeline (without transaction) of commands that keep a key as
+    their first argument. It sends the commands of each node as
+    a pipeline of their own.
+
+    Commands whose hash slot moved (MOVED) or is moving (ASK) to another
+    node are sent to that node - and only them, the commands of the other
+    nodes are done already.
+    """
+
+    # the number of times a command follows MOVED or ASK
+    MAX_REDIRECTIONS = 5
+
+    def __init__(self, router):
+        """
+        ctor.
+
+        @param router: The router of the cluster.
+        @type router: ClusterRouter
+        """
+        self._router = router
+        # node -> (pipeline, positions of the node's commands)
+        self._pipelines = OrderedDict()
+        self._commands = []  # (name, key, args, kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __getattr__(self, name):
+        # queue any command of redis.StrictRedis, e.g. p.zadd(key, ...)
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def command(key, *args, **kwargs):
+            node = self._router.get_node(key)
+            self._queue(self._pipelines, node, len(self._commands),
+                        name, key, args, kwargs)
+            self._commands.append((name, key, args, kwargs))
+            return self
+        return command
+
+    def _queue(self, pipelines, node, position, name, key, args, kwargs,
+               asking=False):
+        p, positions = pipelines.get(node, (None, None))
+        if p is None:
+            p = self._router.get_client(node).pipeline(transaction=False)
+            positions = []
+            pipelines[node] = (p, positions)
+        if asking:
+            # the result of ASKING isn't one of a command
+            p.execute_command("ASKING")
+            positions.append(None)
+        getattr(p, name)(key, *args, **kwargs)
+        positions.append(position)
+
+    def execute(self, raise_on_error=True):
+        """
+        Send the commands - one pipeline per node.
+
+        @param raise_on_error: Raise the error of a failed command or
+        return it as its result. Optional, default is True.
+        @type raise_on_error: bool
+        @return: The results in the order of the commands.
+        @rtype: list
+        @raise redis.RedisError: If a command fails, e.g. since its
+        hash slot still moves after MAX_REDIRECTIONS redirections or
+        its node doesn't respond - the commands of the other nodes are
+        sent anyway. With raise_on_error False the error is the result
+        of every command of a node that doesn't respond.
+        """
+        commands = self._commands
+        pipelines = self._pipelines
+        self._commands = []
+        self._pipelines = OrderedDict()
+        results = [None] * len(commands)
+        n_redirections = 0
+        try:
+            while True:
+                redirected = []
+                for p, positions in pipelines.values():
+                    try:
+                        node_results = p.execute(raise_on_error=False)
+                    except redis.RedisError as e:
+                        # e.g. the node is down - the commands of the other
+                        # nodes are done anyway, keep their results
+                        node_results = [e] * len(positions)
+                    for position, result in zip(positions, node_results):
+                        if position is None:
+                            continue
+                        results[position] = result
+                        redirection = _get_redirection(result)
+                        if redirection is not None:
+                            redirected.append((position,) + redirection)
+                if not redirected or n_redirections == self.MAX_REDIRECTIONS:
+                    # results keeps the MOVED or ASK errors that are left
+                    break
+                n_redirections += 1
+                if not all(asking for _, _, asking in redirected):
+                    # the hash slots moved for good
+                    self._router.refresh()
+                pipelines = OrderedDict()
+                for position, node, asking in redirected:
+                    name, key, args, kwargs = commands[position]
+                    self._queue(pipelines, node, position,
+                                name, key, args, kwargs, asking)
+        finally:
+            # in case queueing a redirected command fails
+            for p, _ in pipelines.values():
+                p.reset()
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def reset(self):
+        """Discard the commands."""
+        for p, _ in self._pipelines.values():
+            p.reset()
+        self._pipelines = OrderedDict()
+        self._commands = []
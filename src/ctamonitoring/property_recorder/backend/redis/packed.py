@@ -0,0 +1,118 @@
+__version__ = "$Id$"
+
+
+"""
+The packed layout of the redis backend.
+
+Instead of a sorted set member per data point, the data points of
+a chunk are msgpack framed records (t, val) that are APPENDed to
+a string key <component>:<property>:<chunk begin>. That saves the
+duplicated time (score plus member) and the overhead of the sorted set
+per data point.
+
+A tiny hash <key>:index maps the beginning of every INDEX_INTERVAL
+seconds (as far as there is data) to the byte offset of its first
+record. Readers look up the byte range of a time range in the index
+and slice the chunk by GETRANGE. An interval that is indexed keeps its
+offset, so the index of a chunk that several workers append to
+concurrently may point behind records that another worker appended
+at the same time - use one worker if the reads must be exact.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: msgpack
+"""
+
+
+import msgpack
+
+
+# the time span of an index entry in seconds
+INDEX_INTERVAL = 60
+
+
+def get_index_key(key):
+    """
+    @param key: The key of a chunk.
+    @type key: string
+    @return: The key of its index.
+    @rtype: string
+    """
+    return key + ":index"
+
+
+def get_bucket(t, interval=INDEX_INTERVAL):
+    """
+    @param t: A POSIX timestamp.
+    @type t: float
+    @param interval: The time span of an index entry.
+    Optional, default is INDEX_INTERVAL.
+    @type interval: int
+    @return: The beginning of the index entry that t belongs to.
+    @rtype: long
+    """
+    return long(t // interval) * interval
+
+
+def pack_record(t, val):
+    """
+    @param t: The POSIX timestamp of a data point.
+    @type t: float
+    @param val: The value.
+    @return: The record of the data point.
+    @rtype: string
+    """
+    return msgpack.packb((t, val))
+
+
+def unpack_records(data):
+    """
+    @param data: Consecutive records (cf. pack_record()).
+    @type data: string
+    @return: The data points.
+    @rtype: list of (t, val) tuples
+    """
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(data)
+    return [tuple(record) for record in unpacker]
+
+
+def get_byte_range(index, start, end):
+    """
+    Get the bytes of a chunk that keep the records of a time range.
+
+    @param index: The index of the chunk - beginning of the index entry
+    (as string, e.g. from HGETALL) -> byte offset.
+    @type index: dict
+    @param start: The beginning of the time range.
+    @type start: float
+    @param end: The end of the time range (inclusive).
+    @type end: float
+    @return: The first and last byte (inclusive, -1 is the end of
+    the chunk) as GETRANGE takes them or None if no record is within
+    the time range. The range may keep records before start and after
+    end - if their index entries overlap the time range.
+    @rtype: (int, int) pair or NoneType
+    """
+    first = 0
+    first_bucket = None
+    last = -1
+    last_bucket = None
+    for bucket, offset in index.items():
+        bucket = float(bucket)
+        offset = int(offset)
+        if bucket <= start:
+            if first_bucket is None or bucket > first_bucket:
+                first_bucket = bucket
+                first = offset
+        elif bucket > end:
+            if last_bucket is None or bucket < last_bucket:
+                last_bucket = bucket
+                last = offset - 1
+    if last_bucket is not None and last < first:
+        return None
+    return first, last
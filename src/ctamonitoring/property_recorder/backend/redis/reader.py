@@ -0,0 +1,286 @@
+__version__ = "$Id$"
+
+
+"""
+Read monitoring data back from the redis backend.
+
+The reader gets the chunks of a property that overlap a time range
+- sorted sets by ZRANGEBYSCORE and strings of the append layout
+(cf. ctamonitoring.property_recorder.backend.redis.packed) by GETRANGE
+on the bytes that their index points at. Streams keep the latest
+data points only, the reader filters all of them by time.
+The latest data points of all properties (or of a component) are
+a single HGETALL if the registry keeps them in a hash.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.redis.cluster
+@requires: ctamonitoring.property_recorder.backend.redis.packed
+@requires: ctamonitoring.property_recorder.backend.redis.registry
+@requires: ctamonitoring.property_recorder.backend.util
+@requires: datetime
+@requires: msgpack
+@requires: redis
+@requires: Acspy.Common.Log or logging
+"""
+
+
+from ctamonitoring.property_recorder.backend.redis.cluster \
+    import ClusterRouter
+from ctamonitoring.property_recorder.backend.redis import packed
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import LAYOUT_APPEND
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import LATEST_COMPONENT
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import LATEST_SYSTEM
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import LAYOUT_STREAM
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import LAYOUT_ZSET
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import STREAM_BY_COMPONENT
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import get_chunk_key
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import get_latest_location
+from ctamonitoring.property_recorder.backend.redis.registry \
+    import get_stream_key
+from ctamonitoring.property_recorder.backend.util import get_total_seconds
+from ctamonitoring.property_recorder.backend.redis \
+    import __name__ as defaultname
+from datetime import datetime
+import msgpack
+import redis
+
+try:
+    from Acspy.Common.Log import getLogger
+except ImportError:
+    # use the standard logging module if this doesn't run in an ACS system
+    from logging import getLogger
+
+
+_POSIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_posixtime(tm):
+    if isinstance(tm, datetime):
+        return get_total_seconds(tm - _POSIX_EPOCH, False)
+    return float(tm)
+
+
+def get_chunk_keys(component_name, property_name, chunk_size, start, end,
+                   hash_tags=False):
+    """
+    Get the keys of the chunks that overlap a time range.
+
+    @param component_name: Component name.
+    @type component_name: string
+    @param property_name: Property name.
+    @type property_name: string
+    @param chunk_size: The chunk size in seconds.
+    @type chunk_size: int
+    @param start: The beginning of the time range (POSIX timestamp).
+    @type start: float
+    @param end: The end of the time range (inclusive).
+    @type end: float
+    @param hash_tags: The keys have hash tags (cf. the redis Registry).
+    Optional, default is False.
+    @type hash_tags: bool
+    @rtype: list of strings
+    """
+    chunk_begin = long(start // chunk_size) * chunk_size
+    keys = []
+    while chunk_begin <= end:
+        keys.append(get_chunk_key(component_name, property_name,
+                                  chunk_begin, hash_tags))
+        chunk_begin += chunk_size
+    return keys
+
+
+class Reader(object):
+    """
+    This reader gets the monitoring data of a property within a time range
+    from redis.
+    """
+
+    def __init__(self, uri="redis://localhost:6379/0", cluster=False,
+                 log=None):
+        """
+        ctor.
+
+        @param uri: redis URI. Optional, default is "redis://localhost:6379/0".
+        @type uri: string
+        @param cluster: uri is a node of a redis cluster.
+        Optional, default is False.
+        @type cluster: bool
+        @param log: An external logger to write log messages to.
+        Optional, default is None.
+        @type log: logging.Logger
+        """
+        self._log = log
+        if not self._log:
+            self._log = getLogger(defaultname)
+        self._client = redis.StrictRedis.from_url(uri)
+        self._router = None
+        if cluster:
+            self._router = ClusterRouter(self._client)
+
+    def _get_client(self, key):
+        if self._router is not None:
+            return self._router.get_client_of(key)
+        return self._client
+
+    def _pipeline(self):
+        if self._router is not None:
+            return self._router.pipeline()
+        return self._client.pipeline(transaction=False)
+
+    def _get_property_descs(self, component_name, property_name):
+        # the descriptions are keyed by component type, which we don't know
+        property_descs = []
+        client = self._get_client("properties")
+        for key, val in client.hgetall("properties").items():
+            if key == "rev":
+                continue
+            property_desc = msgpack.unpackb(val)
+            if (property_desc["component_name"] == component_name and
+                    property_desc["property_name"] == property_name):
+                property_descs.append(property_desc)
+        if not property_descs:
+            raise KeyError("unknown property %s/%s" %
+                           (component_name, property_name))
+        return property_descs
+
+    def read(self, component_name, property_name, start, end):
+        """
+        Get the data of a property within a time range.
+
+        @param component_name: Component name.
+        @type component_name: string
+        @param property_name: Property name.
+        @type property_name: string
+        @param start: The beginning of the time range.
+        @type start: datetime.datetime or POSIX timestamp
+        @param end: The end of the time range (inclusive).
+        @type end: datetime.datetime or POSIX timestamp
+        @return: The data points ordered by time.
+        @rtype: list of (POSIX timestamp, value) tuples
+        @raise KeyError: If the property is unknown.
+        """
+        start = _to_posixtime(start)
+        end = _to_posixtime(end)
+        data = []
+        for property_desc in self._get_property_descs(component_name,
+                                                      property_name):
+            # the registry doesn't store the default layout
+            layout = property_desc.get("layout", LAYOUT_ZSET)
+            hash_tags = property_desc.get("hash_tags", False)
+            if layout == LAYOUT_STREAM:
+                if property_desc["stream_by"] == STREAM_BY_COMPONENT:
+                    key = get_stream_key(component_name, None, hash_tags)
+                else:
+                    key = get_stream_key(component_name, property_name,
+                                         hash_tags)
+                data.extend(self._read_stream(key, property_name,
+                                              start, end))
+            else:
+                keys = get_chunk_keys(component_name, property_name,
+                                      property_desc["chunk_size"],
+                                      start, end, hash_tags)
+                if layout == LAYOUT_APPEND:
+                    data.extend(self._read_packed(keys, start, end))
+                else:
+                    data.extend(self._read_sorted_sets(keys, start, end))
+        data.sort(key=lambda item: item[0])
+        return data
+
+    def _read_sorted_sets(self, keys, start, end):
+        with self._pipeline() as p:
+            for key in keys:
+                p.zrangebyscore(key, start, end)
+            results = p.execute()
+        return [tuple(msgpack.unpackb(member))
+                for members in results for member in members]
+
+    def _read_stream(self, key, property_name, start, end):
+        # the entry IDs are the times the server added the entries at
+        # - not the times of the data points
+        data = []
+        for _, fields in self._get_client(key).xrange(key):
+            val = fields.get(property_name)
+            if val is not None:
+                t, val = msgpack.unpackb(val)
+                if start <= t <= end:
+                    data.append((t, val))
+        return data
+
+    def _read_packed(self, keys, start, end):
+        with self._pipeline() as p:
+            for key in keys:
+                p.hgetall(packed.get_index_key(key))
+            indexes = p.execute()
+        ranges = [(key, packed.get_byte_range(index, start, end))
+                  for key, index in zip(keys, indexes)]
+        with self._pipeline() as p:
+            for key, byte_range in ranges:
+                if byte_range is not None:
+                    p.getrange(key, *byte_range)
+            results = p.execute()
+        # the byte ranges are bounded by index intervals - filter the rest
+        return [(t, val)
+                for result in results
+                for t, val in packed.unpack_records(result)
+                if start <= t <= end]
+
+    def read_latest(self, component_name=None, latest=LATEST_SYSTEM,
+                    hash_tags=False):
+        """
+        Get the latest data points of all properties or of
+        the properties of a component.
+
+        @param component_name: Component name or None for all properties.
+        Optional, default is None.
+        @type component_name: string
+        @param latest: The hash(es) the registry keeps the latest data
+        points in (cf. the redis Registry). Optional, default is "system".
+        @type latest: string
+        @param hash_tags: The hashes per component have hash tags
+        (cf. the redis Registry). Optional, default is False.
+        @type hash_tags: bool
+        @return: (component name, property name) -> (POSIX timestamp, value)
+        @rtype: dict
+        @raise ValueError: If the hashes are per component but
+        the component name is None.
+        """
+        if latest == LATEST_COMPONENT:
+            if component_name is None:
+                raise ValueError("the latest data points are kept per " +
+                                 "component - check component_name")
+            name, _ = get_latest_location(component_name, "", latest,
+                                          hash_tags)
+            return dict(((component_name, property_name),
+                         tuple(msgpack.unpackb(val)))
+                        for property_name, val
+                        in self._get_client(name).hgetall(name).items())
+        name, _ = get_latest_location("", "", latest)
+        data = {}
+        for field, val in self._get_client(name).hgetall(name).items():
+            # property names don't contain colons
+            names = tuple(field.rsplit(":", 1))
+            if component_name is None or names[0] == component_name:
+                data[names] = tuple(msgpack.unpackb(val))
+        return data
+
+    def close(self):
+        """Release the connection to redis."""
+        if self._router is not None:
+            self._router.close()
+            self._router = None
+        if self._client is not None:
+            self._client.connection_pool.disconnect()
+            self._client = None
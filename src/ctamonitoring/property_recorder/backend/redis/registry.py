@@ -11,32 +11,46 @@ The redis registry and buffer
 @version: $Id$
 @change: $LastChangedDate$
 @change: $LastChangedBy$
+@requires: ctamonitoring.property_recorder.backend.batch_controller
 @requires: ctamonitoring.property_recorder.backend.dummy.registry
 @requires: ctamonitoring.property_recorder.backend.exceptions
+@requires: ctamonitoring.property_recorder.backend.redis.cluster
+@requires: ctamonitoring.property_recorder.backend.redis.packed
 @requires: ctamonitoring.property_recorder.backend.ring_buffer
+@requires: ctamonitoring.property_recorder.backend.spill_file
 @requires: ctamonitoring.property_recorder.backend.util
+@requires: collections
 @requires: datetime
 @requires: msgpack
 @requires: redis
 @requires: threading
+@requires: time
 @requires: Acspy.Common.Log or logging
 """
 
 
+from ctamonitoring.property_recorder.backend.batch_controller \
+    import BatchController
 import ctamonitoring.property_recorder.backend.dummy.registry
 from ctamonitoring.property_recorder.backend.exceptions \
     import InterruptedException
+from ctamonitoring.property_recorder.backend.redis.cluster \
+    import ClusterRouter
+from ctamonitoring.property_recorder.backend.redis import packed
 from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+from ctamonitoring.property_recorder.backend.spill_file import SpillFile
 from ctamonitoring.property_recorder.backend.util import to_posixtime
 from ctamonitoring.property_recorder.backend.util import get_total_seconds
 from ctamonitoring.property_recorder.backend.redis \
     import __name__ as defaultname
+from collections import OrderedDict
 from datetime import timedelta
 import msgpack
 import redis
 from threading import Event
 from threading import Lock
 from threading import Thread
+import time
 
 try:
     from Acspy.Common.Log import getLogger
@@ -48,6 +62,151 @@ except ImportError:
 _lock = Lock()
 _to_expire = set()
 
+INGEST_PIPELINE = "pipeline"
+INGEST_LUA = "lua"
+
+LAYOUT_ZSET = "zset"
+LAYOUT_APPEND = "append"
+LAYOUT_STREAM = "stream"
+
+STREAM_BY_PROPERTY = "property"
+STREAM_BY_COMPONENT = "component"
+
+LATEST_SYSTEM = "system"
+LATEST_COMPONENT = "component"
+
+# the number of data points per ZADD call of the ingest script
+# - Lua's unpack() is limited by the size of the C stack
+_SCRIPT_ZADD_SIZE = 512
+
+# KEYS: the chunk keys of a batch
+# ARGV[1]: the ttl in seconds or a negative number (no ttl)
+# ARGV[i + 1]: the group of KEYS[i] packed by msgpack -
+# {expire (0 or 1), {score, member, score, member, ...}}
+# Scores are passed as strings since redis converts Lua numbers
+# with 14 digits only.
+_INGEST_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local group = cmsgpack.unpack(ARGV[i + 1])
+    local items = group[2]
+    for j = 1, #items, %d do
+        redis.call("ZADD", key, unpack(items, j, math.min(j + %d, #items)))
+    end
+    if ttl >= 0 and group[1] == 1 then
+        redis.call("EXPIRE", key, ttl)
+    end
+end
+return #KEYS
+""" % (2 * _SCRIPT_ZADD_SIZE, 2 * _SCRIPT_ZADD_SIZE - 1)
+
+
+def pack_groups(data, ttl, ttl_last_item):
+    """
+    Group a batch of data points by key for the ingest script.
+
+    @param data: The data points as they are taken from the FIFO
+    (cf. Buffer) - key is a (chunk key, component name, property name)
+    tuple.
+    @type data: list of (new_key, key, t, val) tuples
+    @param ttl: The ttl.
+    @type ttl: datetime.timedelta or NoneType
+    @param ttl_last_item: Set the ttl per data point or per new key.
+    @type ttl_last_item: bool
+    @return: The keys and arguments of the ingest script.
+    @rtype: (list, list) pair
+    """
+    groups = OrderedDict()
+    for new_key, (key, _, _), t, val in data:
+        group = groups.get(key)
+        if group is None:
+            group = [0, []]
+            groups[key] = group
+        if ttl is not None and (ttl_last_item or new_key):
+            group[0] = 1
+        group[1].append(repr(t))
+        group[1].append(msgpack.packb((t, val)))
+    if ttl is None:
+        args = [-1]
+    else:
+        args = [get_total_seconds(ttl, True)]
+    args.extend(msgpack.packb(group) for group in groups.itervalues())
+    return list(groups), args
+
+
+def _get_component_key(component_name, hash_tags):
+    # a hash tag puts all keys of a component in one cluster hash slot
+    if hash_tags:
+        return "{" + component_name + "}"
+    return component_name
+
+
+def get_chunk_key(component_name, property_name, chunk_begin,
+                  hash_tags=False):
+    """
+    Get the key of a chunk.
+
+    @param component_name: Component name.
+    @type component_name: string
+    @param property_name: Property name.
+    @type property_name: string
+    @param chunk_begin: The beginning of the chunk (POSIX timestamp).
+    @type chunk_begin: int or long
+    @param hash_tags: Use the component name as a hash tag:
+    {component}:property:chunk_begin. Optional, default is False.
+    @type hash_tags: bool
+    @return: The key.
+    @rtype: string
+    """
+    return ":".join((_get_component_key(component_name, hash_tags),
+                     property_name, str(chunk_begin)))
+
+
+def get_stream_key(component_name, property_name=None, hash_tags=False):
+    """
+    Get the key of a stream (cf. LAYOUT_STREAM).
+
+    @param component_name: Component name.
+    @type component_name: string
+    @param property_name: Property name or None for the stream of
+    a component. Optional, default is None.
+    @type property_name: string
+    @param hash_tags: Use the component name as a hash tag.
+    Optional, default is False.
+    @type hash_tags: bool
+    @return: The key.
+    @rtype: string
+    """
+    component_key = _get_component_key(component_name, hash_tags)
+    if property_name is None:
+        return component_key + ":stream"
+    return ":".join((component_key, property_name, "stream"))
+
+
+def get_latest_location(component_name, property_name,
+                        latest=LATEST_SYSTEM, hash_tags=False):
+    """
+    Get the hash and the field of the latest data point of a property.
+
+    @param component_name: Component name.
+    @type component_name: string
+    @param property_name: Property name.
+    @type property_name: string
+    @param latest: One hash for all properties, LATEST_SYSTEM ("system"),
+    or one hash per component, LATEST_COMPONENT ("component").
+    Optional, default is "system".
+    @type latest: string
+    @param hash_tags: Use the component name as a hash tag of the hash
+    of a component. Optional, default is False.
+    @type hash_tags: bool
+    @return: The key of the hash and the field.
+    @rtype: (string, string) pair
+    """
+    if latest == LATEST_COMPONENT:
+        return (_get_component_key(component_name, hash_tags) + ":latest",
+                property_name)
+    return "latest", component_name + ":" + property_name
+
 
 class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
     """
@@ -59,7 +218,7 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
 
     def __init__(self, log, fifo, chunk_size,
                  component_name, property_name,
-                 disable):
+                 disable, stream_key=None, hash_tags=False):
         """
         ctor.
 
@@ -75,6 +234,12 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         but isn't actually monitored. This will only allow for calling
         Buffer.close().
         @type disable: bool
+        @param stream_key: The key of the stream this buffer adds data to
+        instead of chunks (cf. LAYOUT_STREAM). Optional, default is None.
+        @type stream_key: string
+        @param hash_tags: Use the component name as a hash tag of
+        the chunk keys (cf. get_chunk_key()). Optional, default is False.
+        @type hash_tags: bool
         """
         super(Buffer, self).__init__()
         self._log = log
@@ -83,9 +248,14 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         self._chunk_size = get_total_seconds(chunk_size, True)
         self._component_name = component_name
         self._property_name = property_name
+        self._producer = (component_name, property_name)
         self._disable = disable
+        self._hash_tags = hash_tags
         self._chunk_begin = None
         self._key = None
+        self._stream = None
+        if stream_key is not None:
+            self._stream = (stream_key, component_name, property_name)
         self._canceled = False  # keep this the last line in ctor
 
     def add(self, tm, dt):
@@ -101,24 +271,49 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             raise RuntimeError("unregistered property %s/%s - buffer is closed." %
                                (self._component_name, self._property_name))
         if not self._disable:
-            t = to_posixtime(tm)
-            chunk_begin = long((t // self._chunk_size) * self._chunk_size)
-            new_key = (self._chunk_begin is None or
-                       self._chunk_begin != chunk_begin)
-            if new_key:
-                key = ":".join((self._component_name,
-                                self._property_name,
-                                str(chunk_begin)))
-            else:
-                key = self._key
-            self._fifo.add((new_key, key, t, dt))
-            if new_key:
-                self._chunk_begin = chunk_begin
-                self._key = key
+            self._fifo.add(self._get_item(tm, dt), self._producer)
         else:
             self._log.warn("property monitoring for %s/%s is disabled" %
                            (self._component_name, self._property_name))
 
+    def add_many(self, samples):
+        """
+        Write data to the db... well fifo.
+
+        @raise RuntimeError: If buffer is closed.
+        @warning: Creates log warnings if called although property/buffer
+        is disabled.
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.add_many()
+        """
+        if self._canceled:
+            raise RuntimeError("unregistered property %s/%s - buffer is closed." %
+                               (self._component_name, self._property_name))
+        if not self._disable:
+            self._fifo.add_many([self._get_item(tm, dt)
+                                 for tm, dt in samples], self._producer)
+        else:
+            self._log.warn("property monitoring for %s/%s is disabled" %
+                           (self._component_name, self._property_name))
+
+    def _get_item(self, tm, dt):
+        # the names travel with the key, the worker needs them for
+        # the latest data points
+        t = to_posixtime(tm)
+        if self._stream is not None:
+            return (False, self._stream, t, dt)
+        chunk_begin = long((t // self._chunk_size) * self._chunk_size)
+        new_key = (self._chunk_begin is None or
+                   self._chunk_begin != chunk_begin)
+        if new_key:
+            key = (get_chunk_key(self._component_name, self._property_name,
+                                 chunk_begin, self._hash_tags),
+                   self._component_name, self._property_name)
+            self._chunk_begin = chunk_begin
+            self._key = key
+        else:
+            key = self._key
+        return (new_key, key, t, dt)
+
     def flush(self):
         """
         @raise ctamonitoring.property_recorder.backend.exceptions.InterruptedException:
@@ -126,7 +321,8 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
         @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.flush()
         """
         if not self._disable and not self._canceled:
-            self._fifo.flush(current=True)
+            # don't wait for the data of other properties
+            self._fifo.flush(producer=self._producer)
             self._chunk_begin = None
             self._key = None
 
@@ -159,14 +355,51 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
             pass
 
 
+def _is_scripting_unavailable(e):
+    # the server doesn't keep the script (NOSCRIPT after SCRIPT LOAD),
+    # doesn't know EVALSHA or SCRIPT or has scripting disabled
+    if isinstance(e, redis.exceptions.NoScriptError):
+        return True
+    message = str(e).lower()
+    if "unknown command" in message:
+        return "eval" in message or "script" in message
+    return "scripting" in message and "disabled" in message
+
+
+class _Progress(object):
+    """
+    What is done of a batch - APPEND and XADD aren't idempotent and
+    the worker retries a batch until it is added.
+    """
+
+    def __init__(self, data, latest_added):
+        self.data = data
+        self.added = [False] * len(data)  # per data point
+        self.index = OrderedDict()  # (key, bucket) -> offset
+        self.expired = []  # the keys to expire
+        self.latest_added = latest_added
+
+
 class _Worker(Thread):
-    def __init__(self, uri, client, ttl, ttl_last_item, fifo, log):
+    def __init__(self, uri, client, ttl, ttl_last_item, fifo, batch, log,
+                 ingest=INGEST_PIPELINE, layout=LAYOUT_ZSET,
+                 stream_maxlen=None, latest=None, hash_tags=False):
         log.debug("creating redis worker")
         super(_Worker, self).__init__()
         self._uri = uri
         self._client = client
         self._ttl = ttl
         self._ttl_last_item = ttl_last_item
+        self._layout = layout
+        self._stream_maxlen = stream_maxlen
+        self._latest = latest
+        self._hash_tags = hash_tags
+        self._script = None
+        self._progress = None  # cf. _get_progress()
+        if ingest == INGEST_LUA:
+            # registering doesn't talk to the server, the script is
+            # loaded on first use (EVALSHA falls back to SCRIPT LOAD)
+            self._script = client.register_script(_INGEST_SCRIPT)
         # what is a good timeout here?
         # do we want the worker waiting for n_ values for longer time?
         # well, this would be ok, since it will get interrupted via the
@@ -178,9 +411,9 @@ class _Worker(Thread):
             self._timeout = 0.1
         self._fifo = fifo
         self._log = log
-        # let's try to read a few values from the fifo and to do bulk inserts
-        # starting with O(10)...
-        self._n = 10
+        # read a few values from the fifo and do bulk inserts,
+        # the batch controller adapts the number to the load
+        self._batch = batch
         self._canceled = Event()
         self._canceled.clear()
 
@@ -191,7 +424,8 @@ class _Worker(Thread):
         try:
             while not self._canceled.is_set():
                 try:
-                    data = self._fifo.get(n=self._n, timeout=self._timeout)
+                    n = self._batch.get_size(len(self._fifo))
+                    data = self._fifo.get(n=n, timeout=self._timeout)
                 except InterruptedException:
                     self._log.info("request to cancel redis worker")
                     continue
@@ -199,29 +433,20 @@ class _Worker(Thread):
                     self._log.exception("oups, unexpected exception... " +
                                         "ignore and continue")
                     continue
+                n = len(data)
+                begin = time.time()
                 i = 0
                 while data and not self._canceled.is_set():
                     try:
-                        expected_results = []
-                        check_results = False
-                        with self._client.pipeline(transaction=False) as p:
-                            for new_key, key, t, val in data:
-                                p.zadd(key, t, msgpack.packb((t, val)))
-                                expected_results.append(None)
-                                if (self._ttl is not None and
-                                        (self._ttl_last_item or new_key)):
-                                    p.expire(key, self._ttl)
-                                    expected_results.append(1)
-                                    check_results = True
-                            results = p.execute()
-                            if len(results) != len(expected_results):
-                                raise RuntimeError("invalid response from execute")
-                            if check_results:
-                                for j in range(len(results)):
-                                    if (expected_results[j] is not None and
-                                            results[j] != expected_results[j]):
-                                        raise RuntimeError("cannot set ttl")
-                            data = None
+                        if self._layout == LAYOUT_APPEND:
+                            self._add_by_append(data)
+                        elif self._layout == LAYOUT_STREAM:
+                            self._add_by_stream(data)
+                        elif self._script is not None:
+                            self._add_by_script(data)
+                        else:
+                            self._add_by_pipeline(data)
+                        data = None
                     except:
                         self._log.exception("cannot add data to %s" %
                                             (self._uri,))
@@ -230,14 +455,190 @@ class _Worker(Thread):
                             i += 1
                 if data and self._ttl is not None:
                     with _lock:
-                        for new_key, key, t, val in data:
-                            if self._ttl_last_item or new_key:
+                        for new_key, (key, _, _), t, val in data:
+                            # streams expire per batch (cf. _add_by_stream())
+                            if (self._layout == LAYOUT_STREAM or
+                                    self._ttl_last_item or new_key):
                                 _to_expire.add(key)
+                                if self._layout == LAYOUT_APPEND:
+                                    _to_expire.add(packed.get_index_key(key))
+                if n:
+                    self._batch.update(n, time.time() - begin,
+                                       len(self._fifo))
         except:
             self._log.exception("exiting redis worker")
         else:
             self._log.info("exiting redis worker")
 
+    def _add_by_pipeline(self, data):
+        expected_results = []
+        check_results = False
+        with self._client.pipeline(transaction=False) as p:
+            for new_key, (key, _, _), t, val in data:
+                p.zadd(key, {msgpack.packb((t, val)): t})
+                expected_results.append(None)
+                if (self._ttl is not None and
+                        (self._ttl_last_item or new_key)):
+                    p.expire(key, self._ttl)
+                    expected_results.append(1)
+                    check_results = True
+            expected_results.extend([None] * self._add_latest(p, data))
+            results = p.execute()
+            if len(results) != len(expected_results):
+                raise RuntimeError("invalid response from execute")
+            if check_results:
+                for j in range(len(results)):
+                    if (expected_results[j] is not None and
+                            results[j] != expected_results[j]):
+                        raise RuntimeError("cannot set ttl")
+
+    def _get_progress(self, data):
+        if self._progress is None or self._progress.data is not data:
+            self._progress = _Progress(data, self._latest is None)
+        return self._progress
+
+    def _add_once(self, progress, add):
+        # add the data points of a batch that aren't added yet
+        # - add(p, i) queues the command of data point i. returns the
+        # results of the data points that are added now and the first
+        # error (of a data point or of the latest data points) or None.
+        data = progress.data
+        todo = [i for i in range(len(data)) if not progress.added[i]]
+        if not todo and progress.latest_added:
+            return {}, None
+        with self._client.pipeline(transaction=False) as p:
+            for i in todo:
+                add(p, i)
+            n_latest = 0
+            if not progress.latest_added:
+                n_latest = self._add_latest(p, data)
+            results = p.execute(raise_on_error=False)
+        if len(results) != len(todo) + n_latest:
+            raise RuntimeError("invalid response from execute")
+        added = {}
+        error = None
+        for i, result in zip(todo, results):
+            if isinstance(result, Exception):
+                error = error or result
+            else:
+                progress.added[i] = True
+                added[i] = result
+        latest_errors = [result for result in results[len(todo):]
+                         if isinstance(result, Exception)]
+        if latest_errors:
+            error = error or latest_errors[0]
+        else:
+            progress.latest_added = True
+        return added, error
+
+    def _add_by_append(self, data):
+        # APPEND isn't idempotent - a retry appends the records that
+        # aren't appended yet and sets the index entries and ttls
+        # of the others (HSETNX and EXPIRE are idempotent)
+        progress = self._get_progress(data)
+        sizes = {}
+
+        def append(p, i):
+            new_key, (key, _, _), t, val = data[i]
+            record = packed.pack_record(t, val)
+            p.append(key, record)
+            sizes[i] = len(record)
+        added, error = self._add_once(progress, append)
+        # APPEND returns the length of the chunk, that is the end of
+        # a record - index the first record per key and index interval
+        for i in sorted(added):
+            new_key, (key, _, _), t, val = data[i]
+            bucket = packed.get_bucket(t)
+            if (key, bucket) not in progress.index:
+                progress.index[(key, bucket)] = added[i] - sizes[i]
+            if (self._ttl is not None and
+                    (self._ttl_last_item or new_key) and
+                    key not in progress.expired):
+                progress.expired.append(key)
+        if error is not None:
+            raise error
+        with self._client.pipeline(transaction=False) as p:
+            for (key, bucket), offset in progress.index.items():
+                # an interval that is indexed already keeps its offset
+                p.hsetnx(packed.get_index_key(key), bucket, offset)
+            for key in progress.expired:
+                p.expire(key, self._ttl)
+                p.expire(packed.get_index_key(key), self._ttl)
+            results = p.execute()
+        if len(results) != len(progress.index) + 2 * len(progress.expired):
+            raise RuntimeError("invalid response from execute")
+        if not all(result == 1 for result in results[len(progress.index):]):
+            raise RuntimeError("cannot set ttl")
+        self._progress = None
+
+    def _add_by_stream(self, data):
+        # XADD isn't idempotent either (cf. _add_by_append()) - a retry
+        # adds the entries that aren't added yet and sets the ttls
+        progress = self._get_progress(data)
+
+        def add(p, i):
+            new_key, (key, _, property_name), t, val = data[i]
+            # the entries of a stream are keyed by property name.
+            # trim approximately - redis removes whole macro nodes only,
+            # which is way cheaper than trimming to the exact length
+            p.xadd(key, {property_name: msgpack.packb((t, val))},
+                   maxlen=self._stream_maxlen, approximate=True)
+        added, error = self._add_once(progress, add)
+        if self._ttl is not None:
+            # a stream expires once its properties stop sending data
+            for i in sorted(added):
+                key = data[i][1][0]
+                if key not in progress.expired:
+                    progress.expired.append(key)
+        if error is not None:
+            raise error
+        if progress.expired:
+            with self._client.pipeline(transaction=False) as p:
+                for key in progress.expired:
+                    p.expire(key, self._ttl)
+                results = p.execute()
+            if len(results) != len(progress.expired):
+                raise RuntimeError("invalid response from execute")
+            if not all(result == 1 for result in results):
+                raise RuntimeError("cannot set ttl")
+        self._progress = None
+
+    def _add_by_script(self, data):
+        keys, args = pack_groups(data, self._ttl, self._ttl_last_item)
+        try:
+            result = self._script(keys=keys, args=args)
+        except redis.ResponseError as e:
+            if not _is_scripting_unavailable(e):
+                # e.g. WRONGTYPE or OOM - the script is fine, retry later
+                raise
+            # scripting is disabled or not supported - don't try again
+            self._log.warn("cannot run the ingest script on %s (%s), " %
+                           (self._uri, e) +
+                           "falling back to pipelined commands")
+            self._script = None
+            self._add_by_pipeline(data)
+            return
+        if result != len(keys):
+            raise RuntimeError("invalid response from the ingest script")
+        if self._latest is not None:
+            with self._client.pipeline(transaction=False) as p:
+                self._add_latest(p, data)
+                p.execute()
+
+    def _add_latest(self, p, data):
+        # one HSET per hash and batch, the last data point of
+        # a property in a batch wins - returns the number of commands
+        if self._latest is None:
+            return 0
+        hashes = OrderedDict()
+        for new_key, (_, component_name, property_name), t, val in data:
+            name, field = get_latest_location(component_name, property_name,
+                                              self._latest, self._hash_tags)
+            hashes.setdefault(name, {})[field] = msgpack.packb((t, val))
+        for name, mapping in hashes.items():
+            p.hset(name, mapping=mapping)
+        return len(hashes)
+
     def cancel(self):
         self._canceled.set()
 
@@ -252,7 +653,21 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                  ttl=timedelta(seconds=1800),
                  ttl_last_item=False,
                  fifo_size=1000,
+                 fifo_bytes=0,
+                 spill_dir=None,
+                 spill_max_bytes=1024**3,
                  n_workers=1,
+                 batch_size_min=1,
+                 batch_size_max=1000,
+                 batch_latency=0.1,
+                 ingest=INGEST_PIPELINE,
+                 layout=LAYOUT_ZSET,
+                 stream_maxlen=10000,
+                 stream_by=STREAM_BY_PROPERTY,
+                 latest=None,
+                 chunk_size=timedelta(seconds=900),
+                 hash_tags=False,
+                 cluster=False,
                  worker_is_daemon=False,
                  log=None,
                  *args, **kwargs):
@@ -261,8 +676,9 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
 
         @param uri: redis URI. Optional, default is "redis://localhost:6379/0".
         @type uri: string
-        @param ttl: Data is currently stored in 15 minutes long chunks per
-        property. A chunk will expire after its 'time to live'.
+        @param ttl: Data is stored in chunks of chunk_size per property.
+        A chunk will expire after its 'time to live' - which is at least
+        twice the chunk size (or the chunk size if ttl_last_item is set).
         The ttl can be given as a timedelta, a 'number of seconds' or None
         in case a chunk should never expire. Optional, default is 30 minutes.
         @type ttl: datetime.timedelta or int or float or NoneType
@@ -275,9 +691,85 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         backend buffers) and the consumer thread(s) that insert(s) the data
         into redis. Optional, default is 1000.
         @type fifo_size: int
+        @param fifo_bytes: Sets the upperbound limit on the approximate
+        number of bytes of the values in the FIFO before overwriting older values.
+        The FIFO is full if either fifo_size or fifo_bytes is reached.
+        Less than or equal to zero means no limit. Optional, default is 0.
+        @type fifo_bytes: int
+        @param spill_dir: Directory to spill values to once the FIFO is full
+        - instead of overwriting older values. Consumers drain the spill file
+        in order when the database is available again. Optional, default is
+        None (no spill file).
+        @type spill_dir: string
+        @param spill_max_bytes: Sets the upperbound limit on the number of
+        bytes the spill file may use before its oldest values are dropped.
+        Less than or equal to zero means no limit. Optional, default is 1 GiB.
+        @type spill_max_bytes: int
         @param n_workers: Number of consumer threads, so called workers.
         Optional, default is 1.
         @type n_workers: int
+        @param batch_size_min: The minimum number of data points a worker
+        adds at once. Optional, default is 1.
+        @type batch_size_min: int
+        @param batch_size_max: The maximum number of data points a worker
+        adds at once. The batch size adapts in between
+        (cf. ctamonitoring.property_recorder.backend.batch_controller).
+        Optional, default is 1000.
+        @type batch_size_max: int
+        @param batch_latency: The target latency of a batch in seconds.
+        Optional, default is 0.1.
+        @type batch_latency: float
+        @param ingest: How workers add a batch of data points:
+        INGEST_PIPELINE ("pipeline") sends a ZADD per data point
+        (plus an EXPIRE) in a pipeline, INGEST_LUA ("lua") sends one
+        packed group per key to a Lua script (EVALSHA) that does
+        the ZADDs and EXPIREs on the server. Workers fall back to
+        the pipeline if the server doesn't run the script, e.g.
+        since scripting is disabled. Optional, default is "pipeline".
+        @type ingest: string
+        @param layout: How a chunk is stored: LAYOUT_ZSET ("zset") is
+        a sorted set with a member per data point, LAYOUT_APPEND ("append")
+        is a string that data points are appended to as msgpack records
+        plus an index hash to slice it by time
+        (cf. ctamonitoring.property_recorder.backend.redis.packed).
+        LAYOUT_STREAM ("stream") doesn't chunk data at all but adds it
+        to a stream per property or component (XADD with MAXLEN ~) that
+        live consumers can tail by XREAD BLOCK or consumer groups
+        (cf. get_stream_key()). An entry maps the property name to
+        the data point packed by msgpack. A stream expires ttl after its
+        last entry. The append and the stream layout need the pipeline
+        ingest. Optional, default is "zset".
+        @type layout: string
+        @param stream_maxlen: The approximate number of entries a stream
+        is trimmed to. Optional, default is 10000.
+        @type stream_maxlen: int
+        @param stream_by: Add the data of a property to its own stream,
+        STREAM_BY_PROPERTY ("property"), or to the stream of its component,
+        STREAM_BY_COMPONENT ("component"). Optional, default is "property".
+        @type stream_by: string
+        @param latest: Keep the latest data point of every property in
+        a hash as well - one hash for all properties, LATEST_SYSTEM
+        ("system"), or one hash per component, LATEST_COMPONENT
+        ("component") (cf. get_latest_location()). A snapshot of
+        the system or a component is a single HGETALL then.
+        The fields are HSET in the pipeline of the data points and
+        don't expire. Optional, default is None (no hash).
+        @type latest: string
+        @param chunk_size: The time span of a chunk - as a timedelta or
+        a number of seconds. Fractions of seconds are ignored.
+        Optional, default is 15 minutes.
+        @type chunk_size: datetime.timedelta or int
+        @param hash_tags: Use the component name as a hash tag of
+        the keys of a component's chunks, streams and latest-value hash,
+        e.g. {component}:property:chunk_begin (cf. get_chunk_key()).
+        A redis cluster keeps all keys of a component in one hash slot
+        then. Optional, default is False.
+        @type hash_tags: bool
+        @param cluster: uri is a node of a redis cluster. Workers send
+        the commands of a batch as one pipeline per node
+        (cf. ctamonitoring.property_recorder.backend.redis.cluster).
+        A cluster needs the pipeline ingest. Optional, default is False.
+        @type cluster: bool
         @param worker_is_daemon: Workers traditionally run as daemon threads
         but this seems not to work within an ACS component. So this is your
         choice ;). We will try to stop all workers in the destructor in case
@@ -292,35 +784,75 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
             self._log = getLogger(defaultname)
         self._log.debug("creating a redis registry")
         self._uri = uri
-        self._chunk_size = timedelta(seconds=900)
+        if isinstance(chunk_size, timedelta):
+            self._chunk_size = chunk_size
+        else:
+            self._chunk_size = timedelta(seconds=chunk_size)
+        if get_total_seconds(self._chunk_size, True) < 1:
+            raise ValueError("the chunk size must be a second or longer")
         if ttl is None or isinstance(ttl, timedelta):
             self._ttl = ttl
         else:
             self._ttl = timedelta(seconds=ttl)
         if self._ttl is not None:
             if not ttl_last_item and (self._ttl < 2 * self._chunk_size):
-                raise RuntimeError("The chunk size is currently %s." %
+                raise RuntimeError("The chunk size is %s." %
                                    (self._chunk_size,) + " " +
                                    "TTL of a chunk should be 2x longer " +
                                    "than that.")
             elif ttl_last_item and (self._ttl < self._chunk_size):
-                raise RuntimeError("The chunk size is currently %s." %
+                raise RuntimeError("The chunk size is %s." %
                                    (self._chunk_size,) + " " +
                                    "TTL of a chunk should be longer " +
                                    "than that.")
         self._ttl_last_item = ttl_last_item
+        if ingest not in (INGEST_PIPELINE, INGEST_LUA):
+            raise ValueError("unknown ingest mode %r" % (ingest,))
+        if layout not in (LAYOUT_ZSET, LAYOUT_APPEND, LAYOUT_STREAM):
+            raise ValueError("unknown layout %r" % (layout,))
+        if layout != LAYOUT_ZSET and ingest != INGEST_PIPELINE:
+            raise ValueError("the %s layout needs the pipeline ingest" %
+                             (layout,))
+        if stream_by not in (STREAM_BY_PROPERTY, STREAM_BY_COMPONENT):
+            raise ValueError("unknown stream_by %r" % (stream_by,))
+        if latest not in (None, LATEST_SYSTEM, LATEST_COMPONENT):
+            raise ValueError("unknown latest %r" % (latest,))
+        if cluster and ingest != INGEST_PIPELINE:
+            raise ValueError("a cluster needs the pipeline ingest")
+        self._layout = layout
+        self._stream_by = stream_by
+        self._hash_tags = hash_tags
 
         self._client = redis.StrictRedis.from_url(uri)
+        self._router = None
+        # the client of the data - the property descriptions
+        # are a single key and use the client of its node
+        self._data_client = self._client
+        if cluster:
+            self._router = ClusterRouter(self._client)
+            self._data_client = self._router
+            self._client = self._router.get_client_of("properties")
 
         self._worker_is_daemon = worker_is_daemon
         if n_workers <= 0:
             n_workers = 1
-        self._fifo = RingBuffer(fifo_size)
+        self._spill = None
+        if spill_dir is not None:
+            self._spill = SpillFile(spill_dir, spill_max_bytes,
+                                    prefix=defaultname + "_")
+        self._fifo = RingBuffer(fifo_size,
+                                multi_consumer=(n_workers > 1),
+                                spill=self._spill,
+                                maxbytes=fifo_bytes)
+        self._batch = BatchController(batch_size_min, batch_size_max,
+                                       batch_latency, 10)
         self._workers = []  # keep this the last class member variable in ctor
         for _ in range(n_workers):
-            worker = _Worker(uri, self._client,
-                             self._ttl, self.ttl_last_item,
-                             self._fifo, self._log)
+            worker = _Worker(uri, self._data_client,
+                             self._ttl, self._ttl_last_item,
+                             self._fifo, self._batch, self._log,
+                             ingest, layout, stream_maxlen, latest,
+                             hash_tags)
             worker.daemon = worker_is_daemon
             worker.start()
             self._workers.append(worker)
@@ -373,6 +905,107 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                     except redis.WatchError:
                         continue
 
+    def _insert_descriptions(self, property_descs, forces):
+        # the batched version of _insert_description():
+        # one pipeline for all forced descriptions plus one transaction
+        # for all other ones - returns None or a UserWarning per description
+        results = [None] * len(property_descs)
+        keys = [":".join([d["component_type"],
+                          d["component_name"],
+                          d["property_name"]]) for d in property_descs]
+        forced = [i for i, force in enumerate(forces) if force]
+        if forced:
+            with self._client.pipeline() as p:
+                p.hincrby("properties", "rev", 1)
+                for i in forced:
+                    p.hset("properties", keys[i],
+                           msgpack.packb(property_descs[i]))
+                replaced = p.execute()[1:]
+            for i, created in zip(forced, replaced):
+                if not created:
+                    self._log.warn("a property description for %s/%s " %
+                                   (property_descs[i]["component_name"],
+                                    property_descs[i]["property_name"]) +
+                                   "existed and was replaced!")
+        others = [i for i, force in enumerate(forces) if not force]
+        if not others:
+            return results
+        with self._client.pipeline() as p:
+            while 1:
+                try:
+                    p.watch("properties")
+                    orig_vals = p.hmget("properties",
+                                        [keys[i] for i in others])
+                    new = {}
+                    for i, orig_val in zip(others, orig_vals):
+                        property_desc = property_descs[i]
+                        cn = property_desc["component_name"]
+                        pn = property_desc["property_name"]
+                        results[i] = None
+                        if orig_val is not None:
+                            orig_property_desc = msgpack.unpackb(orig_val)
+                        else:
+                            orig_property_desc = new.get(keys[i])
+                        if orig_property_desc is None:
+                            new[keys[i]] = property_desc
+                        elif orig_property_desc != property_desc:
+                            results[i] = UserWarning("a different property " +
+                                                     "description for " +
+                                                     "%s/%s" % (cn, pn) +
+                                                     " is existing")
+                        else:
+                            self._log.info("a property description " +
+                                           "for %s/%s is existing" %
+                                           (cn, pn) + " - " +
+                                           "is another recorder running?")
+                    if new:
+                        p.multi()
+                        p.hincrby("properties", "rev", 1)
+                        for key, property_desc in new.items():
+                            p.hset("properties", key,
+                                   msgpack.packb(property_desc))
+                        p.execute()
+                    break
+                except redis.WatchError:
+                    continue
+        return results
+
+    def _get_property_desc(self, component_name, component_type,
+                           property_name, property_type, property_type_desc,
+                           meta):
+        # we actually don't care too much here what parameters are given
+        # however, component name and property name are the main
+        # characteristics to identify a property so we will check these
+        # component type is also important for bookkeeping
+        self._check_name(component_type, "component_type")
+        self._check_name(component_name, "component_name")
+        self._check_name(property_name, "property_name")
+        property_desc = {"component_name": component_name,
+                         "component_type": component_type,
+                         "property_name": property_name,
+                         "property_type": str(property_type),
+                         "property_type_desc": property_type_desc,
+                         "meta": meta,
+                         "chunk_size": get_total_seconds(self._chunk_size,
+                                                         True),
+                         "ttl": get_total_seconds(self._ttl, False)}
+        if self._layout != LAYOUT_ZSET:
+            # keep the descriptions of the default layout as they were
+            property_desc["layout"] = self._layout
+        if self._layout == LAYOUT_STREAM:
+            property_desc["stream_by"] = self._stream_by
+        if self._hash_tags:
+            property_desc["hash_tags"] = True
+        return property_desc
+
+    def _get_stream_key(self, component_name, property_name):
+        if self._layout != LAYOUT_STREAM:
+            return None
+        if self._stream_by == STREAM_BY_COMPONENT:
+            return get_stream_key(component_name, None, self._hash_tags)
+        return get_stream_key(component_name, property_name,
+                              self._hash_tags)
+
     def register(self,
                  component_name, component_type,
                  property_name, property_type, property_type_desc=None,
@@ -390,26 +1023,70 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
         @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register()
         """
         self._log.info("registering %s/%s" % (component_name, property_name))
-        # we actually don't care too much here what parameters are given
-        # however, component name and property name are the main
-        # characteristics to identify a property so we will check these
-        # component type is also important for bookkeeping
-        self._check_name(component_type, "component_type")
-        self._check_name(component_name, "component_name")
-        self._check_name(property_name, "property_name")
-        property_desc = {"component_name": component_name,
-                         "component_type": component_type,
-                         "property_name": property_name,
-                         "property_type": str(property_type),
-                         "property_type_desc": property_type_desc,
-                         "meta": meta,
-                         "chunk_size":
-                         get_total_seconds(self._chunk_size, True),
-                         "ttl": get_total_seconds(self._ttl, False)}
+        property_desc = self._get_property_desc(component_name,
+                                                component_type,
+                                                property_name, property_type,
+                                                property_type_desc, meta)
         self._insert_description(property_desc, force)
         return Buffer(self._log, self._fifo, self._chunk_size,
                       component_name, property_name,
-                      disable)
+                      disable, self._get_stream_key(component_name,
+                                                    property_name),
+                      self._hash_tags)
+
+    def register_many(self, specs):
+        """
+        Register several properties by one pipeline (plus one for the ones
+        that are forced).
+
+        The exceptions in place of buffers are the ones of register().
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register_many()
+        """
+        results = [None] * len(specs)
+        pending = []
+        property_descs = []
+        forces = []
+        for i, spec in enumerate(specs):
+            try:
+                component_name, component_type, \
+                    property_name, property_type, property_type_desc, \
+                    disable, force, meta = self._parse_spec(spec)
+                self._log.info("registering %s/%s" %
+                               (component_name, property_name))
+                property_descs.append(
+                    self._get_property_desc(component_name, component_type,
+                                            property_name, property_type,
+                                            property_type_desc, meta))
+            except (TypeError, ValueError) as e:
+                results[i] = e
+                continue
+            forces.append(force)
+            pending.append((i, component_name, property_name, disable))
+        if not pending:
+            return results
+        try:
+            warnings = self._insert_descriptions(property_descs, forces)
+        except Exception as e:
+            warnings = [e] * len(pending)
+        for (i, component_name, property_name, disable), warning in \
+                zip(pending, warnings):
+            if warning is not None:
+                results[i] = warning
+            else:
+                results[i] = Buffer(self._log, self._fifo, self._chunk_size,
+                                    component_name, property_name,
+                                    disable,
+                                    self._get_stream_key(component_name,
+                                                         property_name),
+                                    self._hash_tags)
+        return results
+
+    def get_stats(self):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.get_stats()
+        """
+        return {"fifo": self._fifo.get_stats(),
+                "batch_size": self._batch.size}
 
     def __del__(self):
         """dtor."""
@@ -435,11 +1112,15 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                 self._fifo.terminate()
                 for worker in self._workers:
                     worker.join()
+                if self._spill is not None:
+                    self._spill.close()
             if self._ttl is not None:
-                with self._client.pipeline(transaction=False) as p:
+                with self._data_client.pipeline(transaction=False) as p:
                     with _lock:
                         for key in _to_expire:
                             p.expire(key, self._ttl)
                     p.execute()
+            if self._router is not None:
+                self._router.close()
         except:
             pass
@@ -12,47 +12,27 @@ A ring buffer.
 @change: $LastChangedBy$
 @requires: collections
 @requires: ctamonitoring.property_recorder.backend.exceptions
+@requires: ctamonitoring.property_recorder.backend.spill_file eventually
+@requires: ctamonitoring.property_recorder.backend.util
+@requires: heapq
 @requires: threading
+@requires: time
 """
 
 
 from collections import deque
 from ctamonitoring.property_recorder.backend.exceptions \
     import InterruptedException
+from ctamonitoring.property_recorder.backend.util import get_approx_size
+from heapq import heappop
+from heapq import heappush
 from threading import Condition
 from threading import Event
+import time
 
 
-class _DownCounter(object):
-    def __init__(self, count):
-        self._cond = Condition()
-        if count < 0:
-            self._count = 0
-        else:
-            self._count = count
-        self._terminated = False
-
-    def dec(self):
-        with self._cond:
-            if self._count:
-                self._count -= 1
-                if not self._count:
-                    self._cond.notify()
-            return self._count
-
-    def terminate(self):
-        with self._cond:
-            if self._count and not self._terminated:
-                self._terminated = True
-                self._cond.notify()
-
-    def wait(self, timeout=None):
-        with self._cond:
-            if self._count and not self._terminated:
-                self._cond.wait(timeout)
-            if self._terminated:
-                raise InterruptedException()
-            return self._count
+_REFILL_SIZE = 100
+_PROMOTED = object()  # placeholder for an item moved to the priority lane
 
 
 class _Trigger(object):
@@ -75,9 +55,14 @@ class RingBuffer(object):
     starting at the beginning of the buffer and overwriting the old.
 
     RingBuffer is typically used in a producer/consumer scheme.
+
+    Besides this (bulk) lane, RingBuffer has a priority lane for little but
+    urgent traffic like the last items of a producer that is closing.
+    Consumers get the items of the priority lane first.
     """
 
-    def __init__(self, maxsize=0):
+    def __init__(self, maxsize=0, multi_consumer=False, spill=None,
+                 maxbytes=0, sizer=None):
         """
         ctor.
 
@@ -86,53 +71,337 @@ class RingBuffer(object):
         If maxsize is less than or equal to zero, the buffer size is infinite.
         Optional, default is 0.
         @type maxsize: int
+        @param multi_consumer: Wake as many waiting consumers as there are
+        full batches available instead of waking the first consumer only.
+        This lets several consumers remove items in parallel.
+        Optional, default is False.
+        @type multi_consumer: boolean
+        @param spill: An overflow tier on disk. If given, items are not
+        overwritten when the buffer is full but appended to the spill file
+        (which may drop its oldest items to keep its byte limit).
+        Consumers get the spilled items in order once the buffer is drained.
+        Only used if maxsize or maxbytes is greater than zero.
+        Optional, default is None.
+        @type spill: ctamonitoring.property_recorder.backend.spill_file.SpillFile
+        @param maxbytes: Sets the upperbound limit on the approximate number
+        of bytes of the items in the buffer before overwriting old items.
+        The buffer is full if either maxsize or maxbytes is reached.
+        If maxbytes is less than or equal to zero, only maxsize applies.
+        Optional, default is 0.
+        @type maxbytes: int
+        @param sizer: Returns the approximate size of an item in bytes.
+        Optional, default is None - get_approx_size() if maxbytes is
+        greater than zero, otherwise bytes are not accounted for.
+        @type sizer: callable
         """
         if maxsize > 0:
             self._maxsize = maxsize
         else:
             self._maxsize = None
+        if maxbytes > 0:
+            self._maxbytes = maxbytes
+            if sizer is None:
+                sizer = get_approx_size
+        else:
+            self._maxbytes = None
+        if self._maxsize or self._maxbytes:
+            self._spill = spill
+        else:
+            self._spill = None
+        self._multi_consumer = multi_consumer
         self._cond = Condition()
         self._buf = deque()
-        self._flushers = []
+        self._sizer = sizer
+        self._sizes = deque()
+        self._bytes = 0
+        self._bytes_hwm = 0
+        # every item gets a sequence number when it is added.
+        # _added_seq is the one of the next item to add and
+        # _consumed_seq the one of the oldest item still in the buffer
+        # - so, a flush waits until _consumed_seq reaches the sequence
+        # number of the last item that was added before the flush.
+        # spilled items are newer than the ones in memory and
+        # memory is refilled from the spill file once it is empty.
+        # so, the items in memory are always in sequence but
+        # there might be gaps in between memory and spill file
+        # (or within the spill file) if it drops items.
+        self._added_seq = 0
+        self._consumed_seq = 0
+        self._spill_seq = 0  # the one of the oldest spilled item
+        self._flushers = []  # heap of sequence numbers flushers wait for
         self._getters = []
-        self._flush = False
         self._flush_all = False
+        self._emptied = 0
+        self._n_flushing = 0  # flushers that wait for the priority lane
+        # the optional producer of every item in memory and
+        # the sequence number of every producer's latest item
+        self._owners = deque()
+        self._last_seq = {}
+        # the priority lane isn't limited and has no sequence numbers.
+        # items that are promoted from memory leave a placeholder behind
+        # - so, the sequence numbers are still in order.
+        self._prio = deque()
+        self._prio_added = 0
+        self._prio_consumed = 0
+        self._n_promoted = 0  # placeholders in memory
         self._terminating = False
         self._terminated = False
+        # statistics
+        self._n_added = 0
+        self._n_consumed = 0
+        self._n_overwritten = 0
+        self._peak_depth = 0
+        self._n_get_waits = 0
+        self._get_wait_time = 0.0
+        self._n_flushes = 0
+        self._flush_wait_time = 0.0
 
-    def _decrement_flushers(self):
-        self._flush = False
-        for f in self._flushers:
-            self._flush |= bool(f.dec())
+    def _consume(self, n):
+        self._consumed_seq += n
+        if self._flushers and self._flushers[0] <= self._consumed_seq:
+            while self._flushers and self._flushers[0] <= self._consumed_seq:
+                heappop(self._flushers)
+            self._cond.notify_all()
+
+    def _size(self):
+        size = len(self._buf) - self._n_promoted + len(self._prio)
+        if self._spill is not None:
+            size += len(self._spill)
+        return size
+
+    def _is_empty(self):
+        return not self._buf and not self._prio
+
+    def _get_size(self, item):
+        if self._sizer is not None:
+            return self._sizer(item)
+        return 0
+
+    def _is_full(self, size=0):
+        # a single item that exceeds maxbytes still fits into an empty buffer
+        n = len(self._buf) - self._n_promoted
+        return ((self._maxsize is not None and n >= self._maxsize) or
+                (self._maxbytes is not None and n > 0 and
+                 self._bytes + size > self._maxbytes))
+
+    def _append(self, item, size, producer):
+        if self._sizer is not None:
+            self._sizes.append(size)
+            self._bytes += size
+            if self._bytes > self._bytes_hwm:
+                self._bytes_hwm = self._bytes
+        self._buf.append(item)
+        self._owners.append(producer)
+
+    def _popleft(self):
+        if self._sizer is not None:
+            self._bytes -= self._sizes.popleft()
+        self._owners.popleft()
+        item = self._buf.popleft()
+        if item is _PROMOTED:
+            self._n_promoted -= 1
+        return item
+
+    def _overwrite(self):
+        item = self._popleft()
+        self._consume(1)
+        if item is not _PROMOTED:
+            self._n_overwritten += 1
+
+    def _promote(self, producer):
+        # move the producer's items from memory to the priority lane
+        if producer not in self._owners:
+            return
+        items = list(self._buf)
+        owners = list(self._owners)
+        for i, owner in enumerate(owners):
+            if owner == producer:
+                self._prio.append(items[i])
+                items[i] = _PROMOTED
+                owners[i] = None
+                if self._sizer is not None:
+                    self._bytes -= self._sizes[i]
+                    self._sizes[i] = 0
+                self._n_promoted += 1
+                self._prio_added += 1
+        self._buf = deque(items)
+        self._owners = deque(owners)
+
+    def _update_peak_depth(self):
+        depth = self._size()
+        if depth > self._peak_depth:
+            self._peak_depth = depth
+
+    def __len__(self):
+        with self._cond:
+            return self._size()
+
+    @property
+    def bytes(self):
+        """
+        The approximate number of bytes of the items in the buffer
+        (0 if bytes are not accounted for).
+        """
+        return self._bytes
+
+    @property
+    def bytes_hwm(self):
+        """The high watermark of bytes."""
+        return self._bytes_hwm
 
     def _trigger(self):
         if (self._getters and
             not self._getters[0].trigger.is_set() and
-            (self._flush or
+            (self._prio or
+             self._flushers or
              self._flush_all or
              self._terminating or
-             self._getters[0].n <= len(self._buf))):
+             self._getters[0].n <= self._size())):
             self._getters[0].trigger.set()
+        if self._multi_consumer and len(self._getters) > 1:
+            # hand out the remaining items to the next getters,
+            # full batches only unless a flush/termination is pending
+            hurry = (self._prio or self._flushers or
+                 self._flush_all or self._terminating)
+            available = self._size() - self._getters[0].n
+            for getter in self._getters[1:]:
+                if available <= 0:
+                    break
+                if not getter.trigger.is_set():
+                    if getter.n > available and not hurry:
+                        break
+                    getter.trigger.set()
+                available -= getter.n
+
+    def _add_to_memory(self, items, producer):
+        for item in items:
+            size = self._get_size(item)
+            while self._is_full(size):
+                self._overwrite()
+            self._append(item, size, producer)
+            self._added_seq += 1
+
+    def _add_to_spill(self, items, producer):
+        n = len(self._spill)
+        if not n:
+            self._spill_seq = self._added_seq
+        try:
+            dropped = self._spill.add([(producer, item) for item in items])
+        except Exception:
+            # items that could not be spilled don't get a sequence number
+            stored = len(self._spill) - n
+            self._added_seq += stored
+            if not len(self._spill):
+                # nothing is spilled - overwrite the oldest items instead
+                self._add_to_memory(items[stored:], producer)
+            else:
+                self._n_overwritten += len(items) - stored
+        else:
+            self._added_seq += len(items)
+            self._spill_seq += dropped
+            self._n_overwritten += dropped
+
+    def _refill(self):
+        try:
+            # refill maxsize items or, if the buffer is limited by bytes
+            # only, a batch that may exceed maxbytes for a while
+            items = self._spill.get(self._maxsize or _REFILL_SIZE)
+        except Exception:
+            # the spill file is broken - drop what's left
+            self._n_overwritten += len(self._spill)
+            self._spill.close()
+            self._consume(self._added_seq - self._consumed_seq)
+        else:
+            self._consume(self._spill_seq - self._consumed_seq)
+            self._spill_seq += len(items)
+            for producer, item in items:
+                self._append(item, self._get_size(item), producer)
+
+    def _add_to_prio(self, items):
+        self._prio.extend(items)
+        self._prio_added += len(items)
 
-    def add(self, item):
+    def _set_last_seq(self, producer, seq):
+        if producer is not None and self._added_seq > seq:
+            self._last_seq[producer] = self._added_seq - 1
+
+    def add(self, item, producer=None, priority=False):
         """
         Add a new item to the buffer.
 
-        Overwrite the oldest if the buffer is full.
+        Overwrite the oldest (or spill the new item) if the buffer is full.
         @param item: The new item.
+        @param producer: Identifies the producer of the item for
+        flush(producer=producer). Optional, default is None.
+        @type producer: hashable
+        @param priority: Add the item to the priority lane that is neither
+        limited nor overwritten. Optional, default is False.
+        @type priority: boolean
+        """
+        size = self._get_size(item)
+        with self._cond:
+            self._n_added += 1
+            seq = self._added_seq
+            if priority:
+                self._add_to_prio([item])
+            elif self._spill is not None and (len(self._spill) or
+                                              self._is_full(size)):
+                self._add_to_spill([item], producer)
+            else:
+                while self._is_full(size):
+                    self._overwrite()
+                self._append(item, size, producer)
+                self._added_seq += 1
+            self._set_last_seq(producer, seq)
+            self._update_peak_depth()
+            self._trigger()
+
+    def add_many(self, items, producer=None, priority=False):
         """
+        Add new items to the buffer.
+
+        Works like calling add() for every item but acquires the lock
+        and triggers waiting consumers only once.
+        Overwrite the oldest (or spill the new items) if the buffer is full.
+        @param items: The new items.
+        @type items: list
+        @param producer: Identifies the producer of the items for
+        flush(producer=producer). Optional, default is None.
+        @type producer: hashable
+        @param priority: Add the items to the priority lane that is neither
+        limited nor overwritten. Optional, default is False.
+        @type priority: boolean
+        """
+        if not len(items):
+            return
         with self._cond:
-            if self._maxsize and (self._maxsize == len(self._buf)):
-                self._buf.popleft()
-                self._decrement_flushers()
-            self._buf.append(item)
+            self._n_added += len(items)
+            seq = self._added_seq
+            if priority:
+                self._add_to_prio(items)
+            elif self._spill is not None:
+                i = 0
+                if not len(self._spill):
+                    while i < len(items):
+                        size = self._get_size(items[i])
+                        if self._is_full(size):
+                            break
+                        self._append(items[i], size, producer)
+                        i += 1
+                    self._added_seq += i
+                if i < len(items):
+                    self._add_to_spill(items[i:], producer)
+            else:
+                self._add_to_memory(items, producer)
+            self._set_last_seq(producer, seq)
+            self._update_peak_depth()
             self._trigger()
 
     def _test_terminated(self):
         if self._terminated:
                 raise InterruptedException()
 
-    def flush(self, current=False):
+    def flush(self, current=False, producer=None):
         """
         Block until all items in the buffer have been removed.
 
@@ -140,41 +409,101 @@ class RingBuffer(object):
         removed or overwritten OR until the buffer is empty.
         Optional, default is False.
         @type current: boolean.
+        @param producer: Block until the items of this producer that are
+        currently included have been removed or overwritten. These items
+        are moved to the priority lane first - so, they don't wait for
+        the items of other producers (unless some are spilled already).
+        Implies current. Optional, default is None.
+        @type producer: hashable
         @raise ctamonitoring.property_recorder.backend.exceptions.InterruptedException:
         if flush() is blocking and terminate() is called or
         if get() is called after terminate().
         """
+        with self._cond:
+            if self._is_empty():
+                self._last_seq.pop(producer, None)
+                return
+            self._test_terminated()
+            self._n_flushes += 1
+            self._n_flushing += 1
+            begin = time.time()
+            try:
+                if producer is not None:
+                    self._wait_for_producer(producer)
+                else:
+                    self._wait_for_flush(current)
+            finally:
+                self._n_flushing -= 1
+                self._flush_wait_time += time.time() - begin
+
+    def _wait(self, is_done):
+        while not is_done():
+            self._cond.wait()
+            if self._terminated and not is_done():
+                raise InterruptedException()
+
+    def _wait_for_producer(self, producer):
+        seq = self._last_seq.pop(producer, None)
+        if seq is not None and seq < self._consumed_seq:
+            seq = None
+        if seq is not None:
+            self._promote(producer)
+            if seq < self._consumed_seq + len(self._buf):
+                seq = None  # nothing's left in the spill file
+            else:
+                self._last_seq[producer] = seq
+                heappush(self._flushers, seq + 1)
+        prio_seq = self._prio_added
+        self._trigger()
+        try:
+            self._wait(lambda: (self._prio_consumed >= prio_seq and
+                                (seq is None or self._consumed_seq > seq)))
+        finally:
+            if seq is not None and self._last_seq.get(producer) == seq:
+                del self._last_seq[producer]
+
+    def _wait_for_flush(self, current):
         if current:
-            flusher = None
-            with self._cond:
-                if self._buf:
-                    self._test_terminated()
-                    flusher = _DownCounter(len(self._buf))
-                    self._flushers.append(flusher)
-                    self._flush = True
-                    self._trigger()
-            if flusher is not None:
-                try:
-                    flusher.wait()
-                finally:
-                    with self._cond:
-                        self._flushers.remove(flusher)
+            seq = self._added_seq
+            prio_seq = self._prio_added
+            # the priority lane doesn't need a flusher entry,
+            # a stale one would hurry the getters until the next _consume()
+            if self._consumed_seq < seq:
+                heappush(self._flushers, seq)
+            self._trigger()
+            self._wait(lambda: (self._consumed_seq >= seq and
+                                self._prio_consumed >= prio_seq))
         else:
-            with self._cond:
-                if self._buf:
-                    self._test_terminated()
-                    self._flush_all = True
-                    self._trigger()
-                    self._cond.wait()
-                    if self._flush_all:
-                        raise InterruptedException()
+            emptied = self._emptied
+            self._flush_all = True
+            self._trigger()
+            self._wait(lambda: self._emptied != emptied)
 
     def _get_items(self, items, n):
+        k = min(n, len(self._prio))
+        if k:
+            for _ in range(k):
+                items.append(self._prio.popleft())
+            self._prio_consumed += k
+            if self._n_flushing:
+                self._cond.notify_all()
         while len(items) < n and self._buf:
-            items.append(self._buf.popleft())
-            self._decrement_flushers()
-        if not self._buf:
+            k = min(n - len(items), len(self._buf))
+            for _ in range(k):
+                item = self._popleft()
+                if item is not _PROMOTED:
+                    items.append(item)
+            self._consume(k)
+            if not self._buf and self._spill is not None:
+                if len(self._spill):
+                    self._refill()
+                else:
+                    # skip items that were dropped by the spill file
+                    self._consume(self._added_seq - self._consumed_seq)
+        self._n_consumed += len(items)
+        if self._is_empty():
             self._flush_all = False
+            self._emptied += 1
             self._cond.notify_all()
 
     def get(self, n=1, timeout=None):
@@ -204,12 +533,15 @@ class RingBuffer(object):
             self._test_terminated()
             if not n:
                 pass
-            elif not self._getters and n <= len(self._buf):
+            elif not self._getters and n <= self._size():
                 self._get_items(items, n)
             else:
                 getter = _Trigger(n)
                 self._getters.append(getter)
+                # don't wait for n items if a flush is already pending
+                self._trigger()
         if getter is not None:
+            begin = time.time()
             try:
                 getter.trigger.wait(timeout)  # shouldn't throw but who knows
             except:
@@ -218,30 +550,75 @@ class RingBuffer(object):
                     raise
             else:
                 with self._cond:
+                    self._n_get_waits += 1
+                    self._get_wait_time += time.time() - begin
                     first_getter = getter is self._getters[0]
                     self._getters.remove(getter)
                     if (timeout is None or timeout > 0):
                         self._test_terminated()
-                    # we could simplify this to just testing terminated and
-                    # first_getter since we currently only trigger the
-                    # first getter.  however it may change how we trigger
-                    # getters so, keep testing if the getter was triggered or
-                    # if it is the first one.
+                    # the first getter may take items although it wasn't
+                    # triggered (timeout) - any other getter must have been
+                    # triggered (multi consumer mode).
                     if (not getter.terminated and
                             (getter.trigger.is_set() or first_getter)):
                         self._get_items(items, n)
                         if (self._terminating and
-                                (not self._buf or not self._getters)):
+                                (self._is_empty() or not self._getters)):
                             self._terminate()
                         else:
                             self._trigger()
         return items
 
+    def get_stats(self):
+        """
+        Return a snapshot of the buffer statistics.
+
+        The counters are cumulative since the buffer was created:
+        added - the number of items added,
+        consumed - the number of items removed by get(),
+        overwritten - the number of items that were overwritten or
+        dropped by the spill file,
+        depth and peak_depth - the current and the maximum number of items
+        in the buffer (including spilled items and the priority lane),
+        priority - the number of items in the priority lane,
+        bytes and peak_bytes - the current and the maximum approximate
+        number of bytes in memory,
+        spilled and spill_bytes - the number of items and bytes in the spill
+        file,
+        get_waits and get_wait_time - the number of get() calls that blocked
+        and the time in seconds they spent waiting,
+        flushes and flush_wait_time - the number of flush() calls that
+        blocked and the time in seconds they spent waiting.
+        @return: The statistics.
+        @rtype: dict
+        """
+        with self._cond:
+            if self._spill is not None:
+                spilled = len(self._spill)
+                spill_bytes = self._spill.bytes
+            else:
+                spilled = 0
+                spill_bytes = 0
+            return {"added": self._n_added,
+                    "consumed": self._n_consumed,
+                    "overwritten": self._n_overwritten,
+                    "depth": self._size(),
+                    "peak_depth": self._peak_depth,
+                    "bytes": self._bytes,
+                    "peak_bytes": self._bytes_hwm,
+                    "priority": len(self._prio),
+                    "spilled": spilled,
+                    "spill_bytes": spill_bytes,
+                    "get_waits": self._n_get_waits,
+                    "get_wait_time": self._get_wait_time,
+                    "flushes": self._n_flushes,
+                    "flush_wait_time": self._flush_wait_time}
+
     def terminate(self):
         """Terminate consumers."""
         with self._cond:
             if not self._terminating and not self._terminated:
-                if not self._buf or not self._getters:
+                if self._is_empty() or not self._getters:
                     self._terminate()
                 else:
                     self._terminating = True
@@ -252,8 +629,7 @@ class RingBuffer(object):
             if not g.trigger.is_set():
                 g.terminated = True
                 g.trigger.set()
-        for f in self._flushers:
-            f.terminate()
+        self._flushers = []
         self._cond.notify_all()
         self._terminated = True
         self._terminating = False
@@ -78,6 +78,24 @@ class Buffer(ctamonitoring.property_recorder.backend.dummy.registry.Buffer):
                                (self._component_name,
                                 self._property_name, err))
 
+    def add_many(self, samples):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.add_many()
+        """
+        err = 0
+        for id, buffer in self._buffers:
+            try:
+                buffer.add_many(samples)
+            except:
+                self._log.exception("cannot add %s/%s to %s" %
+                                    (self._component_name,
+                                     self._property_name, id))
+                err += 1
+        if err and (self._strict or err >= len(self._buffers)):
+            raise RuntimeError("cannot add %s/%s to %d buffers" %
+                               (self._component_name,
+                                self._property_name, err))
+
     def flush(self):
         """
         @see ctamonitoring.property_recorder.backend.dummy.registry.Buffer.flush()
@@ -188,3 +206,52 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
 
         return Buffer(self._log, self._strict, buffers,
                       component_name, property_name)
+
+    def register_many(self, specs):
+        """
+        Register several properties at all backends - each backend
+        registers them at once (cf. register()).
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register_many()
+        """
+        for spec in specs:
+            self._log.info("registering %s/%s" %
+                           (spec.get("component_name"),
+                            spec.get("property_name")))
+        buffers = [[] for _ in specs]
+        results = [None] * len(specs)
+        for id, r in self._registries:
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                break
+            try:
+                registered = r.register_many([specs[i] for i in pending])
+            except Exception as e:
+                registered = [e] * len(pending)
+            for i, buffer in zip(pending, registered):
+                if not isinstance(buffer, Exception):
+                    buffers[i].append((id, buffer))
+                    continue
+                component_name = specs[i].get("component_name")
+                property_name = specs[i].get("property_name")
+                self._log.error("cannot register %s/%s at %s: %s" %
+                                (component_name, property_name, id, buffer))
+                for _, buffer in buffers[i]:
+                    try:
+                        buffer.close()
+                    except:
+                        self._log.exception("cannot close buffer")
+                results[i] = RuntimeError("cannot register %s/%s at %s" %
+                                          (component_name, property_name, id))
+        for i, spec in enumerate(specs):
+            if results[i] is None:
+                results[i] = Buffer(self._log, self._strict, buffers[i],
+                                    spec["component_name"],
+                                    spec["property_name"])
+        return results
+
+    def get_stats(self):
+        """
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.get_stats()
+        """
+        return {"backends": dict((id, r.get_stats())
+                                 for id, r in self._registries)}
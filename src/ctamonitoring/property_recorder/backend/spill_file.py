@@ -0,0 +1,215 @@
+__version__ = "$Id$"
+
+
+"""
+A spill file to keep items on disk that don't fit into memory.
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+@requires: cPickle or pickle
+@requires: os
+@requires: struct
+@requires: tempfile
+"""
+
+
+import os
+import struct
+import tempfile
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+_HEADER = struct.Struct("!I")
+
+
+class _Segment(object):
+    def __init__(self, directory, prefix):
+        fd, self.path = tempfile.mkstemp(suffix=".spill",
+                                         prefix=prefix,
+                                         dir=directory)
+        # unbuffered - a record that is written is readable
+        self.writer = os.fdopen(fd, "wb", 0)
+        self.reader = open(self.path, "rb")
+        self.size = 0
+        self.count = 0
+        self.read_count = 0
+        self.read_offset = 0
+
+    def write(self, data):
+        record = _HEADER.pack(len(data)) + data
+        try:
+            self.writer.write(record)
+        except:
+            # drop what is written of the record (e.g. if the disk is
+            # full), so that the records before stay readable
+            try:
+                self.writer.seek(self.size)
+                self.writer.truncate()
+            except EnvironmentError:
+                pass
+            raise
+        self.size += len(record)
+        self.count += 1
+
+    def _read(self, n):
+        data = self.reader.read(n)
+        if len(data) < n:
+            # the reader may have hit the end of the file before
+            # the latest write - start over at the current record
+            self.reader.seek(self.read_offset)
+            data = self.reader.read(n)
+            if len(data) < n:
+                raise IOError("truncated spill file %s" % (self.path,))
+        self.read_offset += n
+        return data
+
+    def read(self):
+        offset = self.read_offset
+        try:
+            length, = _HEADER.unpack(self._read(_HEADER.size))
+            data = self._read(length)
+        except:
+            self.read_offset = offset
+            raise
+        self.read_count += 1
+        return data
+
+    def seal(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def remove(self):
+        self.seal()
+        self.reader.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SpillFile(object):
+    """
+    SpillFile is an append-only FIFO on disk.
+
+    Items are serialized (pickled) and appended to the latest of a series
+    of segment files. A new segment is started if the latest one exceeds
+    the segment size and a segment is deleted as soon as all of its items
+    are read. If the spill file exceeds its byte limit, the oldest segments
+    are dropped.
+
+    SpillFile is not thread-safe. It is meant to be the overflow tier of
+    a RingBuffer that serializes the access.
+    """
+
+    def __init__(self, directory=None, max_bytes=0,
+                 segment_size=16 * 1024 * 1024, prefix="ring_buffer_"):
+        """
+        ctor.
+
+        @param directory: The directory for the segment files.
+        Optional, default is None - the default directory for temporary
+        files.
+        @type directory: string
+        @param max_bytes: Sets the upperbound limit on the number of bytes
+        the segment files may use before the oldest segments are dropped.
+        If max_bytes is less than or equal to zero, the size is infinite.
+        Optional, default is 0.
+        @type max_bytes: int
+        @param segment_size: The number of bytes after which a new segment
+        is started. Optional, default is 16 MiB.
+        @type segment_size: int
+        @param prefix: Prefix of the segment file names.
+        Optional, default is "ring_buffer_".
+        @type prefix: string
+        """
+        self._directory = directory
+        if max_bytes > 0:
+            self._max_bytes = max_bytes
+            # keep a few segments within the limit, so dropping the oldest
+            # segment doesn't drop (almost) everything
+            segment_size = min(segment_size, max(1, max_bytes // 4))
+        else:
+            self._max_bytes = None
+        self._segment_size = segment_size
+        self._prefix = prefix
+        self._segments = []
+        self._count = 0
+        self._bytes = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def bytes(self):
+        """The number of bytes the segment files use."""
+        return self._bytes
+
+    def add(self, items):
+        """
+        Append items.
+
+        @param items: The new items.
+        @type items: list
+        @return: The number of (oldest) items that were dropped to keep
+        the byte limit.
+        @rtype: int
+        @raise EnvironmentError: If the items cannot be written.
+        @raise pickle.PicklingError: If an item cannot be serialized.
+        The items before it are added in either case.
+        """
+        for item in items:
+            data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+            if (not self._segments or
+                    self._segments[-1].size >= self._segment_size):
+                if self._segments:
+                    self._segments[-1].seal()
+                self._segments.append(_Segment(self._directory, self._prefix))
+            self._segments[-1].write(data)
+            self._count += 1
+            self._bytes += _HEADER.size + len(data)
+        dropped = 0
+        while self._max_bytes and self._bytes > self._max_bytes:
+            segment = self._segments.pop(0)
+            dropped += segment.count - segment.read_count
+            self._count -= segment.count - segment.read_count
+            self._bytes -= segment.size
+            segment.remove()
+        return dropped
+
+    def get(self, n):
+        """
+        Remove and return the oldest items.
+
+        @param n: Return upto n items.
+        @type n: int
+        @return: A list of items.
+        @rtype: list
+        @raise EnvironmentError: If the items cannot be read.
+        """
+        items = []
+        while len(items) < n and self._segments:
+            segment = self._segments[0]
+            if segment.read_count < segment.count:
+                items.append(pickle.loads(segment.read()))
+                self._count -= 1
+            if segment.read_count == segment.count:
+                self._segments.pop(0)
+                self._bytes -= segment.size
+                segment.remove()
+        return items
+
+    def close(self):
+        """Drop all items and delete the segment files."""
+        for segment in self._segments:
+            segment.remove()
+        self._segments = []
+        self._count = 0
+        self._bytes = 0
@@ -209,3 +209,67 @@ class Registry(ctamonitoring.property_recorder.backend.dummy.registry.Registry):
                             pass
                     raise
         return Buffer(*buffers)
+
+    def register_many(self, specs):
+        """
+        Register several properties - each child registers the properties
+        it receives at once (cf. register()).
+        @see ctamonitoring.property_recorder.backend.dummy.registry.Registry.register_many()
+        """
+        # the child specs per registry: (registry name, registry,
+        # [(spec index, slot, spec)]) - slot 0 keeps the buffer that
+        # receives the data, slot 1 the one of the disabled default child
+        children = {}
+        for i, spec in enumerate(specs):
+            property_type = spec.get("property_type")
+            if property_type in self._typed_backends:
+                targets = ((self._typed_backend_names[property_type],
+                            self._typed_backends[property_type],
+                            spec.get("disable", False)),
+                           (self._default_backend_name,
+                            self._default_backend,
+                            True))
+            else:
+                targets = ((self._default_backend_name,
+                            self._default_backend,
+                            spec.get("disable", False)),)
+            for slot, (name, registry, do_disable) in enumerate(targets):
+                self._log.info("registering %s/%s at %s" %
+                               (spec.get("component_name"),
+                                spec.get("property_name"), name))
+                child_spec = dict(spec)
+                child_spec["disable"] = do_disable
+                child = children.setdefault(id(registry),
+                                            (name, registry, []))
+                child[2].append((i, slot, child_spec))
+        buffers = [[None, None] for _ in specs]
+        errors = [None] * len(specs)
+        for name, registry, child_specs in children.values():
+            try:
+                registered = registry.register_many([c for _, _, c
+                                                     in child_specs])
+            except Exception as e:
+                registered = [e] * len(child_specs)
+            for (i, slot, child_spec), buffer in zip(child_specs, registered):
+                if isinstance(buffer, Exception):
+                    self._log.error("cannot register %s/%s at %s: %s" %
+                                    (child_spec.get("component_name"),
+                                     child_spec.get("property_name"),
+                                     name, buffer))
+                    if errors[i] is None:
+                        errors[i] = buffer
+                else:
+                    buffers[i][slot] = buffer
+        results = []
+        for i, error in enumerate(errors):
+            if error is None:
+                results.append(Buffer(*buffers[i]))
+                continue
+            for buffer in buffers[i]:
+                if buffer is not None:
+                    try:
+                        buffer.close()
+                    except:
+                        pass
+            results.append(error)
+        return results
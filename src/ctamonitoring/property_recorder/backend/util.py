@@ -19,9 +19,22 @@ Little helpers that a backend might find useful...
 from datetime import datetime
 from datetime import timedelta
 from ctamonitoring.property_recorder.backend.property_type import PropertyType
+
+
+_POSIX_EPOCH = datetime(1970, 1, 1)
+
 try:
+    # ACS epochs are converted by plain integer arithmetic instead of
+    # TimeUtil().epoch2py() - this is on the path of every data point
     from Acspy.Common.TimeHelper import TimeUtil
 
+    # 100 nanoseconds between October 15, 1582 and January 1, 1970
+    _ACS_POSIX_OFFSET = 122192928000000000L
+
+    def _get_acs_time(tm):
+        # an acstime.Epoch or its value, e.g. a completion time stamp
+        return getattr(tm, "value", tm)
+
     def to_posixtime(tm):
         """
         Convert an ACS epoch to a POSIX timestamp...
@@ -30,11 +43,23 @@ try:
 
         @param tm: A time in 100 nanoseconds that have passed since
         October 15, 1582.
-        @type tm: acstime.Epoch
+        @type tm: acstime.Epoch or long
         @return: The POSIX timestamp.
         @rtype: float
         """
-        return TimeUtil().epoch2py(tm)
+        return (_get_acs_time(tm) - _ACS_POSIX_OFFSET) / 10000000.0
+
+    def to_microseconds(tm):
+        """
+        Convert an ACS epoch to an integer POSIX timestamp in microseconds.
+
+        @param tm: A time in 100 nanoseconds that have passed since
+        October 15, 1582.
+        @type tm: acstime.Epoch or long
+        @return: The microseconds that have passed since January 1, 1970.
+        @rtype: long
+        """
+        return (_get_acs_time(tm) - _ACS_POSIX_OFFSET) // 10
 
     def to_datetime(tm):
         """
@@ -42,11 +67,11 @@ try:
 
         @param tm: A time in 100 nanoseconds that have passed since
         October 15, 1582.
-        @type tm: acstime.Epoch
+        @type tm: acstime.Epoch or long
         @return: Date + time.
         @rtype: datetime.datetime
         """
-        return datetime.utcfromtimestamp(to_posixtime(tm))
+        return from_microseconds(to_microseconds(tm))
 except ImportError:
     # assume time information is a POSIX timestamp, such as is returned
     # by time.time(), or a datetime.datetime if this doesn't run in an
@@ -63,9 +88,23 @@ except ImportError:
         @rtype: datetime.datetime
         """
         if isinstance(tm, datetime):
-            return get_total_seconds(tm - datetime.utcfromtimestamp(0), False)
+            return get_total_seconds(tm - _POSIX_EPOCH, False)
         return tm
 
+    def to_microseconds(tm):
+        """
+        Convert a POSIX timestamp or a date + time to an integer
+        POSIX timestamp in microseconds.
+
+        @param tm: A time in seconds that have passed since January 1, 1970.
+        @type tm: integer or floating point number or datetime.datetime
+        @return: The microseconds that have passed since January 1, 1970.
+        @rtype: int or long
+        """
+        if isinstance(tm, datetime):
+            return get_total_microseconds(tm - _POSIX_EPOCH)
+        return int(round(tm * 1000000))
+
     def to_datetime(tm):
         """
         Convert a POSIX timestamp to a date + time...
@@ -82,6 +121,30 @@ except ImportError:
         return tm
 
 
+def from_microseconds(us):
+    """
+    Convert an integer POSIX timestamp in microseconds to a date + time.
+
+    @param us: The microseconds that have passed since January 1, 1970.
+    @type us: int or long
+    @return: Date + time.
+    @rtype: datetime.datetime
+    """
+    return _POSIX_EPOCH + timedelta(microseconds=us)
+
+
+def get_total_microseconds(td):
+    """
+    Get the total number of microseconds contained in a time duration.
+
+    @param td: The time duration.
+    @type td: datetime.timedelta
+    @return: The number of microseconds in td.
+    @rtype: int or long
+    """
+    return (td.days * 86400 + td.seconds) * 1000000 + td.microseconds
+
+
 def get_total_seconds(td, ignore_fractions_of_seconds=False):
     """
     Get the total number of seconds contained in a time duration.
@@ -133,6 +196,33 @@ def get_floor(tm, td, ignore_fractions_of_seconds=True):
     return datetime.min + tmp
 
 
+def get_approx_size(obj):
+    """
+    Get the approximate size of an object when it is serialized.
+
+    The estimate follows roughly what BSON or msgpack need to encode
+    numbers, strings, date + times and containers of them. It is meant
+    for memory budgets, not for exact numbers.
+
+    @param obj: The object, typically a monitoring data point, a tuple
+    that carries one or a chunk of data points.
+    @return: The approximate size in bytes.
+    @rtype: int
+    """
+    if obj is None or isinstance(obj, bool):
+        return 1
+    if isinstance(obj, (int, long, float, datetime)):
+        return 8
+    if isinstance(obj, basestring):
+        return len(obj) + 5
+    if isinstance(obj, dict):
+        return 5 + sum(len(k) + 2 + get_approx_size(v)
+                       for k, v in obj.iteritems())
+    if isinstance(obj, (list, tuple)):
+        return 5 + sum(3 + get_approx_size(v) for v in obj)
+    return 16
+
+
 def to_string(dt, property_type, property_type_desc=None):
     """
     Get a printable string representation of a property value.
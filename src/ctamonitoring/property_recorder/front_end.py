@@ -467,8 +467,12 @@ class FrontEnd(object):
         This would work for any property type and implementation language,
         but creates a clearly worse performance and therefore is only used for
         Python
+
+        All properties of the component are registered at the backend
+        at once, see _get_property_monitors
         """
 
+        acs_properties = []
         if is_python:
             self.logger.logDebug(
                 'probably is a property, trying to get the information '
@@ -484,16 +488,12 @@ class FrontEnd(object):
                 property_attributes = (
                     config.get_prop_attribs_cdb_xml(
                         obj_char))
-                try:
-                    property_monitor = self._get_property_monitor(
-                        acs_property,
-                        property_attributes,
-                        component_reference)
-                except (UnsupporterPropertyTypeError, OBJECT_NOT_EXIST):
-                    self.logger.exception("")
-                    property_monitor = None
-                if property_monitor is not None:
-                    monitor_list.append(property_monitor)
+                acs_properties.append((acs_property, property_attributes))
+
+            monitor_list = self._get_property_monitors(
+                acs_properties,
+                component_reference,
+                (UnsupporterPropertyTypeError, OBJECT_NOT_EXIST))
 
         else:
             chars = component.find_characteristic("*")
@@ -526,15 +526,14 @@ class FrontEnd(object):
                         config.get_prop_attribs_cdb(
                             acs_property)
                     )
-                    try:
-                        property_monitor = self._get_property_monitor(
-                            acs_property,
-                            property_attributes,
-                            component_reference)
-                        monitor_list.append(property_monitor)
-                    except UnsupporterPropertyTypeError:
-                        self.logger.exception(
-                            "Property type not supported")
+                    acs_properties.append((acs_property,
+                                           property_attributes))
+
+            monitor_list = self._get_property_monitors(
+                acs_properties,
+                component_reference,
+                (UnsupporterPropertyTypeError,),
+                "Property type not supported")
 
         return monitor_list
 
@@ -558,41 +557,77 @@ class FrontEnd(object):
 
         return acs_property
 
-    def _get_property_monitor(
+    def _get_property_monitors(
             self,
-            acs_property,
-            property_attributes,
-            component_reference):
+            acs_properties,
+            component_reference,
+            errors,
+            message=""):
         """
-        @return: the monitor of the property
+        Registers several properties at the backend at once
+        and creates their monitors
+
+        @param acs_properties: the ACS properties and their attributes
+        @type acs_properties: list of (ACS._objref_<prop_type>, dict) pairs
+        @param component_reference: CORBA reference of the component
+        @type component_reference: CORBA reference
+        @param errors: the exceptions that skip a property,
+        they are logged
+        @type errors: tuple
+        @param message: the log message of a skipped property
+        @type message: string
+        @return: the monitors of the properties
+        @rtype: list
         @raise UnsupporterPropertyTypeError:
-        if the property type is not supported
+        if the property type is not supported and not in errors
         @raise OBJECT_NOT_EXIST: if the property object does not exist
+        and this is not in errors
         """
-        #  This can raise a UnsupporterPropertyTypeError
-        my_buffer = self._create_buffer(
-            acs_property,
-            property_attributes,
-            component_reference
-        )
+        specs = []
+        accepted = []
+        for acs_property, property_attributes in acs_properties:
+            try:
+                #  This can raise a UnsupporterPropertyTypeError
+                specs.append(self._get_property_spec(
+                    acs_property,
+                    property_attributes,
+                    component_reference))
+            except errors:
+                self.logger.exception(message)
+                continue
+            accepted.append((acs_property, property_attributes))
 
-        #  This can raise a UnsupporterPropertyTypeError
-        property_monitor = self._create_monitor(
-            acs_property,
-            property_attributes,
-            my_buffer)
+        monitor_list = []
+        my_buffers = self._create_buffers(specs)
+        for (acs_property, property_attributes), my_buffer in zip(
+                accepted, my_buffers):
+            if my_buffer is None:
+                continue
+            try:
+                #  This can raise a UnsupporterPropertyTypeError
+                property_monitor = self._create_monitor(
+                    acs_property,
+                    property_attributes,
+                    my_buffer)
+            except errors:
+                self.logger.exception(message)
+                continue
+            if property_monitor is not None:
+                monitor_list.append(property_monitor)
 
-        return property_monitor
+        return monitor_list
 
-    def _create_buffer(
+    def _get_property_spec(
             self, acs_property,
             property_attributes,
             component_reference):
         """
-        Creates a buffer in the backend and returns it
+        Gets the arguments to register a property at the backend
 
         @param acs_property: the ACS property
         @type acs_property: ACS._objref_<prop_type>
+        @return: the keyword arguments of the registry's register
+        @rtype: dict
         @raise UnsupporterPropertyTypeError: if property type is not supported
         @raise OBJECT_NOT_EXIST: if the property object does not exist
         """
@@ -621,36 +656,69 @@ class FrontEnd(object):
                     "Enum states do not make sense,"
                     "use the int representation")
 
-        try:
-            my_buffer = self._registry.register(
-                component_name=component_name,
-                component_type=component_type,
-                property_name=acs_property._get_name(),
-                property_type=my_prop_type,
-                property_type_desc=enum_states,
-                **property_attributes)
-        except UserWarning:
+        spec = dict(property_attributes)
+        spec.update(
+            component_name=component_name,
+            component_type=component_type,
+            property_name=acs_property._get_name(),
+            property_type=my_prop_type,
+            property_type_desc=enum_states)
+        return spec
+
+    def _create_buffers(self, specs):
+        """
+        Creates several buffers in the backend at once and returns them
+
+        Properties that seem to be in use are forced in.
+
+        @param specs: the arguments to register the properties,
+        see _get_property_spec
+        @type specs: list of dict
+        @return: the buffers, None for a property that
+        could not be registered
+        @rtype: list
+        @raise RuntimeError: if the backend reports an inconsistency,
+        e.g. of the log entries of a property. Other errors of the backend
+        are raised as well - only a ValueError skips a property (it is
+        logged) and a UserWarning forces it in.
+        """
+        my_buffers = self._registry.register_many(specs)
+
+        forced = [i for i, my_buffer in enumerate(my_buffers)
+                  if isinstance(my_buffer, UserWarning)]
+        if forced:
             self.logger.logWarning(
                 "Warning of buffer being used received, forcing in")
-            my_buffer = self._registry.register(
-                component_name=component_name,
-                component_type=component_type,
-                property_name=acs_property._get_name(),
-                property_type=my_prop_type,
-                property_type_desc=enum_states,
-                disable=False,
-                force=True,
-                **property_attributes)
-        except ValueError:
-            self.logger.logWarning("++bla++")
-            self.logger.exception("")
-
-        self.logger.logDebug(
-            "Create property with attributes: " +
-            str(property_attributes)
-        )
+            forced_buffers = self._registry.register_many(
+                [dict(specs[i], disable=False, force=True) for i in forced])
+            for i, my_buffer in zip(forced, forced_buffers):
+                my_buffers[i] = my_buffer
+
+        # only bad property specs are skipped (as register() used to),
+        # backend errors and inconsistencies must surface
+        errors = [my_buffer for my_buffer in my_buffers
+                  if isinstance(my_buffer, Exception) and
+                  not isinstance(my_buffer, ValueError)]
+        if errors:
+            for my_buffer in my_buffers:
+                if not isinstance(my_buffer, Exception):
+                    my_buffer.close()
+            raise errors[0]
+        for i, my_buffer in enumerate(my_buffers):
+            if isinstance(my_buffer, ValueError):
+                self.logger.logWarning(
+                    "Cannot register property %s/%s: %s" %
+                    (specs[i]["component_name"],
+                     specs[i]["property_name"],
+                     my_buffer))
+                my_buffers[i] = None
+            else:
+                self.logger.logDebug(
+                    "Create property with attributes: " +
+                    str(specs[i])
+                )
 
-        return my_buffer
+        return my_buffers
 
     def _create_monitor(self, acs_property, property_attributes, my_buffer):
         """
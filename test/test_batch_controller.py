@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Unit test module for the backend batch controller
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from ctamonitoring.property_recorder.backend.batch_controller import (
+    BatchController
+    )
+
+__version__ = "$Id$"
+
+
+class BatchControllerTest(unittest.TestCase):
+
+    def test_get_size(self):
+        batch = BatchController(2, 100, 0.1, 10)
+        self.assertEqual(10, batch.size)
+        # don't wait for more items than available...
+        self.assertEqual(5, batch.get_size(5))
+        # ...but for the minimum
+        self.assertEqual(2, batch.get_size(0))
+        self.assertEqual(10, batch.get_size(1000))
+
+    def test_grow(self):
+        batch = BatchController(1, 100, 0.1)
+        self.assertEqual(1, batch.size)
+        batch.update(1, 0.01, 0)
+        self.assertEqual(1, batch.size)
+        for size in (2, 4, 8, 16, 32, 64, 100, 100):
+            batch.update(batch.size, 0.01, 1000)
+            self.assertEqual(size, batch.size)
+
+    def test_shrink(self):
+        batch = BatchController(5, 100, 0.1, 100)
+        batch.update(100, 0.4, 1000)
+        self.assertEqual(25, batch.size)
+        batch.update(25, 1.0, 1000)
+        self.assertEqual(5, batch.size)
+        # a small batch that is slow doesn't grow the size
+        batch = BatchController(1, 100, 0.1, 50)
+        batch.update(10, 0.2, 1000)
+        self.assertEqual(5, batch.size)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BatchController, 0)
+        self.assertRaises(ValueError, BatchController, 10, 5)
+        self.assertRaises(ValueError, BatchController, 1, 5, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(BatchControllerTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Unit test module for the mongodb backend chunk formats
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import bson
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.property_type import PropertyType
+
+__version__ = "$Id$"
+
+
+class ChunkFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_begin = datetime(2016, 1, 1, 12, 0, 0)
+        self.data = [(self.bin_begin + timedelta(seconds=0.5 * i), 1.5 * i)
+                     for i in range(1, 5)]
+
+    def _create(self, fmt):
+        chunk = chunk_format.new_chunk(self.data[0][0], self.bin_begin,
+                                       "pid", fmt)
+        for t, val in self.data:
+            chunk_format.append(chunk, t, val)
+        return chunk
+
+    def test_documents(self):
+        chunk = self._create(chunk_format.FORMAT_DOCUMENTS)
+        self.assertFalse("fmt" in chunk)
+        self.assertEqual(chunk_format.FORMAT_DOCUMENTS,
+                         chunk_format.get_format(chunk))
+        self.assertEqual({"t": self.data[0][0], "val": self.data[0][1]},
+                         chunk["values"][0])
+        self.assertEqual(self.data, chunk_format.decode(chunk))
+
+    def test_columnar(self):
+        chunk = self._create(chunk_format.FORMAT_COLUMNAR)
+        self.assertEqual(chunk_format.FORMAT_COLUMNAR, chunk["fmt"])
+        self.assertEqual([500000, 1000000, 1500000, 2000000], chunk["t"])
+        self.assertEqual([1.5, 3.0, 4.5, 6.0], chunk["v"])
+        self.assertEqual(self.data, chunk_format.decode(chunk))
+        self.assertTrue(chunk_format.get_approx_chunk_size(chunk) <
+                        chunk_format.get_approx_chunk_size(
+                            self._create(chunk_format.FORMAT_DOCUMENTS)))
+
+    def test_compressed(self):
+        chunk = chunk_format.new_chunk(self.data[0][0], self.bin_begin,
+                                       "pid", chunk_format.FORMAT_COMPRESSED,
+                                       chunk_format.CODEC_XOR)
+        for t, val in self.data:
+            chunk_format.append(chunk, t, val)
+        self.assertEqual(self.data, chunk_format.decode(chunk))
+        sealed = chunk_format.seal(chunk)
+        self.assertEqual(len(self.data), sealed["n"])
+        self.assertTrue(isinstance(sealed["t"], bson.Binary))
+        self.assertTrue(isinstance(sealed["v"], bson.Binary))
+        self.assertEqual(self.data, chunk_format.decode(sealed))
+        self.assertTrue(sealed is chunk_format.seal(sealed))
+
+    def test_compressed_ints(self):
+        chunk = chunk_format.new_chunk(self.bin_begin, self.bin_begin,
+                                       "pid", chunk_format.FORMAT_COMPRESSED,
+                                       chunk_format.CODEC_ZIGZAG)
+        data = [(t, i) for i, (t, _) in enumerate(self.data)]
+        for t, val in data:
+            chunk_format.append(chunk, t, val)
+        self.assertEqual(data, chunk_format.decode(chunk_format.seal(chunk)))
+        # a value that cannot be compressed...
+        chunk_format.append(chunk, self.data[-1][0], "oops")
+        sealed = chunk_format.seal(chunk)
+        self.assertEqual(chunk_format.FORMAT_COLUMNAR, sealed["fmt"])
+        self.assertEqual(data + [(self.data[-1][0], "oops")],
+                         chunk_format.decode(sealed))
+
+    def test_get_codec(self):
+        self.assertEqual(chunk_format.CODEC_XOR,
+                         chunk_format.get_codec(PropertyType.DOUBLE))
+        self.assertEqual(chunk_format.CODEC_ZIGZAG,
+                         chunk_format.get_codec(PropertyType.LONG))
+        self.assertTrue(chunk_format.get_codec(PropertyType.STRING) is None)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, chunk_format.new_chunk,
+                          self.bin_begin, self.bin_begin, "pid", 0)
+        self.assertRaises(ValueError, chunk_format.decode, {"fmt": 0})
+        self.assertRaises(ValueError, chunk_format.new_chunk,
+                          self.bin_begin, self.bin_begin, "pid",
+                          chunk_format.FORMAT_COMPRESSED, "unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(ChunkFormatTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -412,6 +412,31 @@ class FrontEndTest(unittest.TestCase):
         self.assertRaises(
             ValueError, self._front_end._get_acs_property, mock_component, chars)
 
+    def test_create_buffers(self):
+        specs = [{"component_name": "comp", "property_name": name}
+                 for name in ("a", "b", "c")]
+        my_buffers = [Mock(), UserWarning("in use"), ValueError("bad")]
+        forced_buffer = Mock()
+        registry = Mock()
+        registry.register_many.side_effect = [list(my_buffers),
+                                              [forced_buffer]]
+        self._front_end._registry = registry
+        self.assertEqual([my_buffers[0], forced_buffer, None],
+                         self._front_end._create_buffers(specs))
+
+    def test_create_buffers_error(self):
+        specs = [{"component_name": "comp", "property_name": name}
+                 for name in ("a", "b")]
+        my_buffer = Mock()
+        registry = Mock()
+        registry.register_many.return_value = [
+            my_buffer, RuntimeError("inconsistent log entries")]
+        self._front_end._registry = registry
+        self.assertRaises(RuntimeError,
+                          self._front_end._create_buffers, specs)
+        # the buffers of the batch aren't left behind
+        my_buffer.close.assert_called_once_with()
+
     def test_remove_monitors(self):
         mock_comp_info = ComponentInfo(
             Mock(), Mock(), [Mock(), Mock(), Mock()])
@@ -512,12 +537,14 @@ class FrontEndTest(unittest.TestCase):
                  'component_reference._NP_RepositoryId': ROULONG_NP_REP_ID}
         component_reference.configure_mock(**attrs)
 
-        my_buffer = self._front_end._create_buffer(
+        spec = self._front_end._get_property_spec(
             acs_property,
             property_attributes,
             component_reference)
+        my_buffers = self._front_end._create_buffers([spec])
 
-        self.assertTrue(my_buffer)
+        self.assertEqual(1, len(my_buffers))
+        self.assertTrue(my_buffers[0])
 
     def tearDown(self):
         self._front_end.cancel()
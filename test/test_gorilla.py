@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Unit test module for the backend time series compression
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from ctamonitoring.property_recorder.backend import gorilla
+
+__version__ = "$Id$"
+
+
+class GorillaTest(unittest.TestCase):
+
+    def test_times(self):
+        times = [0, 1000000, 2000000, 3000000, 4000017, 5000000,
+                 5000001, 9000000000, 8000000000, -5, 2 ** 62]
+        data = gorilla.encode_times(times)
+        self.assertEqual(times, gorilla.decode_times(data, len(times)))
+        self.assertEqual([], gorilla.decode_times(gorilla.encode_times([]),
+                                                  0))
+
+    def test_times_on_grid(self):
+        times = [i * 1000000 for i in range(1000)]
+        data = gorilla.encode_times(times)
+        # 64 bits, the first delta and a bit per time
+        self.assertTrue(len(data) < 8 + 5 + 1000 // 8 + 1)
+        self.assertEqual(times, gorilla.decode_times(data, len(times)))
+
+    def test_floats(self):
+        values = [20.0, 20.0, 20.5, 20.25, -3.0, 1e300, 0.0, -0.0,
+                  float("inf"), 1e-300, 20.0, 20.0]
+        data = gorilla.encode_floats(values)
+        self.assertEqual([repr(v) for v in values],
+                         [repr(v) for v in gorilla.decode_floats(data,
+                                                                 len(values))])
+        values = [42.0] * 1000
+        data = gorilla.encode_floats(values)
+        self.assertTrue(len(data) < 8 + 1000 // 8 + 1)
+        self.assertEqual(values, gorilla.decode_floats(data, len(values)))
+
+    def test_ints(self):
+        values = [0, 1, 1, -1, 2 ** 63 - 1, -2 ** 63, 300, 299, 2 ** 70]
+        data = gorilla.encode_ints(values)
+        self.assertEqual(values, gorilla.decode_ints(data, len(values)))
+        self.assertRaises(TypeError, gorilla.encode_ints, [1, 2.0])
+
+    def test_truncated(self):
+        data = gorilla.encode_floats([1.0, 2.0, 3.0])
+        self.assertRaises(ValueError, gorilla.decode_floats, data[:-2], 3)
+        data = gorilla.encode_ints([1, 2 ** 20])
+        self.assertRaises(ValueError, gorilla.decode_ints, data[:-1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(GorillaTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Unit test module for the shared clients of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from threading import Thread
+from ctamonitoring.property_recorder.backend.mongodb import clients
+
+__version__ = "$Id$"
+
+
+class _Resource(object):
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+
+class SharedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+        self.cache = clients.SharedCache(self._create, self._close)
+
+    def _create(self, name):
+        resource = _Resource(name)
+        self.created.append(resource)
+        return resource
+
+    def _close(self, resource):
+        resource.closed = True
+
+    def test_refcount(self):
+        a = self.cache.acquire("a", "a")
+        self.assertTrue(a is self.cache.acquire("a", "a"))
+        b = self.cache.acquire("b", "b")
+        self.assertFalse(a is b)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2, self.cache.get_refcount(a))
+        self.assertFalse(self.cache.release(a))
+        self.assertFalse(a.closed)
+        self.assertTrue(self.cache.release(a))
+        self.assertTrue(a.closed)
+        self.assertEqual(0, self.cache.get_refcount(a))
+        self.assertRaises(KeyError, self.cache.release, a)
+        # a released key gets a new object
+        self.assertFalse(a is self.cache.acquire("a", "a"))
+        self.assertEqual(3, len(self.created))
+        self.assertEqual(clients.get_client_key("mongodb://localhost",
+                                                {"w": 1, "connect": False}),
+                         clients.get_client_key("mongodb://localhost",
+                                                {"connect": False, "w": 1}))
+
+    def test_threads(self):
+        acquired = []
+        threads = [Thread(target=lambda: acquired.append(
+            self.cache.acquire("a", "a"))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(self.created))
+        self.assertEqual(20, self.cache.get_refcount(self.created[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(SharedCacheTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
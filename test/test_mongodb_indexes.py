@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Unit test module for the index management of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from pymongo.errors import OperationFailure
+from ctamonitoring.property_recorder.backend.mongodb import indexes
+
+__version__ = "$Id$"
+
+
+class _Collection(object):
+    def __init__(self, stats=None):
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+        self.stats = stats
+
+    def create_index(self, keys, background=False):
+        name = "_".join("%s_%s" % key for key in keys)
+        self.indexes[name] = {"key": [(f, float(d)) for f, d in keys]}
+        return name
+
+    def index_information(self):
+        return self.indexes
+
+    def aggregate(self, pipeline):
+        if self.stats is None:
+            raise OperationFailure("$indexStats not supported")
+        return [{"name": name, "accesses": {"ops": ops}}
+                for name, ops in self.stats.items()]
+
+
+class IndexesTest(unittest.TestCase):
+
+    def test_ensure(self):
+        collections = {"chunks": _Collection(), "logs": _Collection(),
+                       "properties": _Collection()}
+        report = indexes.verify_indexes(collections)
+        self.assertEqual(indexes.INDEXES["chunks"],
+                         report["chunks"]["missing"])
+        self.assertTrue(report["chunks"]["unused"] is None)
+        names = indexes.ensure_indexes(collections)
+        self.assertEqual(["pid_1_bin_1"], names["chunks"])
+        report = indexes.verify_indexes(collections)
+        for role in collections:
+            self.assertEqual([], report[role]["missing"])
+
+    def test_unused(self):
+        col = _Collection({"_id_": 0, "pid_1_bin_1": 10, "old": 0})
+        report = indexes.verify_indexes({"chunks": col})
+        self.assertEqual(["old"], report["chunks"]["unused"])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(IndexesTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+"""
+Unit test module for opening the log periods of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import bson
+import copy
+import logging
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb.registry import Registry
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+
+__version__ = "$Id$"
+
+
+_DUPLICATE_KEY = 11000
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        val = doc.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$lt" and not (val is not None and val < arg):
+                    return False
+                if op == "$ne" and val == arg:
+                    return False
+                if op == "$in" and val not in arg:
+                    return False
+        elif val != cond:
+            return False
+    return True
+
+
+class _BulkResult(object):
+    def __init__(self, upserted_ids):
+        self.upserted_ids = upserted_ids
+
+
+class FakeCollection(object):
+    """
+    The operations of a collection that open log periods use -
+    on documents in memory.
+    """
+
+    def __init__(self):
+        self.docs = []
+        # called before every update, e.g. to act as another registry
+        self.before_update = None
+
+    def _find(self, query):
+        return [doc for doc in self.docs if _matches(doc, query)]
+
+    def find_one(self, query):
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find(self, query, sort=None, limit=0):
+        found = self._find(query)
+        for key, direction in reversed(sort or []):
+            found.sort(key=lambda doc: doc[key], reverse=(direction < 0))
+        if limit:
+            found = found[:limit]
+        return copy.deepcopy(found)
+
+    def insert_one(self, doc):
+        if self.find_one({"_id": doc["_id"]}) is not None:
+            raise DuplicateKeyError("duplicate key", _DUPLICATE_KEY)
+        self.docs.append(copy.deepcopy(doc))
+
+    def insert_many(self, docs):
+        for doc in docs:
+            self.insert_one(doc)
+
+    def _update(self, query, update, upsert):
+        # returns the document before the update, raises on a failed upsert
+        if self.before_update is not None:
+            self.before_update()
+        found = self._find(query)
+        if found:
+            previous = copy.deepcopy(found[0])
+            found[0].update(update["$set"])
+            return previous, None
+        if not upsert:
+            return None, None
+        doc = dict((key, cond) for key, cond in query.items()
+                   if not isinstance(cond, dict))
+        doc.update(update["$set"])
+        self.insert_one(doc)
+        return None, doc["_id"]
+
+    def find_one_and_update(self, query, update, upsert=False):
+        return self._update(query, update, upsert)[0]
+
+    def update_one(self, query, update):
+        self._update(query, update, False)
+
+    def bulk_write(self, requests, ordered=True):
+        upserted = {}
+        errors = []
+        for i, request in enumerate(requests):
+            try:
+                _, id = self._update(request._filter, request._doc,
+                                     request._upsert)
+                if id is not None:
+                    upserted[i] = id
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": _DUPLICATE_KEY,
+                               "errmsg": str(e)})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors,
+                                  "upserted": [{"index": i, "_id": id}
+                                               for i, id
+                                               in upserted.items()]})
+        return _BulkResult(upserted)
+
+    def aggregate(self, pipeline):
+        # $match, $sort by pid and begin (descending) and $group by pid
+        # taking the first document - cf. Registry._get_log_ids()
+        docs = self.find(pipeline[0]["$match"],
+                         sort=[("pid", 1), ("begin", -1)])
+        latest = {}
+        for doc in docs:
+            latest.setdefault(doc["pid"], {"_id": doc["pid"],
+                                           "lid": doc["_id"],
+                                           "begin": doc["begin"],
+                                           "end": doc["end"]})
+        return latest.values()
+
+
+class LogPeriodTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = self._registry()
+
+    def _registry(self):
+        # the parts of a registry that open log periods
+        registry = Registry.__new__(Registry)
+        registry._log = logging.getLogger("test_mongodb_log_periods")
+        registry._logs = FakeCollection()
+        registry._current_logs = FakeCollection()
+        return registry
+
+    def _open(self, registry, property_id, force=False):
+        return registry._get_log_id("comp", "prop", property_id,
+                                    False, force)
+
+    def _close(self, registry, property_id):
+        end = datetime.now()
+        registry._current_logs.update_one({"_id": property_id},
+                                          {"$set": {"end": end}})
+        registry._logs.update_one({"pid": property_id, "end": None},
+                                  {"$set": {"end": end}})
+
+    def test_first(self):
+        pid = bson.ObjectId()
+        lid = self._open(self.registry, pid)
+        current = self.registry._current_logs.find_one({"_id": pid})
+        self.assertEqual(lid, current["lid"])
+        self.assertEqual(None, current["end"])
+        log_entry = self.registry._logs.find_one({"_id": lid})
+        self.assertEqual(pid, log_entry["pid"])
+        self.assertEqual(current["begin"], log_entry["begin"])
+
+    def test_open_period(self):
+        pid = bson.ObjectId()
+        lid = self._open(self.registry, pid)
+        # another recorder seems to record this property
+        self.assertRaises(UserWarning, self._open, self.registry, pid)
+        self.assertEqual(lid, self.registry._current_logs
+                         .find_one({"_id": pid})["lid"])
+        forced = self._open(self.registry, pid, force=True)
+        self.assertEqual(forced, self.registry._current_logs
+                         .find_one({"_id": pid})["lid"])
+        self._close(self.registry, pid)
+        self.assertNotEqual(forced, self._open(self.registry, pid))
+
+    def test_concurrent_upsert(self):
+        pid = bson.ObjectId()
+        other = self._registry()
+        other._current_logs = self.registry._current_logs
+        other._logs = self.registry._logs
+        current_logs = self.registry._current_logs
+        other_lids = []
+
+        def other_registry_opens():
+            # another registry opens a later period right before this one
+            current_logs.before_update = None
+            other_lids.append(self._open(other, pid))
+        current_logs.before_update = other_registry_opens
+        self.assertRaises(RuntimeError, self._open, self.registry, pid)
+        self.assertEqual(other_lids[0],
+                         current_logs.find_one({"_id": pid})["lid"])
+        self.assertEqual(1, len(self.registry._logs.docs))
+
+        # the upsert fails while the period of the other registry is open
+        # but the other registry closes it before this one looks at it
+        find_one = current_logs.find_one
+
+        def other_registry_closes(query):
+            current_logs.find_one = find_one
+            self._close(other, pid)
+            return find_one(query)
+        current_logs.find_one = other_registry_closes
+        lid = self._open(self.registry, pid)
+        self.assertTrue(current_logs.find_one is find_one)
+        current = current_logs.find_one({"_id": pid})
+        self.assertEqual((lid, None), (current["lid"], current["end"]))
+        self.assertEqual([lid], [doc["_id"]
+                                 for doc in self.registry._logs.docs
+                                 if doc["end"] is None])
+
+    def test_upgrade(self):
+        # log entries of older versions that have no current log document
+        pid = bson.ObjectId()
+        old = {"_id": bson.ObjectId(), "pid": pid,
+               "begin": datetime.now() - timedelta(days=1), "end": None,
+               "disabled": False}
+        self.registry._logs.insert_one(old)
+        self.assertRaises(UserWarning, self._open, self.registry, pid)
+        # the current log document is given back to the old entry
+        current = self.registry._current_logs.find_one({"_id": pid})
+        self.assertEqual((old["_id"], old["begin"], None),
+                         (current["lid"], current["begin"], current["end"]))
+        self.assertEqual(1, len(self.registry._logs.docs))
+        # the old entry is closed then
+        self._close(self.registry, pid)
+        lid = self._open(self.registry, pid)
+        self.assertEqual(lid, self.registry._current_logs
+                         .find_one({"_id": pid})["lid"])
+
+    def test_upgrade_future(self):
+        pid = bson.ObjectId()
+        self.registry._logs.insert_one(
+            {"_id": bson.ObjectId(), "pid": pid,
+             "begin": datetime.now() + timedelta(days=1),
+             "end": datetime.now() + timedelta(days=2), "disabled": False})
+        self.assertRaises(RuntimeError, self._open, self.registry, pid,
+                          True)
+        self.assertEqual(1, len(self.registry._logs.docs))
+
+    def _scenario(self, registry, pids):
+        # 0: new, 1: open period, 2: open period but forced,
+        # 3: closed period, 4: old open log entry (upgrade),
+        # 5: registered twice in a batch
+        registry._current_logs.docs = []
+        registry._logs.docs = []
+        self._open(registry, pids[1])
+        self._open(registry, pids[2])
+        self._open(registry, pids[3])
+        self._close(registry, pids[3])
+        registry._logs.insert_one({"_id": bson.ObjectId(), "pid": pids[4],
+                                   "begin": datetime.now() -
+                                   timedelta(days=1),
+                                   "end": None, "disabled": False})
+        return [("comp", "p0", pids[0], False, False),
+                ("comp", "p1", pids[1], False, False),
+                ("comp", "p2", pids[2], False, True),
+                ("comp", "p3", pids[3], True, False),
+                ("comp", "p4", pids[4], False, False),
+                ("comp", "p5", pids[5], False, False),
+                ("comp", "p5", pids[5], False, False)]
+
+    def _outcome(self, registry, results):
+        kinds = [type(result).__name__ if isinstance(result, Exception)
+                 else "id" for result in results]
+        current = dict((doc["_id"], (doc["lid"], doc["end"] is None))
+                       for doc in registry._current_logs.docs)
+        open_entries = sorted((doc["pid"], doc["_id"])
+                              for doc in registry._logs.docs
+                              if doc["end"] is None)
+        # every log ID that was handed out is the current period
+        for entry, result in zip(self._entries, results):
+            if not isinstance(result, Exception):
+                self.assertEqual((result, True), current[entry[2]])
+        return kinds, sorted(current.values()), open_entries
+
+    def test_bulk(self):
+        pids = [bson.ObjectId() for _ in range(6)]
+        single = self._registry()
+        self._entries = self._scenario(single, pids)
+        single_results = []
+        for entry in self._entries:
+            try:
+                single_results.append(single._get_log_id(*entry))
+            except (RuntimeError, UserWarning) as e:
+                single_results.append(e)
+        single_kinds = self._outcome(single, single_results)[0]
+        self.assertEqual(["id", "UserWarning", "id", "id", "UserWarning",
+                          "id", "UserWarning"], single_kinds)
+
+        bulk = self._registry()
+        self.assertEqual(self._entries, self._scenario(bulk, pids))
+        bulk_results = bulk._get_log_ids(self._entries)
+        self.assertEqual(single_kinds,
+                         self._outcome(bulk, bulk_results)[0])
+        # the same periods are open, one per property
+        single_open = self._outcome(single, single_results)[2]
+        bulk_open = self._outcome(bulk, bulk_results)[2]
+        self.assertEqual([pid for pid, _ in single_open],
+                         [pid for pid, _ in bulk_open])
+        self.assertEqual(len(set(pids)),
+                         len(set(pid for pid, _ in bulk_open)))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(LogPeriodTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
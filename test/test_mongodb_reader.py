@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Unit test module for the mongodb backend reader
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import numpy
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb import reader
+
+__version__ = "$Id$"
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_begin = datetime(2016, 1, 1, 12, 0, 0)
+
+    def _create(self, fmt, data, bin_begin=None, codec=None):
+        bin_begin = bin_begin or self.bin_begin
+        chunk = chunk_format.new_chunk(data[0][0], bin_begin, "pid",
+                                       fmt, codec)
+        for t, val in data:
+            chunk_format.append(chunk, t, val)
+        chunk["end"] = data[-1][0]
+        return chunk_format.seal(chunk)
+
+    def _data(self, n, offset=0):
+        return [(self.bin_begin + timedelta(seconds=offset + i), 0.5 * i)
+                for i in range(n)]
+
+    def test_formats(self):
+        data = self._data(6)
+        chunks = [self._create(chunk_format.FORMAT_DOCUMENTS, data[:2]),
+                  self._create(chunk_format.FORMAT_COLUMNAR, data[2:4]),
+                  self._create(chunk_format.FORMAT_COMPRESSED, data[4:],
+                               codec=chunk_format.CODEC_XOR)]
+        times, values = reader.decode_chunks(chunks)
+        self.assertEqual(numpy.dtype("datetime64[us]"), times.dtype)
+        self.assertEqual([t for t, _ in data], times.tolist())
+        self.assertEqual([v for _, v in data], values.tolist())
+
+    def test_range(self):
+        data = self._data(10)
+        chunk = self._create(chunk_format.FORMAT_COLUMNAR, data)
+        times, values = reader.decode_chunks([chunk], data[2][0], data[4][0])
+        self.assertEqual([t for t, _ in data[2:5]], times.tolist())
+        self.assertEqual([1.0, 1.5, 2.0], values.tolist())
+        times, values = reader.decode_chunks([])
+        self.assertEqual(0, len(times))
+        self.assertEqual(0, len(values))
+
+    def test_sequences(self):
+        data = [(t, [v, v + 1]) for t, v in self._data(3)]
+        chunk = self._create(chunk_format.FORMAT_DOCUMENTS, data)
+        times, values = reader.decode_chunks([chunk], is_sequence=True)
+        self.assertEqual((3, 2), values.shape)
+        data[1] = (data[1][0], [1.0])
+        chunk = self._create(chunk_format.FORMAT_DOCUMENTS, data)
+        times, values = reader.decode_chunks([chunk], is_sequence=True)
+        self.assertEqual((3,), values.shape)
+        self.assertEqual([1.0], values[1])
+
+    def test_overlap(self):
+        data = self._data(4)
+        chunks = [self._create(chunk_format.FORMAT_COLUMNAR, data[1::2]),
+                  self._create(chunk_format.FORMAT_COLUMNAR, data[::2])]
+        times, values = reader.decode_chunks(chunks)
+        self.assertEqual([t for t, _ in data], times.tolist())
+        self.assertEqual([v for _, v in data], values.tolist())
+
+    def test_register_decoder(self):
+        self.assertRaises(ValueError, reader.decode, {"fmt": 99})
+        reader.register_decoder(99, lambda chunk: (
+            numpy.array([chunk["begin"]], dtype="datetime64[us]"),
+            [chunk["x"]]))
+        try:
+            times, values = reader.decode_chunks([{"fmt": 99, "x": 1,
+                                                   "begin": self.bin_begin}])
+            self.assertEqual([1], values.tolist())
+        finally:
+            del reader._decoders[99]
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(ReaderTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
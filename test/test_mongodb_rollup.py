@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Unit test module for the rollups of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb import reader
+from ctamonitoring.property_recorder.backend.mongodb import rollup
+from ctamonitoring.property_recorder.backend.mongodb.registry import Buffer
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+
+__version__ = "$Id$"
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_begin = datetime(2016, 1, 1, 12, 0, 0)
+
+    def _rollup(self, values, offset=0):
+        doc = rollup.new_rollup(60, self.bin_begin, "pid")
+        for i, val in enumerate(values):
+            rollup.append(doc,
+                          self.bin_begin + timedelta(seconds=offset + i),
+                          val)
+        return doc
+
+    def test_append(self):
+        doc = self._rollup([3, 1, 2, 6])
+        self.assertEqual(4, doc["count"])
+        self.assertEqual(1, doc["min"])
+        self.assertEqual(6, doc["max"])
+        self.assertAlmostEqual(3.0, doc["mean"])
+        self.assertEqual(self.bin_begin, doc["begin"])
+        self.assertEqual(self.bin_begin + timedelta(seconds=3), doc["end"])
+        self.assertTrue(rollup.is_rollup(doc))
+        self.assertFalse(rollup.is_number(True))
+        self.assertEqual(60, rollup.get_interval(timedelta(minutes=1)))
+        self.assertRaises(ValueError, rollup.get_interval, 0)
+
+    def test_merge(self):
+        doc = rollup.merge([self._rollup([3, 1]),
+                            self._rollup([], 10),
+                            self._rollup([2, 6], 20)])
+        self.assertEqual(4, doc["count"])
+        self.assertEqual(1, doc["min"])
+        self.assertEqual(6, doc["max"])
+        self.assertAlmostEqual(3.0, doc["mean"])
+        self.assertEqual(self.bin_begin + timedelta(seconds=21), doc["end"])
+        bins, aggregates = reader.merge_rollups(
+            [self._rollup([3, 1]), self._rollup([2, 6], 20)])
+        self.assertEqual([self.bin_begin], bins.tolist())
+        self.assertEqual([4], aggregates["count"].tolist())
+        self.assertEqual([3.0], aggregates["mean"].tolist())
+
+    def test_buffer(self):
+        log = logging.getLogger("test_mongodb_rollup")
+        fifo = RingBuffer(sizer=chunk_format.get_approx_chunk_size)
+        buf = Buffer(log, fifo, timedelta(hours=1), "pid", "lid", None,
+                     "comp", "prop", False, False, rollups=[60])
+        try:
+            for i in range(90):
+                buf.add(self.bin_begin + timedelta(seconds=i), float(i % 60))
+            buf.add(self.bin_begin + timedelta(seconds=90), "not a number")
+            # the first minute is over, the second one is still open
+            docs = fifo.get(n=len(fifo))
+            self.assertEqual(1, len(docs))
+            self.assertEqual(60, docs[0]["count"])
+            self.assertEqual(0.0, docs[0]["min"])
+            self.assertEqual(59.0, docs[0]["max"])
+            self.assertAlmostEqual(29.5, docs[0]["mean"])
+            self.assertEqual(30, buf._rollups[60]["count"])
+        finally:
+            # there is neither a worker nor a log collection to close
+            buf._canceled = True
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(RollupTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
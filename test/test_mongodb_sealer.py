@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Unit test module for sealing the chunks of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import time
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb.registry import Buffer
+from ctamonitoring.property_recorder.backend.mongodb.registry import _Sealer
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+
+__version__ = "$Id$"
+
+
+class SealerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = logging.getLogger("test_mongodb_sealer")
+        self.fifo = RingBuffer(sizer=chunk_format.get_approx_chunk_size)
+        self.bin_begin = datetime(2016, 1, 1, 12, 0, 0)
+
+    def _buffer(self, rollups=None):
+        return Buffer(self.log, self.fifo, timedelta(seconds=10),
+                      "pid", "lid", None, "comp", "prop", False, False,
+                      rollups=rollups)
+
+    def test_seal(self):
+        buf = self._buffer(rollups=[60])
+        try:
+            for i in range(5):
+                buf.add(self.bin_begin + timedelta(seconds=i), float(i))
+            # the time bin may not be over yet
+            written = buf._written
+            buf.seal(written + 9)
+            self.assertEqual(0, len(self.fifo))
+            buf.seal(written + 10)
+            docs = self.fifo.get(n=len(self.fifo))
+            self.assertEqual(1, len(docs))
+            self.assertEqual(5, len(docs[0]["values"]))
+            # a late data point starts another chunk of the same bin
+            buf.add(self.bin_begin + timedelta(seconds=6), 6.0)
+            buf.seal(buf._written + 60)
+            docs = self.fifo.get(n=len(self.fifo))
+            self.assertEqual(2, len(docs))
+            self.assertEqual(self.bin_begin, docs[0]["bin"])
+            self.assertEqual(6, docs[1]["count"])
+            buf.seal(buf._written + 60)
+            self.assertEqual(0, len(self.fifo))
+        finally:
+            # there is neither a worker nor a log collection to close
+            buf._canceled = True
+
+    def test_historic(self):
+        # the time of the data points doesn't matter
+        buf = self._buffer()
+        try:
+            for i in range(3):
+                buf.add(self.bin_begin + timedelta(seconds=i), float(i))
+                buf.seal(time.time() - 5)
+            self.assertEqual(0, len(self.fifo))
+            buf.add(datetime.utcnow() + timedelta(days=1), 3.0)
+            buf.seal(buf._written + 10)
+            docs = self.fifo.get(n=len(self.fifo))
+            self.assertEqual([3, 1], [len(doc["values"]) for doc in docs])
+        finally:
+            buf._canceled = True
+
+    def test_sealer(self):
+        buf = self._buffer()
+        sealer = _Sealer(0.01, timedelta(seconds=5), self.log)
+        sealer.daemon = True
+        sealer.add(buf)
+        try:
+            buf.add(datetime.utcnow(), 1.0)
+            # no data point was added for a while
+            buf._written -= 30
+            sealer.start()
+            docs = self.fifo.get(n=1, timeout=5)
+            self.assertEqual(1, len(docs))
+        finally:
+            sealer.cancel()
+            sealer.join()
+            buf._canceled = True
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(SealerTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Unit test module for the time-series collection mode of the mongodb backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.mongodb import reader
+from ctamonitoring.property_recorder.backend.mongodb import registry
+from ctamonitoring.property_recorder.backend.mongodb import timeseries
+from ctamonitoring.property_recorder.backend.mongodb.registry \
+    import TimeseriesBuffer
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+
+__version__ = "$Id$"
+
+
+class TimeseriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.begin = datetime(2016, 1, 1, 12, 0, 0)
+
+    def test_measurement(self):
+        meta = timeseries.get_meta("pid", "comp", "prop")
+        measurement = timeseries.new_measurement(self.begin, 1.5, meta)
+        self.assertEqual(self.begin, measurement[timeseries.TIME_FIELD])
+        self.assertEqual("pid", measurement[timeseries.META_FIELD]["pid"])
+        self.assertEqual(1.5, measurement["val"])
+        times, values = reader.decode_measurements([measurement])
+        self.assertEqual([self.begin], times.tolist())
+        self.assertEqual([1.5], values.tolist())
+
+    def test_buffer(self):
+        log = logging.getLogger("test_mongodb_timeseries")
+        fifo = RingBuffer()
+        buf = TimeseriesBuffer(log, fifo, timedelta(seconds=10),
+                               "pid", "lid", None,
+                               "comp", "prop", False, True)
+        try:
+            # unchanged values are skipped within a time bin
+            for i in range(15):
+                buf.add(self.begin + timedelta(seconds=i), 1.0)
+            buf.add(self.begin + timedelta(seconds=15), 2.0)
+            # one FIFO item per time bin
+            self.assertEqual(1, len(fifo))
+            buf.seal(buf._written + 10)
+            items = fifo.get(n=len(fifo))
+            self.assertEqual([1, 2], [len(item) for item in items])
+            # ...the worker inserts the measurements
+            docs = registry._get_docs(items)
+            self.assertEqual([self.begin,
+                              self.begin + timedelta(seconds=10),
+                              self.begin + timedelta(seconds=15)],
+                             [doc[timeseries.TIME_FIELD] for doc in docs])
+            self.assertEqual([1.0, 1.0, 2.0], [doc["val"] for doc in docs])
+            self.assertEqual("comp",
+                             docs[0][timeseries.META_FIELD]["component_name"])
+        finally:
+            # there is neither a worker nor a log collection to close
+            buf._canceled = True
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TimeseriesTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
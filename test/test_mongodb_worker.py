@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Unit test module for the error handling of the mongodb worker
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+from ctamonitoring.property_recorder.backend.mongodb import registry
+from ctamonitoring.property_recorder.backend.mongodb.registry import _Worker
+from pymongo.errors import AutoReconnect
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
+
+__version__ = "$Id$"
+
+
+# the workers log the errors that they handle - keep the output clean
+logging.getLogger("test_mongodb_worker").addHandler(logging.NullHandler())
+
+
+class FakeCollection(object):
+    """Raises the given errors per insert_many() call, then inserts."""
+
+    name = "chunks"
+
+    def __init__(self, errors=(), errors_one=None):
+        self.errors = list(errors)
+        self.errors_one = errors_one or {}
+        self.calls = 0
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        self.docs.extend(docs)
+
+    def insert_one(self, doc):
+        error = self.errors_one.get(doc["_id"])
+        if error is not None:
+            raise error
+        self.docs.append(doc)
+
+
+def _bulk_write_error(*errors):
+    return BulkWriteError({"writeErrors": [{"index": i, "code": code,
+                                            "errmsg": "code %d" % (code,)}
+                                           for i, code in errors],
+                           "writeConcernErrors": []})
+
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chunks = [{"_id": i} for i in range(4)]
+
+    def _worker(self, col):
+        return _Worker("mongodb://test", col, None, None, None,
+                       logging.getLogger("test_mongodb_worker"))
+
+    def _retried(self, worker):
+        return sorted((n, chunk["_id"])
+                      for _, _, n, chunk in worker._retries)
+
+    def test_write_errors(self):
+        # 0: retryable, 1: duplicate (inserted by the first attempt),
+        # 2: permanent, 3: inserted
+        col = FakeCollection([_bulk_write_error((0, 91), (1, 11000),
+                                                (2, 121))])
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks, [0, 1, 0, 0])
+        self.assertEqual(1, col.calls)
+        self.assertEqual([(1, 0)], self._retried(worker))
+        self.assertEqual(1, worker.n_retries)
+        self.assertEqual(1, worker.n_rejected)
+
+    def test_duplicate_key(self):
+        # a duplicate of a first attempt is another chunk of the same ID
+        col = FakeCollection([_bulk_write_error((0, 11000))])
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks[:2], [0, 0])
+        self.assertEqual([], self._retried(worker))
+        self.assertEqual(1, worker.n_rejected)
+        # ...unless an insert that seemed to fail got through
+        col = FakeCollection([AutoReconnect("down"),
+                              _bulk_write_error((0, 11000))])
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks[:2], [0, 0])
+        self.assertEqual(2, col.calls)
+        self.assertEqual(0, worker.n_rejected)
+
+    def test_max_retries(self):
+        col = FakeCollection([_bulk_write_error((0, 91), (1, 91))])
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks[:2],
+                            [registry._MAX_RETRIES, 2])
+        # the first chunk is out of retries, the second one waits longer
+        self.assertEqual([(3, 1)], self._retried(worker))
+        self.assertEqual(1, worker.n_retries)
+        self.assertEqual(1, worker.n_rejected)
+
+    def test_auto_reconnect(self):
+        col = FakeCollection([AutoReconnect("down"), AutoReconnect("down"),
+                              None])
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks, [0, 0, 0, 0])
+        # the batch is kept and inserted once the database is back
+        self.assertEqual(3, col.calls)
+        self.assertEqual(self.chunks, col.docs)
+        self.assertEqual([], worker._retries)
+        self.assertEqual(2, worker.n_retries)
+        self.assertEqual(0, worker.n_rejected)
+
+    def test_one_by_one(self):
+        col = FakeCollection([OperationFailure("bad batch")],
+                             {0: DuplicateKeyError("dup"),
+                              1: AutoReconnect("down"),
+                              2: OperationFailure("bad doc")})
+        worker = self._worker(col)
+        worker._insert_into(col, self.chunks, [0, 1, 0, 0])
+        self.assertEqual([self.chunks[3]], col.docs)
+        self.assertEqual([(2, 1)], self._retried(worker))
+        self.assertEqual(1, worker.n_retries)
+        self.assertEqual(1, worker.n_rejected)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(WorkerTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Unit test module for the chunk size and the cluster support of
+the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import redis
+import unittest
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.redis import cluster
+from ctamonitoring.property_recorder.backend.redis import packed
+from ctamonitoring.property_recorder.backend.redis import reader
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+# the workers log the errors that they handle - keep the output clean
+logging.getLogger("test_redis_cluster").addHandler(logging.NullHandler())
+
+
+class FakeNodePipeline(redis.client.Pipeline):
+    def __init__(self, node):
+        redis.client.Pipeline.__init__(self, node.connection_pool,
+                                       node.response_callbacks,
+                                       False, None)
+        self._node = node
+
+    def execute(self, raise_on_error=True):
+        commands = [args for args, _ in self.command_stack]
+        self.reset()
+        return self._node.execute(commands)
+
+
+class FakeNode(redis.StrictRedis):
+    """
+    A node of a cluster that keeps a value per key (SET, GET, APPEND) -
+    if the cluster says that the node serves its hash slot. It raises
+    the given errors per pipeline.
+    """
+
+    def __init__(self, cluster, address):
+        redis.StrictRedis.__init__(self)
+        self.cluster = cluster
+        self.address = address
+        self.executed = []
+        self.errors = []
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return FakeNodePipeline(self)
+
+    def execute(self, commands):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.executed.append(commands)
+        results = []
+        asking = False
+        for command in commands:
+            if command[0] == "ASKING":
+                asking = True
+                results.append("OK")
+                continue
+            key = command[1]
+            slot = cluster.get_slot(key)
+            owner = self.cluster.owners[slot]
+            migrating = self.cluster.migrating.get(slot)
+            if migrating == self.address and asking:
+                owner = migrating
+            elif migrating is not None and owner == self.address:
+                # the key is gone, it is on the new node already
+                results.append(redis.ResponseError(
+                    "ASK %d %s:%d" % ((slot,) + migrating)))
+                continue
+            asking = False
+            if owner != self.address:
+                results.append(redis.ResponseError(
+                    "MOVED %d %s:%d" % ((slot,) + owner)))
+            elif command[0] == "SET":
+                self.cluster.values[key] = command[2]
+                results.append(True)
+            elif command[0] == "APPEND":
+                self.cluster.values[key] = (self.cluster.values.get(key, "") +
+                                            command[2])
+                results.append(len(self.cluster.values[key]))
+            elif command[0] in ("HSETNX", "EXPIRE"):
+                results.append(1)
+            else:
+                results.append(self.cluster.values.get(key))
+        return results
+
+
+class FakeCluster(object):
+    def __init__(self, addresses):
+        self.owners = [None] * cluster.N_SLOTS
+        self.migrating = {}  # slot -> address
+        self.values = {}
+        self.nodes = dict((address, FakeNode(self, address))
+                          for address in addresses)
+
+    def move(self, key, address):
+        self.owners[cluster.get_slot(key)] = address
+
+
+class FakeRouter(cluster.ClusterRouter):
+    def __init__(self, fake_cluster, slots):
+        cluster.ClusterRouter.__init__(self, None)
+        self._fake_cluster = fake_cluster
+        self._slots = list(slots)
+        self._clients = dict(fake_cluster.nodes)
+        self.n_refreshes = 0
+
+    def refresh(self):
+        self.n_refreshes += 1
+        self._slots = list(self._fake_cluster.owners)
+
+
+class ClusterTest(unittest.TestCase):
+
+    def test_slot(self):
+        # cf. the redis cluster specification
+        self.assertEqual(0x31c3, cluster._crc16("123456789"))
+        self.assertEqual(12182, cluster.get_slot("foo"))
+        self.assertEqual("bar", cluster.get_hash_tag("foo{bar}zap"))
+        self.assertEqual("{bar", cluster.get_hash_tag("foo{{bar}}zap"))
+        self.assertEqual("foo{}{bar}", cluster.get_hash_tag("foo{}{bar}"))
+        self.assertEqual(cluster.get_slot("{user1000}.following"),
+                         cluster.get_slot("{user1000}.followers"))
+
+    def test_keys(self):
+        self.assertEqual("c:p:900", registry.get_chunk_key("c", "p", 900))
+        self.assertEqual("{c}:p:900",
+                         registry.get_chunk_key("c", "p", 900, True))
+        self.assertEqual("{c}:p:stream",
+                         registry.get_stream_key("c", "p", True))
+        self.assertEqual(("{c}:latest", "p"),
+                         registry.get_latest_location(
+                             "c", "p", registry.LATEST_COMPONENT, True))
+        self.assertEqual(("latest", "c:p"),
+                         registry.get_latest_location(
+                             "c", "p", registry.LATEST_SYSTEM, True))
+        # the keys of a component share a hash slot
+        keys = reader.get_chunk_keys("c", "p", 60, 0, 300, True)
+        keys += [registry.get_stream_key("c", None, True),
+                 registry.get_latest_location(
+                     "c", "q", registry.LATEST_COMPONENT, True)[0]]
+        self.assertEqual(set([cluster.get_slot("c")]),
+                         set(cluster.get_slot(key) for key in keys))
+
+    def test_options(self):
+        self.assertRaises(ValueError, registry.Registry, chunk_size=0.5)
+        self.assertRaises(RuntimeError, registry.Registry,
+                          chunk_size=timedelta(seconds=60), ttl=100)
+        self.assertRaises(RuntimeError, registry.Registry,
+                          chunk_size=60, ttl=50, ttl_last_item=True)
+        self.assertRaises(ValueError, registry.Registry, cluster=True,
+                          ingest=registry.INGEST_LUA)
+        router = cluster.ClusterRouter(None)
+        self.assertRaises(ValueError, router.pipeline, True)
+
+    def _cluster(self):
+        fake_cluster = FakeCluster([("a", 1), ("b", 2)])
+        # the keys a* are served by node a, the keys b* by node b
+        for key in ("a0", "a1", "a2", "b0", "b1"):
+            fake_cluster.move(key, (key[0], 1 if key[0] == "a" else 2))
+        return fake_cluster
+
+    def test_pipeline(self):
+        fake_cluster = self._cluster()
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        with router.pipeline() as p:
+            for key in ("a0", "b0", "a1", "b1"):
+                p.set(key, key.upper())
+            self.assertEqual(4, len(p))
+            p.execute()
+            for key in ("b1", "a0", "a2", "b0"):
+                p.get(key)
+            # the results are in the order of the commands
+            self.assertEqual(["B1", "A0", None, "B0"], p.execute())
+            self.assertEqual(0, len(p))
+        # one pipeline per node and execute()
+        self.assertEqual(2, len(fake_cluster.nodes[("a", 1)].executed))
+        self.assertEqual(2, len(fake_cluster.nodes[("b", 2)].executed))
+        self.assertEqual(0, router.n_refreshes)
+
+    def test_moved(self):
+        fake_cluster = self._cluster()
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        # the slot of a1 moved to node b, the router doesn't know yet
+        fake_cluster.move("a1", ("b", 2))
+        p = router.pipeline()
+        for key in ("a0", "a1", "b0"):
+            p.set(key, key.upper())
+        self.assertEqual([True, True, True], p.execute())
+        self.assertEqual(1, router.n_refreshes)
+        self.assertEqual(("b", 2), router.get_node("a1"))
+        # the commands of node a and b are sent once, a1 follows MOVED
+        self.assertEqual([[("SET", "a0", "A0"), ("SET", "a1", "A1")]],
+                         fake_cluster.nodes[("a", 1)].executed)
+        self.assertEqual([[("SET", "b0", "B0")], [("SET", "a1", "A1")]],
+                         fake_cluster.nodes[("b", 2)].executed)
+        self.assertEqual({"a0": "A0", "a1": "A1", "b0": "B0"},
+                         fake_cluster.values)
+
+    def test_ask(self):
+        fake_cluster = self._cluster()
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        # the slot of a1 migrates to node b
+        fake_cluster.migrating[cluster.get_slot("a1")] = ("b", 2)
+        p = router.pipeline()
+        p.set("a0", "A0")
+        p.set("a1", "A1")
+        self.assertEqual([True, True], p.execute())
+        self.assertEqual([("ASKING",), ("SET", "a1", "A1")],
+                         fake_cluster.nodes[("b", 2)].executed[0])
+        # the slot is still served by node a
+        self.assertEqual(0, router.n_refreshes)
+
+    def test_redirections(self):
+        fake_cluster = self._cluster()
+        # the router keeps pointing at the wrong node
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        router.refresh = lambda: None
+        node_b = fake_cluster.nodes[("b", 2)]
+
+        def send_back(commands):
+            node_b.executed.append(commands)
+            return [redis.ResponseError("MOVED 0 a:1") for _ in commands]
+        node_b.execute = send_back
+        fake_cluster.move("a1", ("b", 2))
+        p = router.pipeline()
+        p.set("a0", "A0")
+        p.set("a1", "A1")
+        results = p.execute(raise_on_error=False)
+        self.assertEqual(True, results[0])
+        self.assertTrue(str(results[1]).startswith("MOVED"))
+        self.assertEqual(1 + cluster.ClusterPipeline.MAX_REDIRECTIONS,
+                         len(fake_cluster.nodes[("a", 1)].executed) +
+                         len(node_b.executed))
+        self.assertEqual({"a0": "A0"}, fake_cluster.values)
+        p.set("a1", "A1")
+        self.assertRaises(redis.ResponseError, p.execute)
+
+    def test_node_error(self):
+        fake_cluster = self._cluster()
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        fake_cluster.nodes[("a", 1)].errors.append(
+            redis.ConnectionError("down"))
+        p = router.pipeline()
+        for key in ("a0", "b0", "a1"):
+            p.set(key, key.upper())
+        # the commands of node b are done anyway
+        results = p.execute(raise_on_error=False)
+        self.assertTrue(isinstance(results[0], redis.ConnectionError))
+        self.assertEqual(True, results[1])
+        self.assertTrue(results[2] is results[0])
+        self.assertEqual({"b0": "B0"}, fake_cluster.values)
+        p.set("a0", "A0")
+        fake_cluster.nodes[("a", 1)].errors.append(
+            redis.ConnectionError("down"))
+        self.assertRaises(redis.ConnectionError, p.execute)
+
+    def test_append_node_error(self):
+        # the worker appends the records of a node that is done once
+        fake_cluster = self._cluster()
+        fake_cluster.move("{a}:p:0", ("a", 1))
+        fake_cluster.move("{b}:p:0", ("b", 2))
+        fake_cluster.move("{b}:p:0:index", ("b", 2))
+        fake_cluster.move("{a}:p:0:index", ("a", 1))
+        router = FakeRouter(fake_cluster, fake_cluster.owners)
+        worker = registry._Worker("redis://test", router, None, False,
+                                  None, None,
+                                  logging.getLogger("test_redis_cluster"),
+                                  layout=registry.LAYOUT_APPEND,
+                                  hash_tags=True)
+        data = [(True, ("{a}:p:0", "a", "p"), 1.0, 1),
+                (True, ("{b}:p:0", "b", "p"), 1.0, 1)]
+        fake_cluster.nodes[("b", 2)].errors.append(
+            redis.ConnectionError("down"))
+        self.assertRaises(redis.ConnectionError,
+                          worker._add_by_append, data)
+        worker._add_by_append(data)
+        record = packed.pack_record(1.0, 1)
+        self.assertEqual(record, fake_cluster.values["{a}:p:0"])
+        self.assertEqual(record, fake_cluster.values["{b}:p:0"])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(ClusterTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
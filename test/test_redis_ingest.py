@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Unit test module for the batch ingest of the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import msgpack
+import unittest
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+class IngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [(True, ("c:p:0", "c", "p"), 1.25, 1),
+                     (False, ("c:p:0", "c", "p"), 2.5, 2),
+                     (True, ("c:q:0", "c", "q"), 3.0, "x"),
+                     (False, ("c:p:0", "c", "p"), 1451649600.123456, 3)]
+
+    def test_pack_groups(self):
+        keys, args = registry.pack_groups(self.data,
+                                          timedelta(seconds=1800), False)
+        self.assertEqual(["c:p:0", "c:q:0"], keys)
+        self.assertEqual(1800, args[0])
+        expire, items = msgpack.unpackb(args[1])
+        self.assertEqual(1, expire)
+        # the scores are strings that keep the full precision
+        self.assertEqual(["1.25", "2.5", "1451649600.123456"], items[::2])
+        self.assertEqual(1451649600.123456, float(items[4]))
+        self.assertEqual([1.25, 1], msgpack.unpackb(items[1]))
+        self.assertEqual([3.0, "x"],
+                         msgpack.unpackb(msgpack.unpackb(args[2])[1][1]))
+
+    def test_ttl(self):
+        keys, args = registry.pack_groups(self.data[1:2],
+                                          timedelta(seconds=1800), False)
+        self.assertEqual(0, msgpack.unpackb(args[1])[0])
+        keys, args = registry.pack_groups(self.data[1:2],
+                                          timedelta(seconds=1800), True)
+        self.assertEqual(1, msgpack.unpackb(args[1])[0])
+        keys, args = registry.pack_groups(self.data, None, True)
+        self.assertEqual(-1, args[0])
+        self.assertEqual([0, 0], [msgpack.unpackb(arg)[0]
+                                  for arg in args[1:]])
+        self.assertRaises(ValueError, registry.Registry, ingest="eval")
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(IngestTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
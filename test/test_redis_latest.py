@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Unit test module for the latest-value hashes of the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from ctamonitoring.property_recorder.backend.redis import reader
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+class LatestTest(unittest.TestCase):
+
+    def test_location(self):
+        self.assertEqual(("latest", "CONTROL/DA01:temperature"),
+                         registry.get_latest_location("CONTROL/DA01",
+                                                      "temperature"))
+        self.assertEqual(("CONTROL/DA01:latest", "temperature"),
+                         registry.get_latest_location(
+                             "CONTROL/DA01", "temperature",
+                             registry.LATEST_COMPONENT))
+
+    def test_options(self):
+        self.assertRaises(ValueError, registry.Registry, latest="property")
+        r = reader.Reader()
+        try:
+            self.assertRaises(ValueError, r.read_latest,
+                              latest=registry.LATEST_COMPONENT)
+        finally:
+            r.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(LatestTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Unit test module for the append layout of the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import unittest
+from ctamonitoring.property_recorder.backend.redis import packed
+from ctamonitoring.property_recorder.backend.redis import reader
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+class PackedTest(unittest.TestCase):
+
+    def test_records(self):
+        records = [(1451649600.123456, 1), (1451649601.5, [1, 2]),
+                   (1451649602.0, "x")]
+        data = "".join(packed.pack_record(t, val) for t, val in records)
+        self.assertEqual([(1451649600.123456, 1), (1451649601.5, [1, 2]),
+                          (1451649602.0, "x")],
+                         packed.unpack_records(data))
+        self.assertEqual([], packed.unpack_records(""))
+        # slicing at a record boundary keeps the records behind it
+        offset = len(packed.pack_record(*records[0]))
+        self.assertEqual(records[1:2],
+                         packed.unpack_records(data[offset:])[:1])
+
+    def test_bucket(self):
+        self.assertEqual(1451649600, packed.get_bucket(1451649659.9))
+        self.assertEqual(1451649660, packed.get_bucket(1451649660.0))
+        self.assertEqual(1451649600, packed.get_bucket(1451649659.9, 300))
+        self.assertEqual("c:p:0:index", packed.get_index_key("c:p:0"))
+
+    def test_byte_range(self):
+        index = {"60": "0", "120": "100", "180": "250"}
+        self.assertEqual((0, -1), packed.get_byte_range(index, 0, 1000))
+        self.assertEqual((100, 249), packed.get_byte_range(index, 130, 170))
+        self.assertEqual((100, -1), packed.get_byte_range(index, 120, 200))
+        self.assertEqual((0, 99), packed.get_byte_range(index, 10, 119))
+        self.assertEqual(None, packed.get_byte_range(index, 0, 59))
+        self.assertEqual((0, -1), packed.get_byte_range({}, 0, 59))
+
+    def test_chunk_keys(self):
+        self.assertEqual(["c:p:0", "c:p:900"],
+                         reader.get_chunk_keys("c", "p", 900, 10, 900))
+        self.assertEqual(["c:p:900"],
+                         reader.get_chunk_keys("c", "p", 900, 900, 1799.5))
+
+    def test_layout(self):
+        self.assertRaises(ValueError, registry.Registry, layout="list")
+        self.assertRaises(ValueError, registry.Registry,
+                          layout=registry.LAYOUT_APPEND,
+                          ingest=registry.INGEST_LUA)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(PackedTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
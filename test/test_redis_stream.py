@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Unit test module for the stream layout of the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_stream_key(self):
+        self.assertEqual("c:p:stream", registry.get_stream_key("c", "p"))
+        self.assertEqual("c:stream", registry.get_stream_key("c"))
+
+    def test_item(self):
+        log = logging.getLogger(registry.__name__)
+        buf = registry.Buffer(log, None, timedelta(seconds=900),
+                              "c", "p", False,
+                              registry.get_stream_key("c"))
+        try:
+            # a stream is never a new key
+            self.assertEqual((False, ("c:stream", "c", "p"), 1800.5, 1),
+                             buf._get_item(1800.5, 1))
+            self.assertEqual((False, ("c:stream", "c", "p"), 2700.0, 2),
+                             buf._get_item(2700.0, 2))
+        finally:
+            buf._canceled = True
+        buf = registry.Buffer(log, None, timedelta(seconds=900),
+                              "c", "p", False)
+        try:
+            self.assertEqual((True, ("c:p:1800", "c", "p"), 1800.5, 1),
+                             buf._get_item(1800.5, 1))
+        finally:
+            buf._canceled = True
+
+    def test_options(self):
+        self.assertRaises(ValueError, registry.Registry,
+                          layout=registry.LAYOUT_STREAM,
+                          ingest=registry.INGEST_LUA)
+        self.assertRaises(ValueError, registry.Registry,
+                          layout=registry.LAYOUT_STREAM,
+                          stream_by="system")
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(StreamTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
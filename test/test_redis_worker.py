@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+"""
+Unit test module for the worker of the redis backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import msgpack
+import redis
+import unittest
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend.redis import packed
+from ctamonitoring.property_recorder.backend.redis import registry
+
+__version__ = "$Id$"
+
+
+# the workers log the errors that they handle - keep the output clean
+logging.getLogger("test_redis_worker").addHandler(logging.NullHandler())
+
+class FakePipeline(redis.client.Pipeline):
+    """
+    Queues the commands as redis-py does (arguments that don't fit
+    the redis-py API fail right there) and lets the client answer them.
+    """
+
+    def __init__(self, client):
+        redis.client.Pipeline.__init__(self, client.connection_pool,
+                                       client.response_callbacks,
+                                       False, None)
+        self._fake_client = client
+
+    def execute(self, raise_on_error=True):
+        commands = [args for args, _ in self.command_stack]
+        self.reset()
+        return self._fake_client.execute(commands, raise_on_error)
+
+
+class FakeClient(redis.StrictRedis):
+    """
+    Records the commands of every pipeline, keeps the strings that are
+    appended to and raises the given errors per pipeline - an error of
+    the pipeline or the errors of its commands by index.
+    """
+
+    def __init__(self, errors=()):
+        redis.StrictRedis.__init__(self)
+        # None, an exception or {index of a command: exception}
+        self.errors = [error or {} for error in errors]
+        self.executed = []  # the commands of every pipeline
+        self.strings = {}
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return FakePipeline(self)
+
+    def execute(self, commands, raise_on_error=True):
+        errors = {}
+        if self.errors:
+            errors = self.errors.pop(0)
+            if isinstance(errors, Exception):
+                raise errors
+        self.executed.append(commands)
+        results = [errors.get(i) or self._respond(command)
+                   for i, command in enumerate(commands)]
+        if raise_on_error and errors:
+            raise errors.values()[0]
+        return results
+
+    def _respond(self, command):
+        name = command[0]
+        if name == "APPEND":
+            self.strings[command[1]] = (self.strings.get(command[1], "") +
+                                        command[2])
+            return len(self.strings[command[1]])
+        if name == "XADD":
+            return "0-0"
+        if name == "HSET":
+            return (len(command) - 2) // 2
+        return 1
+
+
+class FakeScript(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, keys=[], args=[]):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return len(keys)
+
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [(True, ("c:p:0", "c", "p"), 1.25, 1),
+                     (False, ("c:p:0", "c", "p"), 2.5, 2),
+                     (True, ("c:q:0", "c", "q"), 3.0, "x")]
+
+    def _worker(self, client, ttl=None, **kwargs):
+        return registry._Worker("redis://test", client, ttl, False,
+                                None, None,
+                                logging.getLogger("test_redis_worker"),
+                                **kwargs)
+
+    def _commands(self, client, name):
+        return [command for commands in client.executed
+                for command in commands if command[0] == name]
+
+    def test_pipeline(self):
+        client = FakeClient()
+        worker = self._worker(client, ttl=timedelta(seconds=1800))
+        worker._add_by_pipeline(self.data)
+        self.assertEqual(1, len(client.executed))
+        # ZADD key score member
+        self.assertEqual([("ZADD", "c:p:0", 1.25, msgpack.packb((1.25, 1))),
+                          ("ZADD", "c:p:0", 2.5, msgpack.packb((2.5, 2))),
+                          ("ZADD", "c:q:0", 3.0,
+                           msgpack.packb((3.0, "x")))],
+                         self._commands(client, "ZADD"))
+        self.assertEqual(["c:p:0", "c:q:0"],
+                         [command[1]
+                          for command in self._commands(client, "EXPIRE")])
+
+    def test_latest(self):
+        client = FakeClient()
+        worker = self._worker(client, latest=registry.LATEST_SYSTEM)
+        worker._add_by_pipeline(self.data)
+        self.assertEqual(1, len(client.executed))
+        self.assertEqual(3, len(self._commands(client, "ZADD")))
+        # one HSET per hash, the last data point of a property wins
+        (command,) = self._commands(client, "HSET")
+        self.assertEqual("latest", command[1])
+        self.assertEqual({"c:p": msgpack.packb((2.5, 2)),
+                          "c:q": msgpack.packb((3.0, "x"))},
+                         dict(zip(command[2::2], command[3::2])))
+
+    def test_latest_component(self):
+        client = FakeClient()
+        worker = self._worker(client, latest=registry.LATEST_COMPONENT,
+                              hash_tags=True)
+        data = [(True, ("{c}:p:0", "c", "p"), 1.25, 1),
+                (True, ("{d}:p:0", "d", "p"), 2.5, 2),
+                (True, ("{c}:q:0", "c", "q"), 3.0, "x")]
+        worker._add_by_pipeline(data)
+        self.assertEqual(
+            {"{c}:latest": {"p": msgpack.packb((1.25, 1)),
+                            "q": msgpack.packb((3.0, "x"))},
+             "{d}:latest": {"p": msgpack.packb((2.5, 2))}},
+            dict((command[1], dict(zip(command[2::2], command[3::2])))
+                 for command in self._commands(client, "HSET")))
+
+    def test_latest_names(self):
+        # the names aren't taken from the keys
+        client = FakeClient()
+        worker = self._worker(client, latest=registry.LATEST_COMPONENT,
+                              hash_tags=True)
+        key = registry.get_chunk_key("x", "p:q", 0, True)
+        worker._add_by_pipeline([(True, (key, "x", "p:q"), 1.25, 1)])
+        (command,) = self._commands(client, "HSET")
+        self.assertEqual(("HSET", "{x}:latest", "p:q",
+                          msgpack.packb((1.25, 1))), command)
+
+    def test_latest_script(self):
+        client = FakeClient()
+        worker = self._worker(client, latest=registry.LATEST_SYSTEM)
+        worker._script = FakeScript()
+        worker._add_by_script(self.data)
+        self.assertEqual(1, worker._script.calls)
+        # the script doesn't keep them, a pipeline does
+        self.assertEqual(1, len(client.executed))
+        (command,) = client.executed[0]
+        self.assertEqual(("HSET", "latest"), command[:2])
+        self.assertEqual({"c:p": msgpack.packb((2.5, 2)),
+                          "c:q": msgpack.packb((3.0, "x"))},
+                         dict(zip(command[2::2], command[3::2])))
+
+    def _records(self, client, key):
+        return packed.unpack_records(client.strings.get(key, ""))
+
+    def _check_append(self, client):
+        self.assertEqual([(1.25, 1), (2.5, 2)],
+                         self._records(client, "c:p:0"))
+        self.assertEqual([(3.0, "x")], self._records(client, "c:q:0"))
+        # the index points at the first record of an interval
+        self.assertEqual(
+            set([("c:p:0:index", 0, 0), ("c:q:0:index", 0, 0)]),
+            set(command[1:] for command in self._commands(client,
+                                                          "HSETNX")))
+        self.assertEqual(set(["c:p:0", "c:p:0:index", "c:q:0",
+                              "c:q:0:index"]),
+                         set(command[1] for command
+                             in self._commands(client, "EXPIRE")))
+
+    def test_append(self):
+        client = FakeClient()
+        worker = self._worker(client, ttl=timedelta(seconds=1800),
+                              layout=registry.LAYOUT_APPEND)
+        worker._add_by_append(self.data)
+        self.assertEqual(2, len(client.executed))
+        self._check_append(client)
+        self.assertEqual(None, worker._progress)
+
+    def test_append_index_error(self):
+        # the records are appended but setting their index fails
+        client = FakeClient([None, redis.ConnectionError("down")])
+        worker = self._worker(client, ttl=timedelta(seconds=1800),
+                              layout=registry.LAYOUT_APPEND)
+        self.assertRaises(redis.ConnectionError,
+                          worker._add_by_append, self.data)
+        # the retry sets the index and the ttls only
+        worker._add_by_append(self.data)
+        self.assertEqual(2, len(client.executed))
+        self.assertEqual(3, len(self._commands(client, "APPEND")))
+        self._check_append(client)
+
+    def test_append_error(self):
+        # the second record isn't appended, the other ones are
+        client = FakeClient([{1: redis.ResponseError("OOM command not " +
+                                                     "allowed")}])
+        worker = self._worker(client, ttl=timedelta(seconds=1800),
+                              layout=registry.LAYOUT_APPEND,
+                              latest=registry.LATEST_SYSTEM)
+        self.assertRaises(redis.ResponseError,
+                          worker._add_by_append, self.data)
+        self.assertEqual([(1.25, 1)], self._records(client, "c:p:0"))
+        self.assertEqual([], self._commands(client, "HSETNX"))
+        # the retry appends the second record only
+        worker._add_by_append(self.data)
+        self.assertEqual([("APPEND", "c:p:0", packed.pack_record(2.5, 2))],
+                         client.executed[1])
+        self._check_append(client)
+        self.assertEqual(1, len(self._commands(client, "HSET")))
+
+    def test_stream(self):
+        client = FakeClient()
+        worker = self._worker(client, ttl=timedelta(seconds=1800),
+                              layout=registry.LAYOUT_STREAM,
+                              stream_maxlen=1000)
+        data = [(False, ("c:p", "c", "p"), 1.25, 1),
+                (False, ("c", "c", "q"), 2.5, 2),
+                (False, ("c:p", "c", "p"), 3.0, 3)]
+        worker._add_by_stream(data)
+        self.assertEqual(2, len(client.executed))
+        # trimmed approximately, keyed by property name
+        self.assertEqual([("XADD", "c:p", "MAXLEN", "~", "1000", "*",
+                           "p", msgpack.packb((1.25, 1))),
+                          ("XADD", "c", "MAXLEN", "~", "1000", "*",
+                           "q", msgpack.packb((2.5, 2))),
+                          ("XADD", "c:p", "MAXLEN", "~", "1000", "*",
+                           "p", msgpack.packb((3.0, 3)))],
+                         self._commands(client, "XADD"))
+        self.assertEqual(["c:p", "c"],
+                         [command[1]
+                          for command in self._commands(client, "EXPIRE")])
+
+    def test_stream_error(self):
+        # the second entry and the latest data points aren't added,
+        # then the second entry fails again and the ttls fail
+        oom = redis.ResponseError("OOM command not allowed")
+        client = FakeClient([{1: oom, 3: oom}, {0: oom}, None,
+                             redis.ConnectionError("down")])
+        worker = self._worker(client, ttl=timedelta(seconds=1800),
+                              layout=registry.LAYOUT_STREAM,
+                              latest=registry.LATEST_SYSTEM)
+        data = [(False, ("c:p", "c", "p"), 1.25, 1),
+                (False, ("c", "c", "q"), 2.5, 2),
+                (False, ("c:p", "c", "p"), 3.0, 3)]
+        for _ in range(3):
+            self.assertRaises(redis.RedisError, worker._add_by_stream, data)
+        worker._add_by_stream(data)
+        # the entries that are added aren't sent again
+        self.assertEqual([("c:p", msgpack.packb((1.25, 1))),
+                          ("c", msgpack.packb((2.5, 2))),
+                          ("c:p", msgpack.packb((3.0, 3))),
+                          ("c", msgpack.packb((2.5, 2))),
+                          ("c", msgpack.packb((2.5, 2)))],
+                         [(command[1], command[-1])
+                          for command in self._commands(client, "XADD")])
+        self.assertEqual(2, len(self._commands(client, "HSET")))
+        self.assertEqual(["c:p", "c"],
+                         [command[1]
+                          for command in self._commands(client, "EXPIRE")])
+        self.assertEqual(None, worker._progress)
+
+    def test_script_fallback(self):
+        for error in (redis.exceptions.NoScriptError("No matching script"),
+                      redis.ResponseError("unknown command 'evalsha'"),
+                      redis.ResponseError("ERR scripting is disabled")):
+            client = FakeClient()
+            worker = self._worker(client)
+            worker._script = FakeScript(error)
+            worker._add_by_script(self.data)
+            # the data points are added by the pipeline, from now on
+            self.assertEqual(None, worker._script)
+            self.assertEqual(3, len(self._commands(client, "ZADD")))
+
+    def test_script_error(self):
+        # errors of the data or the server aren't scripting errors
+        for error in (redis.ResponseError("WRONGTYPE Operation against " +
+                                          "a key holding the wrong kind " +
+                                          "of value"),
+                      redis.ResponseError("OOM command not allowed when " +
+                                          "used memory > 'maxmemory'")):
+            client = FakeClient()
+            worker = self._worker(client)
+            script = FakeScript(error)
+            worker._script = script
+            self.assertRaises(redis.ResponseError,
+                              worker._add_by_script, self.data)
+            self.assertTrue(worker._script is script)
+            self.assertEqual([], client.executed)
+            # ...and the script is retried
+            script.error = None
+            worker._add_by_script(self.data)
+            self.assertEqual(2, script.calls)
+            self.assertEqual([], client.executed)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(WorkerTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Unit test module for registering several properties at once
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+import ctamonitoring.property_recorder.backend.dummy.registry as dummy
+import ctamonitoring.property_recorder.backend.simple_fork.registry \
+    as simple_fork
+from ctamonitoring.property_recorder.backend.property_type import PropertyType
+
+__version__ = "$Id$"
+
+
+class _FailingRegistry(dummy.Registry):
+    def __init__(self, failing):
+        super(_FailingRegistry, self).__init__()
+        self.failing = failing
+        self.closed = []
+
+    def register(self, component_name, component_type,
+                 property_name, property_type, property_type_desc=None,
+                 disable=False, force=False, *args, **meta):
+        if property_name == self.failing:
+            raise UserWarning(property_name)
+        registry = self
+
+        class _Buffer(dummy.Buffer):
+            def close(self):
+                registry.closed.append(property_name)
+        return _Buffer()
+
+
+def _spec(property_name, **meta):
+    spec = {"component_name": "comp",
+            "component_type": "IDL:comp:1.0",
+            "property_name": property_name,
+            "property_type": PropertyType.DOUBLE}
+    spec.update(meta)
+    return spec
+
+
+class RegisterManyTest(unittest.TestCase):
+
+    def test_dummy(self):
+        registry = _FailingRegistry("b")
+        buffers = registry.register_many([_spec("a"), _spec("b"),
+                                          {"property_name": "c"}])
+        self.assertTrue(isinstance(buffers[0], dummy.Buffer))
+        self.assertTrue(isinstance(buffers[1], UserWarning))
+        self.assertTrue(isinstance(buffers[2], TypeError))
+
+    def test_parse_spec(self):
+        args = dummy.Registry._parse_spec(_spec("a", force=True, units="m"))
+        self.assertEqual(("comp", "IDL:comp:1.0", "a", PropertyType.DOUBLE,
+                          None, False, True, {"units": "m"}), args)
+        self.assertRaises(TypeError, dummy.Registry._parse_spec,
+                          {"component_name": "comp"})
+
+    def test_fork(self):
+        log = logging.getLogger("test_register_many")
+        log.setLevel(logging.CRITICAL)
+        registry = simple_fork.Registry([], log=log)
+        first = _FailingRegistry(None)
+        second = _FailingRegistry("b")
+        registry._registries = [("first", first), ("second", second)]
+        buffers = registry.register_many([_spec("a"), _spec("b")])
+        self.assertTrue(isinstance(buffers[0], simple_fork.Buffer))
+        self.assertTrue(isinstance(buffers[1], RuntimeError))
+        # the buffer of the first child is closed if the second one fails
+        self.assertEqual(["b"], first.closed)
+        self.assertEqual([], second.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(RegisterManyTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
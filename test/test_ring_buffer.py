@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""
+Unit test module for the backend ring buffer
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import shutil
+import tempfile
+import unittest
+from threading import Thread
+from ctamonitoring.property_recorder.backend.exceptions import (
+    InterruptedException
+    )
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+from ctamonitoring.property_recorder.backend.spill_file import SpillFile
+
+__version__ = "$Id$"
+
+
+class _Flusher(Thread):
+    def __init__(self, fifo, current, producer=None):
+        super(_Flusher, self).__init__()
+        self.daemon = True
+        self.fifo = fifo
+        self.current = current
+        self.producer = producer
+        self.error = None
+
+    def run(self):
+        try:
+            self.fifo.flush(current=self.current, producer=self.producer)
+        except Exception as e:
+            self.error = e
+
+
+class _Getter(Thread):
+    def __init__(self, fifo, n):
+        super(_Getter, self).__init__()
+        self.daemon = True
+        self.fifo = fifo
+        self.n = n
+        self.items = None
+
+    def run(self):
+        try:
+            self.items = self.fifo.get(n=self.n)
+        except InterruptedException:
+            pass
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_add_get(self):
+        fifo = RingBuffer()
+        for i in range(5):
+            fifo.add(i)
+        self.assertEqual([0, 1, 2], fifo.get(n=3))
+        self.assertEqual([3, 4], fifo.get(n=3, timeout=0.01))
+        self.assertEqual([], fifo.get(n=1, timeout=0.01))
+
+    def test_overwrite(self):
+        fifo = RingBuffer(3)
+        for i in range(5):
+            fifo.add(i)
+        self.assertEqual([2, 3, 4], fifo.get(n=3))
+
+    def test_add_many(self):
+        fifo = RingBuffer()
+        fifo.add_many([])
+        fifo.add(0)
+        fifo.add_many([1, 2, 3])
+        self.assertEqual([0, 1, 2, 3], fifo.get(n=4))
+
+    def test_add_many_overwrite(self):
+        fifo = RingBuffer(3)
+        fifo.add_many([0, 1])
+        fifo.add_many([2, 3])
+        self.assertEqual([1, 2, 3], fifo.get(n=3))
+        fifo.add(4)
+        fifo.add_many([5, 6, 7, 8, 9])
+        self.assertEqual([7, 8, 9], fifo.get(n=3))
+
+    def test_add_many_flush_current(self):
+        fifo = RingBuffer(4)
+        fifo.add_many([0, 1])
+        flusher = _Flusher(fifo, True)
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        fifo.add_many([2, 3, 4])
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        fifo.add_many([5])
+        flusher.join(1)
+        self.assertFalse(flusher.is_alive())
+        self.assertEqual([2, 3, 4, 5], fifo.get(n=4))
+
+    def test_maxbytes(self):
+        fifo = RingBuffer(maxbytes=10, sizer=len)
+        fifo.add("aaaa")
+        fifo.add_many(["bbbb", "cc"])
+        self.assertEqual(10, fifo.bytes)
+        fifo.add("dddddd")
+        self.assertEqual(["cc", "dddddd"], fifo.get(n=2))
+        self.assertEqual(0, fifo.bytes)
+        self.assertEqual(10, fifo.bytes_hwm)
+
+    def test_maxbytes_and_maxsize(self):
+        fifo = RingBuffer(2, maxbytes=100)
+        fifo.add_many([0.0, 1.0, 2.0])
+        self.assertEqual(16, fifo.bytes)
+        self.assertEqual([1.0, 2.0], fifo.get(n=2))
+        fifo = RingBuffer()
+        fifo.add("abc")
+        self.assertEqual(0, fifo.bytes)
+
+    def test_multi_consumer(self):
+        fifo = RingBuffer(multi_consumer=True)
+        getters = [_Getter(fifo, 2) for _ in range(3)]
+        for getter in getters:
+            getter.start()
+            getter.join(0.05)
+        fifo.add_many([0, 1, 2, 3])
+        for getter in getters[:2]:
+            getter.join(1)
+            self.assertFalse(getter.is_alive())
+        self.assertEqual([0, 1, 2, 3], sorted(getters[0].items +
+                                              getters[1].items))
+        self.assertTrue(getters[2].is_alive())
+        fifo.terminate()
+        getters[2].join(1)
+        self.assertFalse(getters[2].is_alive())
+
+    def test_spill(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spill = SpillFile(directory)
+            fifo = RingBuffer(3, spill=spill)
+            for i in range(5):
+                fifo.add(i)
+            fifo.add_many([5, 6, 7])
+            self.assertEqual(5, len(spill))
+            self.assertEqual([0, 1], fifo.get(n=2))
+            fifo.add(8)
+            self.assertEqual([2, 3, 4], fifo.get(n=3))
+            self.assertEqual([5, 6, 7], fifo.get(n=3))
+            self.assertEqual([8], fifo.get(n=3, timeout=0.01))
+            self.assertEqual(0, len(spill))
+            fifo.add_many([9, 10, 11, 12])
+            self.assertEqual([9, 10, 11], fifo.get(n=3))
+            self.assertEqual([12], fifo.get(n=3, timeout=0.01))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_spill_flush_current(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spill = SpillFile(directory, max_bytes=1, segment_size=1)
+            fifo = RingBuffer(2, spill=spill)
+            fifo.add_many([0, 1, 2, 3])
+            # the byte limit doesn't allow for any spilled item
+            self.assertEqual(0, len(spill))
+            flusher = _Flusher(fifo, True)
+            flusher.start()
+            flusher.join(0.1)
+            self.assertTrue(flusher.is_alive())
+            self.assertEqual([0, 1], fifo.get(n=2))
+            flusher.join(1)
+            self.assertFalse(flusher.is_alive())
+            self.assertTrue(flusher.error is None)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_flush_current(self):
+        fifo = RingBuffer()
+        for i in range(4):
+            fifo.add(i)
+        flusher = _Flusher(fifo, True)
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        fifo.add(4)
+        # a pending flush triggers getters before n items are available
+        self.assertEqual([0, 1], fifo.get(n=2))
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        self.assertEqual([2, 3, 4], fifo.get(n=10))
+        flusher.join(1)
+        self.assertFalse(flusher.is_alive())
+        self.assertTrue(flusher.error is None)
+
+    def test_flush_current_overwrite(self):
+        fifo = RingBuffer(3)
+        for i in range(3):
+            fifo.add(i)
+        flushers = [_Flusher(fifo, True) for _ in range(10)]
+        for flusher in flushers:
+            flusher.start()
+            flusher.join(0.05)
+        for i in range(3):
+            fifo.add(i)
+        for flusher in flushers:
+            flusher.join(1)
+            self.assertFalse(flusher.is_alive())
+            self.assertTrue(flusher.error is None)
+        self.assertEqual([0, 1, 2], fifo.get(n=3))
+
+    def test_flush_all(self):
+        fifo = RingBuffer()
+        fifo.add(0)
+        flusher = _Flusher(fifo, False)
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        fifo.add(1)
+        self.assertEqual([0, 1], fifo.get(n=10))
+        flusher.join(1)
+        self.assertFalse(flusher.is_alive())
+        self.assertTrue(flusher.error is None)
+
+    def test_flush_terminate(self):
+        fifo = RingBuffer()
+        fifo.add(0)
+        flushers = [_Flusher(fifo, True), _Flusher(fifo, False)]
+        for flusher in flushers:
+            flusher.start()
+            flusher.join(0.1)
+        fifo.terminate()
+        for flusher in flushers:
+            flusher.join(1)
+            self.assertFalse(flusher.is_alive())
+            self.assertTrue(isinstance(flusher.error, InterruptedException))
+        self.assertRaises(InterruptedException, fifo.get)
+
+    def test_stats(self):
+        fifo = RingBuffer(3)
+        fifo.add_many([0, 1, 2, 3])
+        fifo.add(4)
+        self.assertEqual([2, 3], fifo.get(n=2))
+        self.assertEqual([4], fifo.get(n=2, timeout=0.01))
+        stats = fifo.get_stats()
+        self.assertEqual(5, stats["added"])
+        self.assertEqual(3, stats["consumed"])
+        self.assertEqual(2, stats["overwritten"])
+        self.assertEqual(0, stats["depth"])
+        self.assertEqual(3, stats["peak_depth"])
+        self.assertEqual(1, stats["get_waits"])
+        self.assertTrue(stats["get_wait_time"] > 0)
+        self.assertEqual(0, stats["flushes"])
+
+    def test_stats_flush_and_spill(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spill = SpillFile(directory)
+            fifo = RingBuffer(2, spill=spill)
+            fifo.add_many([0, 1, 2, 3])
+            stats = fifo.get_stats()
+            self.assertEqual(2, stats["spilled"])
+            self.assertTrue(stats["spill_bytes"] > 0)
+            self.assertEqual(4, stats["peak_depth"])
+            self.assertEqual(0, stats["overwritten"])
+            flusher = _Flusher(fifo, True)
+            flusher.start()
+            flusher.join(0.1)
+            self.assertEqual([0, 1], fifo.get(n=2))
+            self.assertEqual([2, 3], fifo.get(n=2))
+            flusher.join(1)
+            self.assertFalse(flusher.is_alive())
+            stats = fifo.get_stats()
+            self.assertEqual(1, stats["flushes"])
+            self.assertTrue(stats["flush_wait_time"] > 0)
+            self.assertEqual(4, stats["consumed"])
+            self.assertEqual(0, stats["spilled"])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_priority(self):
+        fifo = RingBuffer(2)
+        fifo.add_many([0, 1, 2])
+        fifo.add("a", priority=True)
+        fifo.add_many(["b", "c"], priority=True)
+        # the priority lane is neither limited nor waits for a full batch
+        self.assertEqual(["a", "b"], fifo.get(n=2))
+        self.assertEqual(["c", 1], fifo.get(n=2))
+        self.assertEqual([2], fifo.get(n=2, timeout=0.01))
+
+    def test_flush_current_priority(self):
+        fifo = RingBuffer()
+        fifo.add("a", priority=True)
+        flusher = _Flusher(fifo, True)
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        self.assertEqual(["a"], fifo.get(n=2))
+        flusher.join(1)
+        self.assertFalse(flusher.is_alive())
+        self.assertTrue(flusher.error is None)
+        # the flush is over - getters wait for n items again
+        fifo.add(0)
+        getter = _Getter(fifo, 2)
+        getter.start()
+        getter.join(0.1)
+        self.assertTrue(getter.is_alive())
+        fifo.add(1)
+        getter.join(1)
+        self.assertEqual([0, 1], getter.items)
+
+    def test_flush_producer(self):
+        fifo = RingBuffer(5)
+        fifo.add(0, "a")
+        fifo.add_many([1, 2], "b")
+        fifo.add(3, "a")
+        fifo.add(4)
+        flusher = _Flusher(fifo, True, "a")
+        flusher.start()
+        flusher.join(0.1)
+        self.assertTrue(flusher.is_alive())
+        # the items of producer "a" jump the queue
+        self.assertEqual([0, 3], fifo.get(n=2))
+        flusher.join(1)
+        self.assertFalse(flusher.is_alive())
+        self.assertTrue(flusher.error is None)
+        # promoted items free their slots
+        fifo.add_many([5, 6])
+        self.assertEqual([1, 2, 4, 5, 6], fifo.get(n=5))
+        fifo.flush(producer="a")
+        fifo.flush(producer="c")
+
+    def test_flush_producer_spill(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spill = SpillFile(directory)
+            fifo = RingBuffer(2, spill=spill)
+            fifo.add_many([0, 1], "b")
+            fifo.add_many([2, 3], "a")
+            flusher = _Flusher(fifo, True, "a")
+            flusher.start()
+            flusher.join(0.1)
+            self.assertTrue(flusher.is_alive())
+            # spilled items cannot jump the queue
+            self.assertEqual([0, 1], fifo.get(n=2))
+            flusher.join(0.1)
+            self.assertTrue(flusher.is_alive())
+            self.assertEqual([2, 3], fifo.get(n=2))
+            flusher.join(1)
+            self.assertFalse(flusher.is_alive())
+            self.assertTrue(flusher.error is None)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(RingBufferTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Unit test module for the backend spill file
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from ctamonitoring.property_recorder.backend.spill_file import SpillFile
+
+__version__ = "$Id$"
+
+
+class SpillFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_add_get(self):
+        spill = SpillFile(self.directory, segment_size=100)
+        self.assertEqual(0, spill.add([(i, {"val": i}) for i in range(10)]))
+        self.assertEqual(10, len(spill))
+        self.assertTrue(len(os.listdir(self.directory)) > 1)
+        self.assertEqual([(0, {"val": 0}), (1, {"val": 1})], spill.get(2))
+        spill.add([(10, {"val": 10})])
+        self.assertEqual([(i, {"val": i}) for i in range(2, 11)],
+                         spill.get(100))
+        self.assertEqual(0, len(spill))
+        self.assertEqual(0, spill.bytes)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_max_bytes(self):
+        spill = SpillFile(self.directory, max_bytes=200)
+        dropped = spill.add(list(range(100)))
+        self.assertTrue(dropped > 0)
+        self.assertTrue(spill.bytes <= 200)
+        self.assertEqual(100 - dropped, len(spill))
+        self.assertEqual(list(range(dropped, 100)), spill.get(100))
+
+    def test_add_error(self):
+        spill = SpillFile(self.directory)
+        # a lambda cannot be pickled
+        self.assertRaises(Exception, spill.add, [0, 1, lambda: 2, 3])
+        self.assertEqual(2, len(spill))
+        # a write fails after a part of the record, e.g. the disk is full
+        segment = spill._segments[-1]
+        writer = segment.writer
+
+        class FailingWriter(object):
+            def write(self, data):
+                writer.write(data[:len(data) // 2])
+                raise IOError("no space left on device")
+
+            def __getattr__(self, name):
+                return getattr(writer, name)
+        segment.writer = FailingWriter()
+        self.assertRaises(IOError, spill.add, [4, 5])
+        segment.writer = writer
+        spill.add([6])
+        # the records before stay readable
+        self.assertEqual([0, 1, 6], spill.get(10))
+
+    def test_close(self):
+        spill = SpillFile(self.directory)
+        spill.add(list(range(10)))
+        spill.close()
+        self.assertEqual(0, len(spill))
+        self.assertEqual([], os.listdir(self.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(SpillFileTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests
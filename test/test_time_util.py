@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Unit test module for the integer time helpers of the backend
+
+@author: tschmidt
+@organization: DESY Zeuthen
+@copyright: cta-observatory.org
+@version: $Id$
+@change: $LastChangedDate$
+@change: $LastChangedBy$
+"""
+import logging
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from ctamonitoring.property_recorder.backend import util
+from ctamonitoring.property_recorder.backend.mongodb import chunk_format
+from ctamonitoring.property_recorder.backend.mongodb.registry import Buffer
+from ctamonitoring.property_recorder.backend.ring_buffer import RingBuffer
+
+__version__ = "$Id$"
+
+
+class TimeUtilTest(unittest.TestCase):
+
+    def test_microseconds(self):
+        t = datetime(2016, 1, 1, 12, 0, 0, 123456)
+        t_us = util.to_microseconds(t)
+        self.assertEqual(1451649600123456, t_us)
+        self.assertEqual(t, util.from_microseconds(t_us))
+        self.assertEqual(t_us, util.to_microseconds(1451649600.123456))
+        self.assertEqual(util.to_datetime(1451649600.123456),
+                         util.from_microseconds(t_us))
+        self.assertEqual(-1, util.get_total_microseconds(
+            timedelta(microseconds=-1)))
+        self.assertEqual(86400000001, util.get_total_microseconds(
+            timedelta(days=1, microseconds=1)))
+
+    def test_buffer(self):
+        # the integer binning matches get_floor()
+        log = logging.getLogger("test_time_util")
+        chunk_size = timedelta(seconds=10)
+        begin = datetime(2016, 1, 1, 12, 0, 0)
+        times = [begin + timedelta(seconds=1.5 * i) for i in range(10)]
+        for fmt in (chunk_format.FORMAT_DOCUMENTS,
+                    chunk_format.FORMAT_COLUMNAR):
+            fifo = RingBuffer()
+            buf = Buffer(log, fifo, chunk_size, "pid", "lid", None,
+                         "comp", "prop", False, False, fmt)
+            try:
+                for i, t in enumerate(times):
+                    buf.add(t, i)
+                buf.seal(buf._written + 10)
+                chunks = fifo.get(n=len(fifo))
+                self.assertEqual([util.get_floor(times[0], chunk_size),
+                                  util.get_floor(times[-1], chunk_size)],
+                                 [chunk["bin"] for chunk in chunks])
+                self.assertEqual([times[0], times[7]],
+                                 [chunk["begin"] for chunk in chunks])
+                self.assertEqual([times[6], times[9]],
+                                 [chunk["end"] for chunk in chunks])
+                self.assertEqual(list(zip(times, range(10))),
+                                 chunk_format.decode(chunks[0]) +
+                                 chunk_format.decode(chunks[1]))
+            finally:
+                # there is neither a worker nor a log collection to close
+                buf._canceled = True
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TimeUtilTest))
+
+
+if __name__ == "__main__":
+    unittest.main(defaultTest='suite')  # run all tests